@@ -0,0 +1,310 @@
+import asyncio
+import math
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from database import AsyncSessionLocal
+from models import AssignmentQueueItem, Order, Vehicle
+from order_versions import touch_orders
+from assignment_strategies import get_strategy, load_fleet_snapshots
+from capacity_calendar import check_slot, reserve_slot_in_zone
+from vehicle_load import assign_orders_bulk, touch_vehicle_loads
+from zone_index import get_zone_index
+
+# With ASSIGNMENT_MODE=queue, POST /orders only stores the order and a row in
+# assignment_queue. Workers started with the app claim micro-batches of
+# queued orders, resolve their zones and assign them with the configured
+# strategy (assignment_strategies.py), loading the zone index and the zones'
+# vehicles once per batch instead of per order.
+#
+# Claiming deletes the rows inside the batch's transaction, so a crash or
+# restart mid-batch rolls back and leaves them queued. Orders that keep
+# failing end up as failed rows (failed_at set), counted in the queue stats. SKIP LOCKED lets the
+# workers of every server process drain the same table without overlap.
+
+ASSIGNMENT_MODE = os.getenv("ASSIGNMENT_MODE", "inline")
+ASSIGNMENT_MODES = ("inline", "queue")
+ASSIGNMENT_QUEUE_WORKERS = int(os.getenv("ASSIGNMENT_QUEUE_WORKERS", 2))
+ASSIGNMENT_BATCH_SIZE = int(os.getenv("ASSIGNMENT_BATCH_SIZE", 200))
+# An order whose assignment fails this many times on its own stays in the
+# table as failed instead of being retried
+ASSIGNMENT_MAX_ATTEMPTS = int(os.getenv("ASSIGNMENT_MAX_ATTEMPTS", 5))
+# Idle workers re-check the table this often, which picks up orders queued
+# by other server processes
+ASSIGNMENT_POLL_SECONDS = float(os.getenv("ASSIGNMENT_POLL_SECONDS", 0.5))
+
+if ASSIGNMENT_MODE not in ASSIGNMENT_MODES:
+    raise ValueError(f"ASSIGNMENT_MODE must be one of {ASSIGNMENT_MODES}")
+
+
+class QueueStats:
+    def __init__(self):
+        self.batches = 0
+        self.processed = 0
+        self.assigned = 0
+        self.lag_total = 0.0
+        self.last_lag: Optional[float] = None
+
+    def record(self, lags: list[float], assigned: int):
+        self.batches += 1
+        self.processed += len(lags)
+        self.assigned += assigned
+        self.lag_total += sum(lags)
+        self.last_lag = max(lags)
+
+
+stats = QueueStats()
+_workers: list[asyncio.Task] = []
+_wake = asyncio.Event()
+
+
+def queue_enabled() -> bool:
+    return ASSIGNMENT_MODE == "queue"
+
+
+async def enqueue_order(db: AsyncSession, order: Order):
+    # Queue an order added to db; it is committed with the order
+    await db.flush()
+    db.add(AssignmentQueueItem(order_id=order.id))
+
+
+def wake_assignment_workers():
+    # Call after committing enqueued orders so local workers start at once
+    _wake.set()
+
+
+def _float_array(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _zone_or_none(zone_id) -> Optional[int]:
+    return int(zone_id) if zone_id >= 0 else None
+
+
+def _distance_or_none(distance) -> Optional[float]:
+    return None if math.isnan(distance) else float(distance)
+
+
+async def _claim(db: AsyncSession, *conditions, limit: int = ASSIGNMENT_BATCH_SIZE):
+    # Delete and return (order_id, enqueued_at) of up to limit live queue rows
+    return (await db.execute(
+        delete(AssignmentQueueItem)
+        .where(AssignmentQueueItem.id.in_(
+            select(AssignmentQueueItem.id)
+            .where(AssignmentQueueItem.failed_at.is_(None), *conditions)
+            .order_by(AssignmentQueueItem.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ))
+        .returning(AssignmentQueueItem.order_id, AssignmentQueueItem.enqueued_at)
+    )).all()
+
+
+async def process_batch(db: AsyncSession) -> int:
+    # Claim, zone and assign up to ASSIGNMENT_BATCH_SIZE queued orders in one
+    # transaction. If the batch fails, its orders are retried one per
+    # transaction, so one bad order can't hold back the rest; an order that
+    # fails on its own ASSIGNMENT_MAX_ATTEMPTS times is marked failed and
+    # left out of further claims. Returns the number of queue rows claimed.
+    claimed = await _claim(db)
+    if not claimed:
+        return 0
+    try:
+        await _assign_claimed(db, claimed)
+    except Exception as e:
+        await db.rollback()
+        print(f"Assignment queue batch failed, retrying its orders one by one: {e}")
+        for order_id, _ in claimed:
+            await _process_single(db, order_id)
+    return len(claimed)
+
+
+async def _process_single(db: AsyncSession, order_id: int):
+    claimed = await _claim(db, AssignmentQueueItem.order_id == order_id, limit=1)
+    if not claimed:
+        # Taken by another worker meanwhile
+        await db.rollback()
+        return
+    try:
+        await _assign_claimed(db, claimed)
+    except Exception as e:
+        await db.rollback()
+        print(f"Assignment of queued order {order_id} failed: {e}")
+        await _record_failure(db, order_id, str(e))
+
+
+async def _record_failure(db: AsyncSession, order_id: int, error: str):
+    attempts = AssignmentQueueItem.attempts + 1
+    await db.execute(
+        update(AssignmentQueueItem)
+        .where(AssignmentQueueItem.order_id == order_id)
+        .values(
+            attempts=attempts,
+            last_error=error,
+            failed_at=case((attempts >= ASSIGNMENT_MAX_ATTEMPTS, func.now()), else_=None)
+        )
+    )
+    await db.commit()
+
+
+async def _assign_claimed(db: AsyncSession, claimed):
+    # Orders cancelled or assigned by an admin while queued are just dropped.
+    # The rest are locked, so step 4 can't book a slot for an order an admin
+    # assigns meanwhile.
+    rows = (await db.execute(
+        select(Order.id, Order.user_id, Order.pickup_latitude, Order.pickup_longitude,
+               Order.drop_latitude, Order.drop_longitude, Order.volume_m3, Order.weight_kg,
+               Order.delivery_window_start, Order.delivery_window_end)
+        .where(
+            Order.id.in_([order_id for order_id, _ in claimed]),
+            Order.status == models.OrderStatus.PENDING,
+            Order.assigned_vehicle_id.is_(None)
+        )
+        .order_by(Order.id)
+        .with_for_update()
+    )).all()
+
+    applied = []
+    if rows:
+        # 1. Resolve every pickup and drop point of the batch in two vectorized calls
+        zone_index = await get_zone_index(db)
+        pickup_zones, pickup_fallbacks = zone_index.resolve_points(
+            _float_array(r.pickup_latitude for r in rows), _float_array(r.pickup_longitude for r in rows)
+        )
+        drop_zones, drop_fallbacks = zone_index.resolve_points(
+            _float_array(r.drop_latitude for r in rows), _float_array(r.drop_longitude for r in rows)
+        )
+        await db.execute(
+            update(Order.__table__)
+            .where(Order.__table__.c.id == bindparam("b_id"))
+            .values(
+                pickup_zone_id=bindparam("b_pickup_zone_id"),
+                drop_zone_id=bindparam("b_drop_zone_id"),
+                pickup_zone_fallback_m=bindparam("b_pickup_zone_fallback_m"),
+                drop_zone_fallback_m=bindparam("b_drop_zone_fallback_m")
+            ),
+            [
+                {
+                    "b_id": r.id,
+                    "b_pickup_zone_id": _zone_or_none(pickup_zones[i]),
+                    "b_drop_zone_id": _zone_or_none(drop_zones[i]),
+                    "b_pickup_zone_fallback_m": _distance_or_none(pickup_fallbacks[i]),
+                    "b_drop_zone_fallback_m": _distance_or_none(drop_fallbacks[i]),
+                }
+                for i, r in enumerate(rows)
+            ]
+        )
+
+        # 2. Lock the vehicles of all pickup zones at once, load them and
+        # plan with the configured strategy, the same one inline assignment uses
+        zone_ids = {int(z) for z in pickup_zones if z >= 0}
+        if zone_ids:
+            await db.execute(
+                select(Vehicle.id).where(Vehicle.zone_id.in_(zone_ids)).order_by(Vehicle.id).with_for_update()
+            )
+        strategy = get_strategy()
+        fleets = await load_fleet_snapshots(db, zone_ids, strategy.needs_positions)
+        plan, windowed = [], []
+        for r, zone_id in zip(rows, pickup_zones):
+            fleet = fleets.get(int(zone_id))
+            if fleet is None:
+                continue
+            if r.delivery_window_start is not None and r.delivery_window_end is not None:
+                windowed.append((r, int(zone_id)))
+                continue
+            i = strategy.choose(fleet, r.volume_m3, r.weight_kg, r.pickup_latitude, r.pickup_longitude)
+            if i >= 0:
+                fleet.add(i, r.volume_m3, r.weight_kg, r.pickup_latitude, r.pickup_longitude)
+                plan.append((r.id, int(fleet.ids[i])))
+
+        # 3. One UPDATE for the orders and one for the vehicle loads
+        applied = await assign_orders_bulk(db, plan)
+
+        # 4. Orders with a delivery window book it, on the first vehicle in
+        # strategy order with room in that window, as inline creation does
+        slot_applied = []
+        for r, zone_id in windowed:
+            try:
+                check_slot(r.delivery_window_start, r.delivery_window_end)
+            except ValueError:
+                continue
+            fleet = fleets[zone_id]
+            candidate_ids = fleet.ids[strategy.rank(fleet, r.volume_m3, r.weight_kg, r.pickup_latitude, r.pickup_longitude)].tolist()
+            vehicle_id = await reserve_slot_in_zone(
+                db, zone_id, r.id, r.volume_m3, r.weight_kg,
+                r.delivery_window_start, r.delivery_window_end, candidate_ids
+            )
+            if vehicle_id is not None:
+                slot_applied.append((r.id, vehicle_id))
+        if slot_applied:
+            await db.execute(
+                update(Order.__table__)
+                .where(Order.__table__.c.id == bindparam("b_id"))
+                .values(assigned_vehicle_id=bindparam("b_vehicle_id"), status=models.OrderStatus.ASSIGNED),
+                [{"b_id": order_id, "b_vehicle_id": vehicle_id} for order_id, vehicle_id in slot_applied]
+            )
+        applied = applied + slot_applied
+        # The zone ids changed on every claimed order. Versions go last, once
+        # the vehicle locks are held (see order_versions.py).
+        await touch_orders(db, {r.user_id for r in rows})
+
+    if applied:
+        await touch_vehicle_loads(db)
+    await db.commit()
+
+    now = datetime.now(timezone.utc)
+    stats.record([(now - enqueued_at).total_seconds() for _, enqueued_at in claimed], len(applied))
+
+
+async def _worker_loop():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                claimed = await process_batch(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Assignment queue batch failed: {e}")
+            claimed = 0
+        # A full batch means more is probably waiting
+        if claimed < ASSIGNMENT_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wake.wait(), ASSIGNMENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wake.clear()
+
+
+def start_assignment_workers():
+    if not queue_enabled() or _workers:
+        return
+    for _ in range(ASSIGNMENT_QUEUE_WORKERS):
+        _workers.append(asyncio.create_task(_worker_loop()))
+
+
+async def stop_assignment_workers():
+    # Cancelling rolls back any batch in flight, leaving its orders queued
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def queue_depth(db: AsyncSession) -> tuple[int, Optional[float], int]:
+    # (queued orders, age in seconds of the oldest one, failed orders)
+    live = AssignmentQueueItem.failed_at.is_(None)
+    result = await db.execute(
+        select(
+            func.count(AssignmentQueueItem.id).filter(live),
+            func.extract("epoch", func.now() - func.min(AssignmentQueueItem.enqueued_at).filter(live)),
+            func.count(AssignmentQueueItem.id).filter(AssignmentQueueItem.failed_at.is_not(None))
+        )
+    )
+    depth, oldest_age, failed = result.one()
+    return depth, float(oldest_age) if oldest_age is not None else None, failed
@@ -0,0 +1,181 @@
+import os
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from geo import haversine_m
+from models import Order, Vehicle
+from vehicle_load import ACTIVE_STATUSES
+
+# Policies for picking the vehicle a new order goes to, among the vehicles
+# of its pickup zone. Each strategy ranks the vehicles that still fit the
+# order, most preferred first; the caller reserves capacity on the first
+# one it can (see vehicle_load.reserve_in_zone).
+#   first_fit    - lowest vehicle id (the original behaviour)
+#   best_fit     - the vehicle the order leaves with the least spare capacity
+#   least_loaded - the vehicle with the lowest utilization
+#   nearest      - the vehicle whose active pickups are centred closest to
+#                  the order's pickup; empty vehicles come last
+
+ASSIGNMENT_STRATEGY = os.getenv("ASSIGNMENT_STRATEGY", "first_fit")
+
+
+class FleetSnapshot:
+    # Vehicles of one zone as arrays, sorted by id. lat/lng is the centroid
+    # of each vehicle's active pickups, NaN for an empty vehicle.
+
+    def __init__(self, ids, max_volumes, max_weights, current_volumes, current_weights,
+                 lats=None, lngs=None, stop_counts=None):
+        order = np.argsort(np.asarray(ids, dtype=np.int64), kind="stable")
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.max_volume = np.asarray(max_volumes, dtype=np.float64)[order]
+        self.max_weight = np.asarray(max_weights, dtype=np.float64)[order]
+        self.volume = np.asarray(current_volumes, dtype=np.float64)[order]
+        self.weight = np.asarray(current_weights, dtype=np.float64)[order]
+        n = len(self.ids)
+        self.lat = np.full(n, np.nan) if lats is None else np.asarray(lats, dtype=np.float64)[order]
+        self.lng = np.full(n, np.nan) if lngs is None else np.asarray(lngs, dtype=np.float64)[order]
+        self.stops = np.zeros(n, dtype=np.int64) if stop_counts is None else np.asarray(stop_counts, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def fits(self, volume_m3: float, weight_kg: float) -> np.ndarray:
+        return (self.max_volume - self.volume >= volume_m3) & (self.max_weight - self.weight >= weight_kg)
+
+    def add(self, i: int, volume_m3: float, weight_kg: float, lat: Optional[float] = None, lng: Optional[float] = None):
+        # Record an assignment so later decisions see it
+        self.volume[i] += volume_m3
+        self.weight[i] += weight_kg
+        if lat is not None and lng is not None:
+            count = self.stops[i]
+            if count == 0:
+                self.lat[i], self.lng[i] = lat, lng
+            else:
+                self.lat[i] = (self.lat[i] * count + lat) / (count + 1)
+                self.lng[i] = (self.lng[i] * count + lng) / (count + 1)
+            self.stops[i] = count + 1
+
+    def utilization(self) -> np.ndarray:
+        # Larger of volume and weight utilization, per vehicle
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volume = np.where(self.max_volume > 0, self.volume / self.max_volume, 1.0)
+            weight = np.where(self.max_weight > 0, self.weight / self.max_weight, 1.0)
+        return np.maximum(volume, weight)
+
+
+class AssignmentStrategy:
+    name = ""
+    # Whether rank() uses vehicle positions, which cost an extra query live
+    needs_positions = False
+
+    def rank(self, fleet: FleetSnapshot, volume_m3: float, weight_kg: float,
+             lat: Optional[float] = None, lng: Optional[float] = None) -> np.ndarray:
+        # Indices of the vehicles that fit, most preferred first
+        fitting = np.flatnonzero(fleet.fits(volume_m3, weight_kg))
+        if len(fitting) == 0:
+            return fitting
+        key = self.score(fleet, fitting, volume_m3, weight_kg, lat, lng)
+        if key is None:
+            return fitting
+        # Stable, so equal scores keep id order
+        return fitting[np.argsort(key, kind="stable")]
+
+    def score(self, fleet, fitting, volume_m3, weight_kg, lat, lng) -> Optional[np.ndarray]:
+        # Lower is better; None keeps id order
+        return None
+
+    def choose(self, fleet: FleetSnapshot, volume_m3: float, weight_kg: float,
+               lat: Optional[float] = None, lng: Optional[float] = None) -> int:
+        # Index of the preferred vehicle, or -1 if none fits
+        ranked = self.rank(fleet, volume_m3, weight_kg, lat, lng)
+        return int(ranked[0]) if len(ranked) else -1
+
+
+class FirstFit(AssignmentStrategy):
+    name = "first_fit"
+
+    def choose(self, fleet, volume_m3, weight_kg, lat=None, lng=None):
+        fits = fleet.fits(volume_m3, weight_kg)
+        return int(np.argmax(fits)) if fits.any() else -1
+
+
+class BestFit(AssignmentStrategy):
+    name = "best_fit"
+
+    def score(self, fleet, fitting, volume_m3, weight_kg, lat, lng):
+        # Spare capacity left after the order, as a share of each dimension
+        spare_volume = (fleet.max_volume[fitting] - fleet.volume[fitting] - volume_m3) / np.maximum(fleet.max_volume[fitting], 1e-9)
+        spare_weight = (fleet.max_weight[fitting] - fleet.weight[fitting] - weight_kg) / np.maximum(fleet.max_weight[fitting], 1e-9)
+        return spare_volume + spare_weight
+
+
+class LeastLoaded(AssignmentStrategy):
+    name = "least_loaded"
+
+    def score(self, fleet, fitting, volume_m3, weight_kg, lat, lng):
+        return fleet.utilization()[fitting]
+
+
+class Nearest(AssignmentStrategy):
+    name = "nearest"
+    needs_positions = True
+
+    def score(self, fleet, fitting, volume_m3, weight_kg, lat, lng):
+        if lat is None or lng is None:
+            return None
+        distance = haversine_m(lat, lng, fleet.lat[fitting], fleet.lng[fitting])
+        return np.where(np.isnan(distance), np.inf, distance)
+
+
+STRATEGIES = {s.name: s for s in (FirstFit(), BestFit(), LeastLoaded(), Nearest())}
+
+if ASSIGNMENT_STRATEGY not in STRATEGIES:
+    raise ValueError(f"ASSIGNMENT_STRATEGY must be one of {tuple(STRATEGIES)}")
+
+
+def get_strategy(name: Optional[str] = None) -> AssignmentStrategy:
+    return STRATEGIES[name or ASSIGNMENT_STRATEGY]
+
+
+async def load_fleet_snapshots(db: AsyncSession, zone_ids, with_positions: bool = False) -> dict[int, FleetSnapshot]:
+    # {zone_id: FleetSnapshot} of the zones' vehicles and their live loads
+    zone_ids = list(zone_ids)
+    if not zone_ids:
+        return {}
+    result = await db.execute(
+        select(Vehicle.id, Vehicle.zone_id, Vehicle.max_volume_m3, Vehicle.max_weight_kg,
+               Vehicle.current_volume_m3, Vehicle.current_weight_kg)
+        .where(Vehicle.zone_id.in_(zone_ids))
+    )
+    rows = result.all()
+
+    positions = {}
+    if with_positions and rows:
+        p_res = await db.execute(
+            select(Order.assigned_vehicle_id, func.avg(Order.pickup_latitude), func.avg(Order.pickup_longitude), func.count())
+            .where(
+                Order.assigned_vehicle_id.in_([r.id for r in rows]),
+                Order.status.in_(ACTIVE_STATUSES),
+                Order.pickup_latitude.is_not(None),
+                Order.pickup_longitude.is_not(None)
+            )
+            .group_by(Order.assigned_vehicle_id)
+        )
+        positions = {vehicle_id: (lat, lng, count) for vehicle_id, lat, lng, count in p_res.all()}
+
+    by_zone: dict[int, list] = {}
+    for r in rows:
+        by_zone.setdefault(r.zone_id, []).append(r)
+    snapshots = {}
+    for zone_id, vehicles in by_zone.items():
+        located = [positions.get(v.id, (np.nan, np.nan, 0)) for v in vehicles]
+        snapshots[zone_id] = FleetSnapshot(
+            [v.id for v in vehicles],
+            [v.max_volume_m3 for v in vehicles], [v.max_weight_kg for v in vehicles],
+            [v.current_volume_m3 for v in vehicles], [v.current_weight_kg for v in vehicles],
+            [p[0] for p in located], [p[1] for p in located], [p[2] for p in located]
+        )
+    return snapshots
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Packs a zone's PENDING orders onto its vehicles in one pass, respecting
+# both remaining volume and remaining weight.
+#   ffd - first-fit decreasing: each order goes to the first vehicle with room
+#   bfd - best-fit decreasing: each order goes to the vehicle it leaves the
+#         least spare capacity on
+# Orders are taken largest first, where size is the larger of the order's
+# volume and weight as a share of the zone's average vehicle capacity.
+
+STRATEGIES = ("ffd", "bfd")
+
+
+def pack_orders(volumes, weights, max_volumes, max_weights, current_volumes, current_weights, strategy: str = "ffd") -> np.ndarray:
+    # Returns, per order, the index of the chosen vehicle or -1 if nothing fits
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}")
+    volumes = np.asarray(volumes, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    max_volumes = np.asarray(max_volumes, dtype=np.float64)
+    max_weights = np.asarray(max_weights, dtype=np.float64)
+    remaining_volume = max_volumes - np.asarray(current_volumes, dtype=np.float64)
+    remaining_weight = max_weights - np.asarray(current_weights, dtype=np.float64)
+
+    choice = np.full(len(volumes), -1, dtype=np.int64)
+    if len(volumes) == 0 or len(max_volumes) == 0:
+        return choice
+
+    # Guard zero capacities so the normalisation never divides by zero
+    volume_scale = max(max_volumes.mean(), 1e-9)
+    weight_scale = max(max_weights.mean(), 1e-9)
+    size = np.maximum(volumes / volume_scale, weights / weight_scale)
+    inv_volume = 1.0 / np.maximum(max_volumes, 1e-9)
+    inv_weight = 1.0 / np.maximum(max_weights, 1e-9)
+
+    for i in np.argsort(-size, kind="stable"):
+        fits = (remaining_volume >= volumes[i]) & (remaining_weight >= weights[i])
+        if not fits.any():
+            continue
+        if strategy == "ffd":
+            v = int(np.argmax(fits))
+        else:
+            slack = (remaining_volume - volumes[i]) * inv_volume + (remaining_weight - weights[i]) * inv_weight
+            v = int(np.argmin(np.where(fits, slack, np.inf)))
+        choice[i] = v
+        remaining_volume[v] -= volumes[i]
+        remaining_weight[v] -= weights[i]
+    return choice
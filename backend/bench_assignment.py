@@ -0,0 +1,79 @@
+import json
+import sys
+import time
+import numpy as np
+from assignment_strategies import STRATEGIES, FleetSnapshot
+
+# Replays an order stream against an in-memory fleet snapshot with every
+# assignment strategy and reports decision latency, vehicles used and
+# utilization, to compare policies before setting ASSIGNMENT_STRATEGY.
+#
+#   python bench_assignment.py                 synthetic stream
+#   python bench_assignment.py orders.jsonl    recorded stream, one JSON
+#       object per line with volume_m3, weight_kg, pickup_latitude and
+#       pickup_longitude (e.g. exported from the orders table)
+
+LATENCY_BUDGET_US = 1000
+rng = np.random.default_rng(11)
+CENTER = (12.9716, 77.5946)
+
+def synthetic_orders(n=20000):
+    # Mostly small parcels with a tail of bulky ones, spread over ~20 km
+    return {
+        "volume_m3": np.round(rng.lognormal(-3.5, 0.9, n), 4),
+        "weight_kg": np.round(rng.lognormal(1.5, 0.8, n), 2),
+        "pickup_latitude": rng.uniform(CENTER[0] - 0.09, CENTER[0] + 0.09, n),
+        "pickup_longitude": rng.uniform(CENTER[1] - 0.09, CENTER[1] + 0.09, n),
+    }
+
+def recorded_orders(path):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return {key: np.array([r[key] for r in rows], dtype=np.float64)
+            for key in ("volume_m3", "weight_kg", "pickup_latitude", "pickup_longitude")}
+
+def synthetic_fleet(n=200):
+    # Mixed fleet: vans, small and large trucks
+    kinds = rng.choice(3, n, p=[0.5, 0.35, 0.15])
+    max_volumes = np.array([3.0, 12.0, 30.0])[kinds]
+    max_weights = np.array([500.0, 2500.0, 8000.0])[kinds]
+    return np.arange(1, n + 1), max_volumes, max_weights
+
+def replay(strategy, orders, fleet_spec):
+    ids, max_volumes, max_weights = fleet_spec
+    fleet = FleetSnapshot(ids, max_volumes, max_weights, np.zeros(len(ids)), np.zeros(len(ids)))
+    volumes, weights = orders["volume_m3"], orders["weight_kg"]
+    lats, lngs = orders["pickup_latitude"], orders["pickup_longitude"]
+    latencies = np.empty(len(volumes))
+    assigned = 0
+    spread = []
+    for k in range(len(volumes)):
+        lat, lng = float(lats[k]), float(lngs[k])
+        start = time.perf_counter()
+        i = strategy.choose(fleet, volumes[k], weights[k], lat, lng)
+        if i >= 0:
+            # Distance to the vehicle's other pickups, a proxy for route length
+            if fleet.stops[i] > 0:
+                spread.append(float(np.hypot(fleet.lat[i] - lat, fleet.lng[i] - lng)) * 111320.0)
+            fleet.add(i, volumes[k], weights[k], lat, lng)
+        latencies[k] = time.perf_counter() - start
+        if i >= 0:
+            assigned += 1
+
+    used = fleet.volume > 0
+    utilization = fleet.utilization()[used]
+    lat_us = latencies * 1e6
+    p50, p95, p99 = np.percentile(lat_us, [50, 95, 99])
+    budget = "ok" if p99 <= LATENCY_BUDGET_US else "OVER BUDGET"
+    print(f"{strategy.name:<13} p50 {p50:7.1f}us  p95 {p95:7.1f}us  p99 {p99:7.1f}us ({budget})  "
+          f"assigned {assigned:>6}/{len(volumes)}  vehicles used {used.sum():>4}/{len(fleet)}  "
+          f"utilization mean {utilization.mean() * 100 if used.any() else 0:5.1f}%  "
+          f"pickup spread {np.mean(spread) / 1000 if spread else 0:5.2f} km")
+
+if __name__ == "__main__":
+    orders = recorded_orders(sys.argv[1]) if len(sys.argv) > 1 else synthetic_orders()
+    fleet_spec = synthetic_fleet()
+    print(f"Replaying {len(orders['volume_m3'])} orders against {len(fleet_spec[0])} vehicles "
+          f"(latency budget {LATENCY_BUDGET_US}us per decision)")
+    for strategy in STRATEGIES.values():
+        replay(strategy, orders, fleet_spec)
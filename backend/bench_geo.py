@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from geo import haversine_m, haversine_one_to_many, haversine_matrix, iter_haversine_matrix
+
+# Synthetic points spread over a ~50 km city box
+rng = np.random.default_rng(42)
+
+def random_points(n):
+    return rng.uniform(12.75, 13.20, n), rng.uniform(77.35, 77.85, n)
+
+def bench_scalar_loop(n=20000):
+    lats, lngs = random_points(n)
+    start = time.perf_counter()
+    for i in range(n):
+        haversine_m(lats[0], lngs[0], lats[i], lngs[i])
+    elapsed = time.perf_counter() - start
+    print(f"Scalar calls:      {n:>12,} pairs in {elapsed:7.3f}s  ({n / elapsed:,.0f} pairs/s)")
+
+def bench_one_to_many(n=1000000):
+    lats, lngs = random_points(n)
+    start = time.perf_counter()
+    haversine_one_to_many(lats[0], lngs[0], lats, lngs)
+    elapsed = time.perf_counter() - start
+    print(f"One-to-many:       {n:>12,} pairs in {elapsed:7.3f}s  ({n / elapsed:,.0f} pairs/s)")
+
+def bench_matrix(n=2000):
+    lats, lngs = random_points(n)
+    start = time.perf_counter()
+    haversine_matrix(lats, lngs)
+    elapsed = time.perf_counter() - start
+    print(f"Matrix {n}x{n}:    {n * n:>12,} pairs in {elapsed:7.3f}s  ({n * n / elapsed:,.0f} pairs/s)")
+
+def bench_chunked_matrix(n=10000):
+    # 10k x 10k would be 400 MB as one float32 matrix; stream it in blocks
+    # and reduce each block (nearest other point) so memory stays bounded
+    lats, lngs = random_points(n)
+    nearest = np.empty(n, dtype=np.float32)
+    start = time.perf_counter()
+    for row, block in iter_haversine_matrix(lats, lngs):
+        idx = np.arange(len(block))
+        block[idx, row + idx] = np.inf
+        nearest[row:row + len(block)] = block.min(axis=1)
+    elapsed = time.perf_counter() - start
+    print(f"Chunked {n}x{n}: {n * n:>12,} pairs in {elapsed:7.3f}s  ({n * n / elapsed:,.0f} pairs/s)")
+    print(f"  mean nearest-neighbour distance: {nearest.mean():.1f} m")
+
+def check_accuracy():
+    # Bangalore -> Chennai, ~290 km
+    d = haversine_m(12.9716, 77.5946, 13.0827, 80.2707)
+    m = haversine_matrix([12.9716], [77.5946], [13.0827], [80.2707])[0, 0]
+    print(f"Bangalore-Chennai: {d / 1000:.1f} km (matrix {m / 1000:.1f} km)")
+
+if __name__ == "__main__":
+    check_accuracy()
+    bench_scalar_loop()
+    bench_one_to_many()
+    bench_matrix()
+    bench_chunked_matrix()
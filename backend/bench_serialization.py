@@ -0,0 +1,100 @@
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pydantic import TypeAdapter
+
+import models
+from order_listing import ORDER_LIST_COLUMNS
+from order_serializer import dumps, order_dict
+from schemas import OrderResponse
+
+# Per-row cost of turning an order listing into a JSON body.
+#   before: an OrderResponse built per row, then re-validated and encoded
+#           the way FastAPI handles a response_model (dump to JSON-able
+#           python, then json.dumps)
+#   after:  order_dict() per row and one orjson.dumps of the list
+# Rows are namedtuples with the listing's columns, standing in for Core rows.
+
+N_ORDERS = 100000
+rng = np.random.default_rng(7)
+Row = namedtuple("Row", [c.key if c.key != "vehicle_number" else "assigned_vehicle_number" for c in ORDER_LIST_COLUMNS])
+STATUSES = list(models.OrderStatus)
+
+def synthetic_rows(n):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(n):
+        assigned = i % 3 != 0
+        windowed = i % 4 == 0
+        rows.append(Row(
+            id=n - i, user_id=int(rng.integers(1, 500)), item_name=f"Item {i}", status=STATUSES[i % len(STATUSES)],
+            length_cm=float(rng.uniform(10, 120)), width_cm=float(rng.uniform(10, 80)), height_cm=float(rng.uniform(5, 60)),
+            weight_kg=float(rng.uniform(0.5, 40)), volume_m3=float(rng.uniform(0.001, 0.5)),
+            pickup_location=None, pickup_latitude=float(rng.uniform(12.8, 13.1)), pickup_longitude=float(rng.uniform(77.4, 77.8)),
+            pickup_address="12 Main Road, Bengaluru",
+            drop_latitude=float(rng.uniform(12.8, 13.1)), drop_longitude=float(rng.uniform(77.4, 77.8)),
+            drop_address="4 Cross Street, Bengaluru",
+            pickup_zone_id=int(rng.integers(1, 20)), drop_zone_id=int(rng.integers(1, 20)),
+            pickup_zone_fallback_m=None, drop_zone_fallback_m=None,
+            assigned_vehicle_id=int(rng.integers(1, 200)) if assigned else None,
+            delivery_window_start=now + timedelta(hours=2) if windowed else None,
+            delivery_window_end=now + timedelta(hours=4) if windowed else None,
+            driver_confirmed_delivery=False, user_confirmed_delivery=False,
+            created_at=now - timedelta(minutes=i),
+            assigned_vehicle_number=f"KA01AB{i % 10000:04d}" if assigned else None,
+        ))
+    return rows
+
+def before(rows) -> bytes:
+    # The old handlers: parse, build and validate a model per row ...
+    models_out = []
+    for o in rows:
+        lat, lon = 0.0, 0.0
+        if o.pickup_location:
+            try:
+                lat, lon = map(float, o.pickup_location.split(','))
+            except ValueError:
+                pass
+        if o.pickup_latitude is not None: lat = o.pickup_latitude
+        if o.pickup_longitude is not None: lon = o.pickup_longitude
+        models_out.append(OrderResponse(
+            id=o.id, user_id=o.user_id, item_name=o.item_name,
+            length_cm=o.length_cm, width_cm=o.width_cm, height_cm=o.height_cm,
+            weight_kg=o.weight_kg, volume_m3=o.volume_m3, status=o.status,
+            assigned_vehicle_id=o.assigned_vehicle_id, assigned_vehicle_number=o.assigned_vehicle_number,
+            pickup_zone_id=o.pickup_zone_id, drop_zone_id=o.drop_zone_id,
+            pickup_zone_fallback_m=o.pickup_zone_fallback_m, drop_zone_fallback_m=o.drop_zone_fallback_m,
+            driver_confirmed_delivery=o.driver_confirmed_delivery, user_confirmed_delivery=o.user_confirmed_delivery,
+            pickup_latitude=lat, pickup_longitude=lon, pickup_address=o.pickup_address,
+            drop_latitude=o.drop_latitude, drop_longitude=o.drop_longitude, drop_address=o.drop_address,
+            delivery_window_start=o.delivery_window_start, delivery_window_end=o.delivery_window_end,
+            created_at=o.created_at, latitude=lat, longitude=lon
+        ))
+    # ... then FastAPI validates against response_model again and encodes
+    adapter = TypeAdapter(list[OrderResponse])
+    validated = adapter.validate_python(models_out, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+def after(rows) -> bytes:
+    return dumps([order_dict(r) for r in rows])
+
+def bench(name, fn, rows, repeats=3):
+    best = min(_timed(fn, rows) for _ in range(repeats))
+    print(f"{name:<7} {best:7.3f}s for {len(rows):,} rows  ({best / len(rows) * 1e6:6.2f} us/row)")
+    return best
+
+def _timed(fn, rows):
+    start = time.perf_counter()
+    fn(rows)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    rows = synthetic_rows(N_ORDERS)
+    # Same documents either way
+    assert json.loads(before(rows[:1000])) == json.loads(after(rows[:1000]))
+    slow = bench("before", before, rows)
+    fast = bench("after", after, rows)
+    print(f"Speed-up: {slow / fast:.1f}x")
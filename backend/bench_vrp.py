@@ -0,0 +1,72 @@
+import time
+import numpy as np
+from vrp import VRP_DAY_START_HOUR, VRP_DAY_END_HOUR, plan_routes
+
+# Synthetic single-zone instances: orders spread over a ~20 km box around
+# the depot, a third with a 2-hour delivery window, the rest open all day.
+# Vehicles get capacity for ~40 average orders each.
+rng = np.random.default_rng(7)
+DEPOT = (12.9716, 77.5946)
+
+def synthetic_instance(n_orders):
+    lats = rng.uniform(DEPOT[0] - 0.09, DEPOT[0] + 0.09, n_orders)
+    lngs = rng.uniform(DEPOT[1] - 0.09, DEPOT[1] + 0.09, n_orders)
+    volumes = rng.uniform(0.01, 0.2, n_orders)
+    weights = rng.uniform(1, 25, n_orders)
+
+    day_start, day_end = VRP_DAY_START_HOUR * 60, VRP_DAY_END_HOUR * 60
+    earliest = np.full(n_orders, float(day_start))
+    latest = np.full(n_orders, float(day_end))
+    windowed = rng.random(n_orders) < 1 / 3
+    window_start = rng.integers(day_start, day_end - 120, n_orders)
+    earliest[windowed] = window_start[windowed]
+    latest[windowed] = window_start[windowed] + 120
+
+    n_vehicles = max(1, n_orders // 40)
+    capacity_volumes = np.full(n_vehicles, volumes.mean() * 45)
+    capacity_weights = np.full(n_vehicles, weights.mean() * 45)
+    return lats, lngs, volumes, weights, earliest, latest, capacity_volumes, capacity_weights
+
+def bench(n_orders, time_budget_seconds):
+    lats, lngs, volumes, weights, earliest, latest, capacity_volumes, capacity_weights = synthetic_instance(n_orders)
+    start = time.perf_counter()
+    plan = plan_routes(
+        DEPOT, lats, lngs, volumes, weights, earliest, latest,
+        capacity_volumes, capacity_weights, time_budget_seconds=time_budget_seconds
+    )
+    elapsed = time.perf_counter() - start
+    total = sum(plan["distances"])
+    used = sum(1 for r in plan["routes"] if r)
+    print(f"{n_orders} orders, {len(capacity_volumes)} vehicles, budget {time_budget_seconds}s:")
+    print(f"  construction: {plan['construction_seconds']:7.2f}s  {plan['construction_distance'] / 1000:10.1f} km")
+    print(f"  local search: {elapsed - plan['construction_seconds']:7.2f}s  {total / 1000:10.1f} km  ({plan['search_rounds']} rounds)")
+    print(f"  improvement:  {(1 - total / plan['construction_distance']) * 100:6.1f}%")
+    print(f"  vehicles used: {used}, unassigned orders: {len(plan['unassigned'])}")
+    check_plan(plan, lats, lngs, volumes, weights, earliest, latest, capacity_volumes, capacity_weights)
+
+def check_plan(plan, lats, lngs, volumes, weights, earliest, latest, capacity_volumes, capacity_weights):
+    seen = [k for route in plan["routes"] for k in route] + plan["unassigned"]
+    assert sorted(seen) == list(range(len(lats))), "every order must be routed or unassigned exactly once"
+    for v, (route, arrivals) in enumerate(zip(plan["routes"], plan["arrivals"])):
+        assert volumes[route].sum() <= capacity_volumes[v] + 1e-6, f"vehicle {v} over volume"
+        assert weights[route].sum() <= capacity_weights[v] + 1e-6, f"vehicle {v} over weight"
+        for k, t in zip(route, arrivals):
+            assert earliest[k] - 1e-6 <= t <= latest[k] + 1e-6, f"order {k} outside its window"
+        assert plan["return_times"][v] <= VRP_DAY_END_HOUR * 60 + 1e-6, f"vehicle {v} back late"
+
+def check_no_vehicles(n_orders):
+    # A zone with orders but no vehicles: no routes, every order unassigned
+    lats, lngs, volumes, weights, earliest, latest, _, _ = synthetic_instance(n_orders)
+    no_capacity = np.empty(0)
+    plan = plan_routes(
+        DEPOT, lats, lngs, volumes, weights, earliest, latest,
+        no_capacity, no_capacity, time_budget_seconds=1
+    )
+    assert plan["routes"] == [], "no vehicles means no routes"
+    check_plan(plan, lats, lngs, volumes, weights, earliest, latest, no_capacity, no_capacity)
+    print(f"{n_orders} orders, no vehicles: {len(plan['unassigned'])} unassigned")
+
+if __name__ == "__main__":
+    check_no_vehicles(50)
+    bench(500, time_budget_seconds=5)
+    bench(5000, time_budget_seconds=30)
@@ -0,0 +1,164 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, engine
+from models import EntityVersion
+
+# Cross-worker cache invalidation. Every write to a cached table bumps that
+# entity's version and sends NOTIFY in the same transaction, so other workers
+# hear about it only once the write is committed. Versions only ETags read
+# (no on_invalidate callback) are bumped without NOTIFY. Missed notifications
+# (listener reconnects, poolers without LISTEN) are caught by a version poll.
+
+NOTIFY_CHANNEL = "entity_changed"
+VERSION_POLL_SECONDS = float(os.getenv("CACHE_VERSION_POLL_SECONDS", 5))
+
+_known_versions: dict[str, int] = {}
+_callbacks: dict[str, list[Callable[[], None]]] = {}
+_listener_conn = None
+_poll_task: Optional[asyncio.Task] = None
+
+
+def on_invalidate(entity: str, callback: Callable[[], None]):
+    # callback drops this process's cached copy of entity
+    _callbacks.setdefault(entity, []).append(callback)
+
+
+def apply_version(entity: str, version: int):
+    # Drop local caches if version is newer than what this process has seen.
+    # Entities nothing caches here aren't tracked.
+    if entity not in _callbacks or version <= _known_versions.get(entity, 0):
+        return
+    _known_versions[entity] = version
+    for callback in _callbacks.get(entity, []):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Cache invalidation error ({entity}): {e}")
+
+
+async def bump_version(db: AsyncSession, entity: str) -> int:
+    # Call inside the writing transaction, then apply_version() after commit
+    result = await db.execute(
+        pg_insert(EntityVersion)
+        .values(entity=entity, version=1)
+        .on_conflict_do_update(
+            index_elements=[EntityVersion.entity],
+            set_={"version": EntityVersion.version + 1}
+        )
+        .returning(EntityVersion.version)
+    )
+    version = result.scalar_one()
+    # Only cached entities are announced; the rest are read by ETags alone
+    if entity in _callbacks:
+        await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, f"{entity}:{version}")))
+    return version
+
+
+async def bump_versions_quietly(db: AsyncSession, entities):
+    # Bump many entities in one statement and without NOTIFY, for versions
+    # that only ETags read (nothing caches them in-process). Rows are
+    # touched in name order so concurrent writers can't deadlock.
+    entities = sorted(set(entities))
+    if not entities:
+        return
+    await db.execute(
+        pg_insert(EntityVersion)
+        .values([{"entity": entity, "version": 1} for entity in entities])
+        .on_conflict_do_update(
+            index_elements=[EntityVersion.entity],
+            set_={"version": EntityVersion.version + 1}
+        )
+    )
+
+
+def _on_notify(connection, pid, channel, payload):
+    try:
+        entity, version = payload.rsplit(":", 1)
+        apply_version(entity, int(version))
+    except ValueError:
+        print(f"Ignoring malformed cache notification: {payload}")
+
+
+async def poll_versions():
+    # Only entities something caches here; the table also holds a row per
+    # tenant and per vehicle that only ETags and calendars read
+    if not _callbacks:
+        return
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(EntityVersion.entity, EntityVersion.version).where(EntityVersion.entity.in_(list(_callbacks)))
+        )
+        for entity, version in result.all():
+            apply_version(entity, version)
+
+
+async def _poll_loop():
+    while True:
+        await asyncio.sleep(VERSION_POLL_SECONDS)
+        try:
+            await poll_versions()
+        except Exception as e:
+            print(f"Cache version poll failed: {e}")
+
+
+async def start_invalidation_listener():
+    global _listener_conn, _poll_task
+    # Seed known versions first so startup doesn't count as a change
+    await poll_versions()
+    try:
+        _listener_conn = await engine.connect()
+        raw = await _listener_conn.get_raw_connection()
+        await raw.driver_connection.add_listener(NOTIFY_CHANNEL, _on_notify)
+    except Exception as e:
+        print(f"LISTEN unavailable, relying on version polling: {e}")
+        if _listener_conn is not None:
+            await _listener_conn.close()
+            _listener_conn = None
+    _poll_task = asyncio.create_task(_poll_loop())
+
+
+async def stop_invalidation_listener():
+    global _listener_conn, _poll_task
+    if _poll_task is not None:
+        _poll_task.cancel()
+        _poll_task = None
+    if _listener_conn is not None:
+        await _listener_conn.close()
+        _listener_conn = None
+
+
+async def commit_with_versions(db: AsyncSession, *entities: str):
+    # Commit a write to the given entity types and invalidate their caches
+    versions = [(entity, await bump_version(db, entity)) for entity in entities]
+    await db.commit()
+    for entity, version in versions:
+        apply_version(entity, version)
+
+
+async def versions_etag(db: AsyncSession, *entities: str, variant: str = "") -> str:
+    # Weak ETag for a response built from these entity types. Read it before
+    # the data so a response is never newer than its tag claims.
+    result = await db.execute(
+        select(EntityVersion.entity, EntityVersion.version).where(EntityVersion.entity.in_(entities))
+    )
+    versions = dict(result.all())
+    tag = "-".join(f"{entity}.{versions.get(entity, 0)}" for entity in entities)
+    if variant:
+        tag += f"-{variant}"
+    return f'W/"{tag}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
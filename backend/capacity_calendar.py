@@ -0,0 +1,318 @@
+import math
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache_versions import bump_version
+from models import EntityVersion, Vehicle, VehicleReservation
+from vehicle_load import is_active_on_vehicle, remove_vehicle_load
+
+# Time-slotted vehicle capacity. An order with a delivery window reserves
+# its volume and weight on the vehicle for every slot the window touches,
+# in vehicle_reservations, instead of adding to the live load counters.
+# Orders without a window keep using the counters (vehicle_load.py) and,
+# since they stay on board until delivered, must also fit next to the
+# busiest slot still ahead.
+#
+# Each process keeps a per-vehicle calendar of the reservations: two range
+# trees (volume and weight) over the booking horizon supporting "add load to
+# slots l..r" and "peak load in slots l..r" in O(log n). A calendar is
+# checked against the vehicle's reservation version (entity_versions row
+# "reservations:<vehicle_id>", bumped with every reservation change) before
+# use; writers hold the vehicle's row lock, so the check can't race.
+
+CAPACITY_SLOT_MINUTES = int(os.getenv("CAPACITY_SLOT_MINUTES", 60))
+CAPACITY_HORIZON_DAYS = int(os.getenv("CAPACITY_HORIZON_DAYS", 30))
+CAPACITY_CALENDAR_CACHE_SIZE = int(os.getenv("CAPACITY_CALENDAR_CACHE_SIZE", 4096))
+HORIZON_SLOTS = CAPACITY_HORIZON_DAYS * 24 * 60 // CAPACITY_SLOT_MINUTES
+EPSILON = 1e-9
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_SLOT = timedelta(minutes=CAPACITY_SLOT_MINUTES)
+
+
+class SlotTree:
+    # Range add / range max over slots [0, size), bottom-up with lazy
+    # per-node increments (no recursion)
+
+    def __init__(self, size: int):
+        n = 1
+        while n < size:
+            n <<= 1
+        self.n = n
+        self.height = n.bit_length()
+        self.t = [0.0] * (2 * n)
+        self.d = [0.0] * n
+
+    def _apply(self, p: int, value: float):
+        self.t[p] += value
+        if p < self.n:
+            self.d[p] += value
+
+    def _build(self, p: int):
+        t, d = self.t, self.d
+        while p > 1:
+            p >>= 1
+            t[p] = max(t[2 * p], t[2 * p + 1]) + d[p]
+
+    def _push(self, p: int):
+        d = self.d
+        for s in range(self.height, 0, -1):
+            i = p >> s
+            if i and d[i] != 0.0:
+                self._apply(2 * i, d[i])
+                self._apply(2 * i + 1, d[i])
+                d[i] = 0.0
+
+    def add(self, l: int, r: int, value: float):
+        # Adds value to slots l..r-1
+        if l >= r:
+            return
+        l += self.n
+        r += self.n
+        l0, r0 = l, r
+        while l < r:
+            if l & 1:
+                self._apply(l, value)
+                l += 1
+            if r & 1:
+                r -= 1
+                self._apply(r, value)
+            l >>= 1
+            r >>= 1
+        self._build(l0)
+        self._build(r0 - 1)
+
+    def peak(self, l: int, r: int) -> float:
+        # Largest value over slots l..r-1
+        if l >= r:
+            return 0.0
+        l += self.n
+        r += self.n
+        self._push(l)
+        self._push(r - 1)
+        result = -math.inf
+        t = self.t
+        while l < r:
+            if l & 1:
+                result = max(result, t[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                result = max(result, t[r])
+            l >>= 1
+            r >>= 1
+        return result
+
+
+def slot_index(t: datetime) -> int:
+    # Absolute slot number; naive datetimes are taken as UTC
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return (t - _EPOCH) // _SLOT
+
+
+def horizon_base() -> int:
+    # First slot of the booking horizon: the start of the current UTC day
+    now = datetime.now(timezone.utc)
+    return slot_index(now.replace(hour=0, minute=0, second=0, microsecond=0))
+
+
+def check_slot(start: datetime, end: datetime):
+    # ValueError unless [start, end) is a non-empty range inside the horizon
+    if end <= start:
+        raise ValueError("Slot end must be after its start")
+    base = horizon_base()
+    if slot_index(end - timedelta(microseconds=1)) < slot_index(datetime.now(timezone.utc)):
+        raise ValueError("Slot is in the past")
+    if slot_index(end - timedelta(microseconds=1)) >= base + HORIZON_SLOTS:
+        raise ValueError(f"Slot ends beyond the {CAPACITY_HORIZON_DAYS}-day booking horizon")
+
+
+class VehicleCalendar:
+    def __init__(self, base: int, version: int):
+        self.base = base
+        self.version = version
+        self.volume = SlotTree(HORIZON_SLOTS)
+        self.weight = SlotTree(HORIZON_SLOTS)
+        self.reservations = 0
+
+    def slot_range(self, start: datetime, end: datetime) -> tuple[int, int]:
+        # Horizon-relative slots touched by [start, end), clipped to the horizon
+        l = slot_index(start) - self.base
+        r = slot_index(end - timedelta(microseconds=1)) - self.base + 1
+        return max(l, 0), min(r, HORIZON_SLOTS)
+
+    def add(self, start: datetime, end: datetime, volume_m3: float, weight_kg: float):
+        l, r = self.slot_range(start, end)
+        self.volume.add(l, r, volume_m3)
+        self.weight.add(l, r, weight_kg)
+        self.reservations += 1
+
+    def peak(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> tuple[float, float]:
+        # Peak reserved (volume, weight) over [start, end); whole horizon
+        # from the current slot when omitted
+        if start is None:
+            l, r = slot_index(datetime.now(timezone.utc)) - self.base, HORIZON_SLOTS
+        else:
+            l, r = self.slot_range(start, end)
+        return max(self.volume.peak(l, r), 0.0), max(self.weight.peak(l, r), 0.0)
+
+
+def reservation_entity(vehicle_id: int) -> str:
+    return f"reservations:{vehicle_id}"
+
+
+_calendars: "OrderedDict[int, VehicleCalendar]" = OrderedDict()
+
+
+async def get_calendar(db: AsyncSession, vehicle_id: int) -> VehicleCalendar:
+    return (await get_calendars(db, [vehicle_id]))[vehicle_id]
+
+
+async def get_calendars(db: AsyncSession, vehicle_ids) -> dict[int, VehicleCalendar]:
+    # Calendars of several vehicles, their versions checked in one query
+    vehicle_ids = list(dict.fromkeys(vehicle_ids))
+    if not vehicle_ids:
+        return {}
+    result = await db.execute(
+        select(EntityVersion.entity, EntityVersion.version)
+        .where(EntityVersion.entity.in_([reservation_entity(v) for v in vehicle_ids]))
+    )
+    versions = dict(result.all())
+    base = horizon_base()
+    calendars = {}
+    for vehicle_id in vehicle_ids:
+        version = versions.get(reservation_entity(vehicle_id)) or 0
+        calendar = _calendars.get(vehicle_id)
+        if calendar is None or calendar.version != version or calendar.base != base:
+            calendar = await _load_calendar(db, vehicle_id, base, version)
+            _calendars[vehicle_id] = calendar
+        _calendars.move_to_end(vehicle_id)
+        calendars[vehicle_id] = calendar
+    while len(_calendars) > CAPACITY_CALENDAR_CACHE_SIZE:
+        _calendars.popitem(last=False)
+    return calendars
+
+
+async def _load_calendar(db: AsyncSession, vehicle_id: int, base: int, version: int,
+                         exclude_order_ids=()) -> VehicleCalendar:
+    calendar = VehicleCalendar(base, version)
+    horizon_start = _EPOCH + base * _SLOT
+    stmt = (
+        select(VehicleReservation.start_at, VehicleReservation.end_at,
+               VehicleReservation.volume_m3, VehicleReservation.weight_kg)
+        .where(VehicleReservation.vehicle_id == vehicle_id, VehicleReservation.end_at > horizon_start)
+    )
+    if exclude_order_ids:
+        stmt = stmt.where(VehicleReservation.order_id.not_in(exclude_order_ids))
+    for start, end, volume, weight in (await db.execute(stmt)).all():
+        calendar.add(start, end, volume, weight)
+    return calendar
+
+
+async def reserved_peaks(db: AsyncSession, vehicle_ids, exclude_order_ids=()) -> dict[int, tuple[float, float]]:
+    # Peak reserved (volume, weight) ahead on each vehicle: what an
+    # unslotted load must fit next to (see fits_reservations). Reservations
+    # of exclude_order_ids are left out; those calendars are read afresh
+    # instead of from the cache.
+    if not exclude_order_ids:
+        calendars = await get_calendars(db, vehicle_ids)
+    else:
+        base = horizon_base()
+        calendars = {v: await _load_calendar(db, v, base, 0, exclude_order_ids) for v in dict.fromkeys(vehicle_ids)}
+    return {
+        vehicle_id: calendar.peak() if calendar.reservations else (0.0, 0.0)
+        for vehicle_id, calendar in calendars.items()
+    }
+
+
+async def _lock_vehicle(db: AsyncSession, vehicle_id: int, skip_locked: bool):
+    result = await db.execute(
+        select(Vehicle.max_volume_m3, Vehicle.max_weight_kg, Vehicle.current_volume_m3, Vehicle.current_weight_kg)
+        .where(Vehicle.id == vehicle_id)
+        .with_for_update(skip_locked=skip_locked)
+    )
+    return result.first()
+
+
+async def reserve_slot(db: AsyncSession, vehicle_id: int, order_id: int, volume_m3: float, weight_kg: float,
+                       start: datetime, end: datetime, skip_locked: bool = False) -> Optional[bool]:
+    # Reserve capacity on the vehicle for [start, end). Returns True when
+    # reserved, False when it doesn't fit, and None when skip_locked is set
+    # and another transaction holds the vehicle.
+    vehicle = await _lock_vehicle(db, vehicle_id, skip_locked)
+    if vehicle is None:
+        return None
+    calendar = await get_calendar(db, vehicle_id)
+    peak_volume, peak_weight = calendar.peak(start, end)
+    # Unslotted orders on board count against every slot
+    if (vehicle.max_volume_m3 - vehicle.current_volume_m3 - peak_volume < volume_m3 - EPSILON
+            or vehicle.max_weight_kg - vehicle.current_weight_kg - peak_weight < weight_kg - EPSILON):
+        return False
+    db.add(VehicleReservation(
+        vehicle_id=vehicle_id, order_id=order_id, start_at=start, end_at=end,
+        volume_m3=volume_m3, weight_kg=weight_kg
+    ))
+    await bump_version(db, reservation_entity(vehicle_id))
+    return True
+
+
+async def reserve_slot_in_zone(db: AsyncSession, zone_id: int, order_id: int, volume_m3: float, weight_kg: float,
+                               start: datetime, end: datetime, candidate_ids: Optional[list[int]] = None) -> Optional[int]:
+    # Slotted counterpart of vehicle_load.reserve_in_zone: first vehicle (by
+    # id, or in candidate_ids order) with room in the slot. Vehicles locked
+    # by other transactions are skipped at first and waited on after.
+    if candidate_ids is None:
+        result = await db.execute(
+            select(Vehicle.id)
+            .where(Vehicle.zone_id == zone_id, Vehicle.max_volume_m3 >= volume_m3, Vehicle.max_weight_kg >= weight_kg)
+            .order_by(Vehicle.id)
+        )
+        candidate_ids = result.scalars().all()
+    locked = []
+    for vehicle_id in candidate_ids:
+        reserved = await reserve_slot(db, vehicle_id, order_id, volume_m3, weight_kg, start, end, skip_locked=True)
+        if reserved:
+            return vehicle_id
+        if reserved is None:
+            locked.append(vehicle_id)
+    for vehicle_id in locked:
+        if await reserve_slot(db, vehicle_id, order_id, volume_m3, weight_kg, start, end):
+            return vehicle_id
+    return None
+
+
+async def fits_reservations(db: AsyncSession, vehicle_id: int) -> bool:
+    # For an unslotted order just added to the counters (so the vehicle row
+    # is locked): does the load still fit next to the busiest slot ahead?
+    calendar = await get_calendar(db, vehicle_id)
+    if calendar.reservations == 0:
+        return True
+    vehicle = await _lock_vehicle(db, vehicle_id, False)
+    peak_volume, peak_weight = calendar.peak()
+    return (vehicle.current_volume_m3 + peak_volume <= vehicle.max_volume_m3 + EPSILON
+            and vehicle.current_weight_kg + peak_weight <= vehicle.max_weight_kg + EPSILON)
+
+
+async def release_order_capacity(db: AsyncSession, order) -> bool:
+    # Frees whatever capacity the order holds: its slot reservation, or its
+    # share of the vehicle's load counters. Returns True when the counters
+    # changed (commit with the "vehicles" version then).
+    result = await db.execute(
+        delete(VehicleReservation)
+        .where(VehicleReservation.order_id == order.id)
+        .returning(VehicleReservation.vehicle_id)
+    )
+    vehicle_id = result.scalar()
+    if vehicle_id is not None:
+        await bump_version(db, reservation_entity(vehicle_id))
+        return False
+    if is_active_on_vehicle(order):
+        await remove_vehicle_load(db, order.assigned_vehicle_id, order.volume_m3, order.weight_kg)
+        return True
+    return False
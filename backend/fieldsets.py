@@ -0,0 +1,45 @@
+from typing import Callable, Optional
+
+from fastapi import Response
+
+from order_serializer import dumps
+
+# Sparse fieldsets: list endpoints take ?fields=a,b,c and return only those
+# response fields, selecting only the SQL columns they need. Each endpoint
+# maps its response fields to the columns they are built from; "id" is
+# always included so rows stay identifiable (and pageable).
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[list[str]]:
+    # Requested fields in response-model order, or None for the full
+    # response. ValueError names any unknown field.
+    if fields is None:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(allowed)}")
+    return [f for f in allowed if f in requested or f == "id"]
+
+
+def fieldset_columns(fields, field_columns: dict) -> list:
+    # The SQL columns behind fields, each once
+    columns = {}
+    for field in fields:
+        for column in field_columns[field]:
+            columns.setdefault(column.key, column)
+    return list(columns.values())
+
+
+def sparse_dicts(rows, fields, computed: Optional[dict[str, Callable]] = None) -> list[dict]:
+    # Rows as {field: value}. Fields in computed are built by calling it with
+    # the row; the rest are read off the row as is.
+    computed = computed or {}
+    return [
+        {f: computed[f](r) if f in computed else getattr(r, f) for f in fields}
+        for r in rows
+    ]
+
+
+def fields_json_response(dicts, headers: Optional[dict] = None) -> Response:
+    return Response(content=dumps(dicts), media_type="application/json", headers=headers)
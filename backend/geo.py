@@ -0,0 +1,80 @@
+import numpy as np
+
+# Great-circle distances in metres between (lat, lng) points, vectorized
+# over NumPy arrays. Math runs in float64 (float32 coordinates lose ~1 m of
+# precision); matrices are returned as float32 and built in row chunks so
+# temporaries stay bounded whatever the matrix size.
+
+EARTH_RADIUS_M = 6371000.0
+# Elements per chunk (rows * columns); ~16 MB per float64 temporary
+MATRIX_CHUNK_ELEMENTS = 1 << 21
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    # Point-to-point distance; arguments broadcast like NumPy ufuncs
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    d = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return float(d) if d.ndim == 0 else d
+
+
+def haversine_one_to_many(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    return haversine_m(lat, lng, lats, lngs).astype(np.float32)
+
+
+class _Points:
+    # Radians and cosines computed once per point set
+    def __init__(self, lats, lngs):
+        self.lat = np.radians(np.asarray(lats, dtype=np.float64).ravel())
+        self.lng = np.radians(np.asarray(lngs, dtype=np.float64).ravel())
+        if self.lat.shape != self.lng.shape:
+            raise ValueError("lats and lngs must have the same length")
+        self.cos_lat = np.cos(self.lat)
+
+    def __len__(self):
+        return len(self.lat)
+
+
+def _matrix_block(a: _Points, b: _Points, start: int, stop: int) -> np.ndarray:
+    lat1 = a.lat[start:stop, None]
+    dlat = np.subtract(b.lat[None, :], lat1)
+    np.multiply(dlat, 0.5, out=dlat)
+    np.sin(dlat, out=dlat)
+    np.square(dlat, out=dlat)
+
+    dlng = np.subtract(b.lng[None, :], a.lng[start:stop, None])
+    np.multiply(dlng, 0.5, out=dlng)
+    np.sin(dlng, out=dlng)
+    np.square(dlng, out=dlng)
+    np.multiply(dlng, a.cos_lat[start:stop, None], out=dlng)
+    np.multiply(dlng, b.cos_lat[None, :], out=dlng)
+
+    np.add(dlat, dlng, out=dlat)
+    np.minimum(dlat, 1.0, out=dlat)
+    np.sqrt(dlat, out=dlat)
+    np.arcsin(dlat, out=dlat)
+    np.multiply(dlat, 2 * EARTH_RADIUS_M, out=dlat)
+    return dlat.astype(np.float32)
+
+
+def iter_haversine_matrix(lats_a, lngs_a, lats_b=None, lngs_b=None, chunk_rows: int = None):
+    # Yields (row_start, block) with block[i, j] the distance from point
+    # row_start + i of a to point j of b. Use this for matrices too large to
+    # hold; memory stays at one block.
+    a = _Points(lats_a, lngs_a)
+    b = a if lats_b is None else _Points(lats_b, lngs_b)
+    if chunk_rows is None:
+        chunk_rows = max(1, MATRIX_CHUNK_ELEMENTS // max(len(b), 1))
+    for start in range(0, len(a), chunk_rows):
+        stop = min(start + chunk_rows, len(a))
+        yield start, _matrix_block(a, b, start, stop)
+
+
+def haversine_matrix(lats_a, lngs_a, lats_b=None, lngs_b=None, chunk_rows: int = None) -> np.ndarray:
+    # Full float32 distance matrix, a x b (a x a when b is omitted)
+    n = np.asarray(lats_a).size
+    m = n if lats_b is None else np.asarray(lats_b).size
+    out = np.empty((n, m), dtype=np.float32)
+    for start, block in iter_haversine_matrix(lats_a, lngs_a, lats_b, lngs_b, chunk_rows):
+        out[start:start + len(block)] = block
+    return out
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+
+# Picks a subset of items (orders) maximizing total value under two
+# capacities (volume and weight) - the 2-D 0/1 knapsack. Exact solutions are
+# exponential, so this runs a few greedy orderings, keeps the best, and then
+# improves it with swap-and-refill moves until the time budget runs out.
+#
+# Item sizes are normalized by the capacities, so "size" below means the
+# share of the vehicle's remaining volume plus the share of its weight.
+
+KNAPSACK_TIME_BUDGET_SECONDS = 0.2
+EPSILON = 1e-9
+
+
+def _greedy(order, volumes, weights, cap_volume, cap_weight) -> np.ndarray:
+    chosen = np.zeros(len(volumes), dtype=bool)
+    volume_left, weight_left = cap_volume, cap_weight
+    for k in order:
+        if volumes[k] <= volume_left + EPSILON and weights[k] <= weight_left + EPSILON:
+            chosen[k] = True
+            volume_left -= volumes[k]
+            weight_left -= weights[k]
+    return chosen
+
+
+def _fill(chosen, order, volumes, weights, cap_volume, cap_weight) -> bool:
+    # Add unchosen items in the given order while they fit; True if any was added
+    volume_left = cap_volume - volumes[chosen].sum()
+    weight_left = cap_weight - weights[chosen].sum()
+    added = False
+    for k in order:
+        if not chosen[k] and volumes[k] <= volume_left + EPSILON and weights[k] <= weight_left + EPSILON:
+            chosen[k] = True
+            volume_left -= volumes[k]
+            weight_left -= weights[k]
+            added = True
+    return added
+
+
+def upper_bound(values, volumes, weights, cap_volume, cap_weight) -> float:
+    # Any non-negative mix of the two constraints is a relaxation; its
+    # fractional (LP) optimum bounds the best subset from above
+    best = np.inf
+    for mix in (0.0, 0.25, 0.5, 0.75, 1.0):
+        size = mix * volumes / cap_volume + (1 - mix) * weights / cap_weight
+        free = size <= EPSILON
+        bound = values[free].sum()
+        sized = np.flatnonzero(~free)
+        sized = sized[np.argsort(-values[sized] / size[sized], kind="stable")]
+        room = 1.0
+        for k in sized:
+            if size[k] <= room:
+                bound += values[k]
+                room -= size[k]
+            else:
+                bound += values[k] * room / size[k]
+                break
+        best = min(best, bound)
+    return float(best)
+
+
+def select_items(values, volumes, weights, cap_volume: float, cap_weight: float,
+                 time_budget_seconds: float = KNAPSACK_TIME_BUDGET_SECONDS) -> dict:
+    # Returns {"selected": item indices ranked by value density, "value",
+    # "upper_bound", "rounds"}. Items that don't fit on their own are ignored.
+    deadline = time.perf_counter() + time_budget_seconds
+    values = np.asarray(values, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    empty = {"selected": [], "value": 0.0, "upper_bound": 0.0, "rounds": 0}
+    if cap_volume <= 0 or cap_weight <= 0 or len(values) == 0:
+        return empty
+
+    fits_alone = (volumes <= cap_volume + EPSILON) & (weights <= cap_weight + EPSILON)
+    items = np.flatnonzero(fits_alone)
+    if len(items) == 0:
+        return empty
+    values, volumes, weights = values[items], volumes[items], weights[items]
+    size = volumes / cap_volume + weights / cap_weight
+    peak = np.maximum(volumes / cap_volume, weights / cap_weight)
+    density = values / np.maximum(size, EPSILON)
+
+    # 1. Best of several greedy orderings
+    orderings = [
+        np.argsort(-density, kind="stable"),
+        np.argsort(-values / np.maximum(peak, EPSILON), kind="stable"),
+        np.argsort(-values, kind="stable"),
+    ]
+    best, best_value = None, -1.0
+    for order in orderings:
+        chosen = _greedy(order, volumes, weights, cap_volume, cap_weight)
+        value = values[chosen].sum()
+        if value > best_value + EPSILON:
+            best, best_value = chosen, value
+    fill_order = orderings[0]
+
+    # 2. Swap one chosen item for one unchosen item that fits in its place,
+    # preferring the largest value gain and then the smallest size, and
+    # refill the space freed. Value-neutral swaps are kept only if the
+    # refill adds something.
+    rounds = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        rounds += 1
+        improved = False
+        volume_left = cap_volume - volumes[best].sum()
+        weight_left = cap_weight - weights[best].sum()
+        outside = np.flatnonzero(~best)
+        if len(outside) == 0:
+            break
+        # Least dense chosen items are the likeliest to be worth swapping out
+        for i in sorted(np.flatnonzero(best), key=lambda k: density[k]):
+            if time.perf_counter() >= deadline:
+                break
+            fits = (volumes[outside] <= volume_left + volumes[i] + EPSILON) & (weights[outside] <= weight_left + weights[i] + EPSILON)
+            if not fits.any():
+                continue
+            candidates = outside[fits]
+            gain = values[candidates] - values[i]
+            j = candidates[np.lexsort((size[candidates], -gain))[0]]
+            j_gain = values[j] - values[i]
+            if j_gain < -EPSILON or (j_gain <= EPSILON and size[j] >= size[i] - EPSILON):
+                continue
+            trial = best.copy()
+            trial[i] = False
+            trial[j] = True
+            refilled = _fill(trial, fill_order, volumes, weights, cap_volume, cap_weight)
+            if j_gain > EPSILON or refilled:
+                best = trial
+                best_value = values[best].sum()
+                improved = True
+                break
+
+    selected = np.flatnonzero(best)
+    selected = selected[np.argsort(-density[selected], kind="stable")]
+    return {
+        "selected": items[selected].tolist(),
+        "value": float(best_value),
+        "upper_bound": upper_bound(values, volumes, weights, cap_volume, cap_weight),
+        "rounds": rounds,
+    }
@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request, Response
 from pydantic import BaseModel
 import secrets
 import uuid
@@ -6,12 +7,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
 from contextlib import asynccontextmanager
 import models
+from process_pool import shutdown_process_pool
+from assignment_queue import start_assignment_workers, stop_assignment_workers
+from cache_versions import commit_with_versions, start_invalidation_listener, stop_invalidation_listener, versions_etag, etag_matches
 from auth import get_current_user, create_access_token, get_password_hash, verify_password
 from schemas import UserCreate, UserResponse, Token, CompanyCreate, CompanyResponse, OrderCreate, OrderResponse, ZoneCreate, ZoneResponse, VehicleCreate, VehicleResponse, DriverCreate, DriverResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import Depends, HTTPException, Header, status
+from sqlalchemy import select, text, or_, update
+from typing import Optional
 from models import User, Company, UserRole, Order, Zone, Vehicle
 
 # ... (rest of imports)
@@ -20,8 +25,14 @@ from models import User, Company, UserRole, Order, Zone, Vehicle
 async def lifespan(app: FastAPI):
     # Create tables on startup
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
         await conn.run_sync(Base.metadata.create_all)
+    await start_invalidation_listener()
+    start_assignment_workers()
     yield
+    await stop_assignment_workers()
+    await stop_invalidation_listener()
+    shutdown_process_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -39,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.get("/")
@@ -84,7 +96,7 @@ async def change_password(
     hashed_new_pwd = get_password_hash(request.new_password)
     current_user.hashed_password = hashed_new_pwd
     
-    await db.commit()
+    await commit_with_versions(db, "users")
     return {"message": "Password updated successfully"}
 
 # Signup Endpoint (Combined Company + User for MSME)
@@ -117,7 +129,7 @@ async def signup_msme(
         company_id=new_company.id
     )
     db.add(new_user)
-    await db.commit()
+    await commit_with_versions(db, "users")
     await db.refresh(new_user)
     
     # Explicitly attach company to avoid lazy load error during serialization
@@ -131,12 +143,18 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 
 # Order Endpoints
 from schemas import OrderCreate, OrderResponse
+from order_serializer import order_json_response, orders_json_response
+from order_versions import ORDERS_ENTITY, user_orders_entity, touch_orders, touch_orders_where, query_variant
 from models import Order
 
 
 
 # --- Geospatial Logic ---
-from shapely.geometry import Point, Polygon
+from vehicle_load import remove_vehicle_load, is_active_on_vehicle, remaining_capacity_filter, utilization_percentage, reserve_in_zone, reserve_vehicle_capacity, lock_vehicles, assign_orders_bulk, sum_loads, touch_vehicle_loads, VEHICLE_LOADS_ENTITY
+from zone_index import get_zone_index, parse_zone_polygon, zone_geometry, zone_vehicles_stmt
+from assignment_strategies import get_strategy, load_fleet_snapshots
+from capacity_calendar import check_slot, fits_reservations, release_order_capacity, reserve_slot, reserve_slot_in_zone, reserved_peaks
+from assignment_queue import ASSIGNMENT_MODE, ASSIGNMENT_QUEUE_WORKERS, enqueue_order, queue_depth, queue_enabled, stats as queue_stats, wake_assignment_workers
 import json
 
 # Order Endpoints
@@ -150,47 +168,54 @@ async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db), c
     pick_lon = order.pickup_longitude if order.pickup_longitude is not None else order.longitude
     pickup_loc_str = f"{pick_lat},{pick_lon}"
     
+    # Orders with a full delivery window book vehicle capacity for that
+    # window only (capacity_calendar.py)
+    slotted = order.delivery_window_start is not None and order.delivery_window_end is not None
+    if slotted:
+        try:
+            check_slot(order.delivery_window_start, order.delivery_window_end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     # --- Auto-Assignment Logic ---
     status_val = models.OrderStatus.PENDING
     assigned_vehicle_id = None
     
-    # 1. Fetch all zones from DB
-    result = await db.execute(select(models.Zone))
-    db_zones = result.scalars().all()
+    matched_zone_id, pickup_fallback_m = None, None
+    drop_zone_id, drop_fallback_m = None, None
+    # In queue mode zoning and assignment happen later in assignment_queue.py
+    queued = queue_enabled()
     
-    matched_zone_id = None
-    point = Point(pick_lat, pick_lon)
-    
-    for z in db_zones:
-        # Parse Geometry. stored as "lat,lng;lat,lng" or JSON
-        # frontend leaflet draw usually gives array of arrays [[lat,lng],...]
-        # We'll assume json string storage in this iteration for robustness
-        try:
-            coords = json.loads(z.geometry_coords)
-            # Shapely expects list of (x, y) = (lat, lng) tuples. 
-            # Note: GeoJSON is usually (lng, lat). Leaflet is (lat, lng).
-            # We will standardize on receiving [ [lat,lng], ... ] from frontend
-            poly_coords = [(p[0], p[1]) for p in coords]
-            polygon = Polygon(poly_coords)
-            
-            if polygon.contains(point):
-                matched_zone_id = z.id
-                break
-        except Exception as e:
-            print(f"Zone parse error {z.name}: {e}")
-            continue
+    # 1. Resolve pickup and drop zones from the in-memory zone index,
+    # falling back to a nearby zone for points just outside every polygon
+    if not queued:
+        zone_index = await get_zone_index(db)
+        matched_zone_id, pickup_fallback_m = zone_index.resolve_zone(pick_lat, pick_lon)
+        if order.drop_latitude is not None and order.drop_longitude is not None:
+            drop_zone_id, drop_fallback_m = zone_index.resolve_zone(order.drop_latitude, order.drop_longitude)
     
+    candidate_ids = None
     if matched_zone_id:
-        # 2. Find available vehicle in that zone
-        result = await db.execute(select(Vehicle).where(Vehicle.zone_id == matched_zone_id))
-        vehicles_in_zone = result.scalars().all()
-        
-        for v in vehicles_in_zone:
-            # Simple capacity check
-            if v.max_weight_kg >= order.weight_kg and v.max_volume_m3 >= volume:
-                assigned_vehicle_id = v.id
-                status_val = models.OrderStatus.ASSIGNED
+        # 2. Reserve capacity on a vehicle in that zone. The reservation takes
+        # the vehicle's row lock, so concurrent orders can't both fill it.
+        # First-fit by id runs entirely in SQL; other strategies rank the
+        # zone's vehicles first and reserve on the best one still free
+        strategy = get_strategy()
+        if strategy.name != "first_fit":
+            fleet = (await load_fleet_snapshots(db, [matched_zone_id], strategy.needs_positions)).get(matched_zone_id)
+            candidate_ids = fleet.ids[strategy.rank(fleet, volume, order.weight_kg, pick_lat, pick_lon)].tolist() if fleet else []
+    if matched_zone_id and not slotted:
+        # Unslotted orders stay on board until delivered, so the vehicle must
+        # also have room next to its busiest reserved slot ahead
+        excluded = []
+        while True:
+            assigned_vehicle_id = await reserve_in_zone(db, matched_zone_id, volume, order.weight_kg, candidate_ids, excluded)
+            if assigned_vehicle_id is None or await fits_reservations(db, assigned_vehicle_id):
                 break
+            await remove_vehicle_load(db, assigned_vehicle_id, volume, order.weight_kg)
+            excluded.append(assigned_vehicle_id)
+        if assigned_vehicle_id:
+            status_val = models.OrderStatus.ASSIGNED
     
     new_order = Order(
         user_id=current_user.id,
@@ -207,84 +232,126 @@ async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db), c
         drop_latitude=order.drop_latitude,
         drop_longitude=order.drop_longitude,
         drop_address=order.drop_address,
+        pickup_zone_id=matched_zone_id,
+        drop_zone_id=drop_zone_id,
+        pickup_zone_fallback_m=pickup_fallback_m,
+        drop_zone_fallback_m=drop_fallback_m,
+        delivery_window_start=order.delivery_window_start,
+        delivery_window_end=order.delivery_window_end,
         status=status_val,
         assigned_vehicle_id=assigned_vehicle_id
     )
     
     db.add(new_order)
+    if matched_zone_id and slotted:
+        # The reservation row references the order, so it needs its id first
+        await db.flush()
+        slot_vehicle_id = await reserve_slot_in_zone(
+            db, matched_zone_id, new_order.id, volume, order.weight_kg,
+            order.delivery_window_start, order.delivery_window_end, candidate_ids
+        )
+        if slot_vehicle_id:
+            new_order.assigned_vehicle_id = slot_vehicle_id
+            new_order.status = models.OrderStatus.ASSIGNED
+    elif queued:
+        await enqueue_order(db, new_order)
+    # Listing versions last, after every vehicle lock (see order_versions.py)
+    await touch_orders(db, [current_user.id])
+    if assigned_vehicle_id:
+        await touch_vehicle_loads(db)
     await db.commit()
+    if queued:
+        wake_assignment_workers()
     await db.refresh(new_order)
     
-    return OrderResponse(
-        id=new_order.id,
-        user_id=new_order.user_id,
-        item_name=new_order.item_name,
-        length_cm=new_order.length_cm,
-        width_cm=new_order.width_cm,
-        height_cm=new_order.height_cm,
-        weight_kg=new_order.weight_kg,
-        volume_m3=new_order.volume_m3,
-        status=new_order.status,
-        assigned_vehicle_id=new_order.assigned_vehicle_id,
-        pickup_latitude=new_order.pickup_latitude,
-        pickup_longitude=new_order.pickup_longitude,
-        pickup_address=new_order.pickup_address,
-        drop_latitude=new_order.drop_latitude,
-        drop_longitude=new_order.drop_longitude,
-        drop_address=new_order.drop_address,
-        latitude=new_order.pickup_latitude,
-        longitude=new_order.pickup_longitude
-    )
+    return order_json_response(new_order)
+
+from order_listing import ORDER_PAGE_MAX, order_list_stmt, filter_orders, page_orders, next_cursor
+from order_serializer import ORDER_FIELDS, ORDER_COMPUTED_FIELDS
+from fieldsets import parse_fields, fieldset_columns, sparse_dicts, fields_json_response
+from datetime import datetime
+
+def check_page_limit(limit: Optional[int]):
+    if limit is not None and not 1 <= limit <= ORDER_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ORDER_PAGE_MAX}")
+
+def check_fields(fields: Optional[str], allowed) -> Optional[list[str]]:
+    try:
+        return parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def order_list_response(rows, fields: Optional[list[str]], headers: dict) -> Response:
+    if fields is None:
+        return orders_json_response(rows, headers)
+    return fields_json_response(sparse_dicts(rows, fields, ORDER_COMPUTED_FIELDS), headers)
 
 @app.get("/orders", response_model=list[OrderResponse])
+async def read_orders(
+    request: Request,
+    zone_id: Optional[int] = None,
+    status: Optional[models.OrderStatus] = None,
+    vehicle_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Newest first. With limit, one page at a time: pass the X-Next-Cursor
+    # header of a page as cursor to get the next one (no header on the last).
+    # fields=a,b,c returns (and selects) only those fields.
+    check_page_limit(limit)
+    selected = check_fields(fields, ORDER_FIELDS)
+    # MSMEs only ever see their own orders, and their list has its own version
+    entity = ORDERS_ENTITY
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        user_id = current_user.id
+        entity = user_orders_entity(current_user.id)
+    etag = await versions_etag(db, entity, variant=query_variant(request.url.query))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    stmt = filter_orders(order_list_stmt(selected), status, vehicle_id, zone_id, user_id, created_from, created_to)
+    result = await db.execute(page_orders(stmt, cursor, limit))
+    rows = result.all()
 
-async def read_orders(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    stmt = select(Order, Vehicle).outerjoin(Vehicle, Order.assigned_vehicle_id == Vehicle.id)
-    
-    if current_user.role == models.UserRole.SUPER_ADMIN:
-        stmt = stmt.order_by(Order.id.desc())
-    else:
-        stmt = stmt.where(Order.user_id == current_user.id).order_by(Order.id.desc())
-        
-    result = await db.execute(stmt)
-    rows = result.all() # list of (Order, Vehicle) tuples
-    
-    response = []
-    for o, v in rows:
-        lat, lon = 0.0, 0.0
-        if o.pickup_location:
-            try:
-                lat, lon = map(float, o.pickup_location.split(','))
-            except:
-                pass
-        
-        if o.pickup_latitude is not None: lat = o.pickup_latitude
-        if o.pickup_longitude is not None: lon = o.pickup_longitude
-
-        response.append(OrderResponse(
-            id=o.id,
-            user_id=o.user_id,
-            item_name=o.item_name,
-            length_cm=o.length_cm,
-            width_cm=o.width_cm,
-            height_cm=o.height_cm,
-            weight_kg=o.weight_kg,
-            volume_m3=o.volume_m3,
-            status=o.status,
-            assigned_vehicle_id=o.assigned_vehicle_id,
-            assigned_vehicle_number=v.vehicle_number if v else None,
-            driver_confirmed_delivery=o.driver_confirmed_delivery,
-            user_confirmed_delivery=o.user_confirmed_delivery,
-            pickup_latitude=lat,
-            pickup_longitude=lon,
-            pickup_address=o.pickup_address,
-            drop_latitude=o.drop_latitude,
-            drop_longitude=o.drop_longitude,
-            drop_address=o.drop_address,
-            latitude=lat,
-            longitude=lon
-        ))
-    return response
+    cursor_out = next_cursor(rows, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if cursor_out is not None:
+        headers["X-Next-Cursor"] = str(cursor_out)
+    return order_list_response(rows, selected, headers)
+
+from fastapi.responses import StreamingResponse
+from order_listing import EXPORT_FORMATS, export_orders
+
+@app.get("/orders/export")
+async def export_order_list(
+    format: str = "ndjson",
+    zone_id: Optional[int] = None,
+    status: Optional[models.OrderStatus] = None,
+    vehicle_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Every order matching the GET /orders filters, streamed for reconciliation
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        user_id = current_user.id
+
+    stmt = filter_orders(order_list_stmt(), status, vehicle_id, zone_id, user_id, created_from, created_to)
+    return StreamingResponse(
+        export_orders(stmt, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
 
 @app.get("/orders/{order_id}/compatible-vehicles", response_model=list[VehicleResponse])
 async def get_compatible_vehicles(order_id: int, db: AsyncSession = Depends(get_db)):
@@ -299,35 +366,24 @@ async def get_compatible_vehicles(order_id: int, db: AsyncSession = Depends(get_
         # Fallback or empty if no drop location set
         return []
 
-    point = Point(order.drop_latitude, order.drop_longitude)
-    
-    # 2. Get All Zones
-    z_res = await db.execute(select(models.Zone))
-    zones = z_res.scalars().all()
-    
-    compatible_vehicles = []
-    
-    for z in zones:
-        try:
-            coords = json.loads(z.geometry_coords)
-            # GeoJSON is usually [lng, lat], but we might be storing [lat, lng] based on frontend drawing.
-            # Let's assume consistent with storage: [lat, lng] tuples
-            poly_coords = [(p[0], p[1]) for p in coords]
-            polygon = Polygon(poly_coords)
-            
-            if polygon.contains(point):
-                # Found the zone. Get vehicles in this zone.
-                v_res = await db.execute(select(Vehicle).where(Vehicle.zone_id == z.id))
-                vehs = v_res.scalars().all()
-                
-                # Filter by capacity
-                for v in vehs:
-                     if v.max_weight_kg >= order.weight_kg and v.max_volume_m3 >= order.volume_m3:
-                          compatible_vehicles.append(v)
-        except Exception as e:
-            print(f"Zone check error: {e}")
-            continue
-            
+    # 2. Vehicles in the drop zone resolved at creation, filtered by capacity
+    if order.drop_zone_id is not None:
+        stmt = select(Vehicle).where(Vehicle.zone_id == order.drop_zone_id).order_by(Vehicle.id)
+    else:
+        # Orders created before zone ids were stored: spatial lookup in PostGIS
+        stmt = zone_vehicles_stmt(order.drop_latitude, order.drop_longitude)
+    v_res = await db.execute(
+        stmt.where(remaining_capacity_filter(order.volume_m3, order.weight_kg))
+    )
+    # ... and next to their busiest reserved slot ahead, as assignment checks
+    vehicles = v_res.scalars().all()
+    peaks = await reserved_peaks(db, [v.id for v in vehicles])
+    compatible_vehicles = [
+        v for v in vehicles
+        if v.max_volume_m3 - v.current_volume_m3 - peaks[v.id][0] >= order.volume_m3
+        and v.max_weight_kg - v.current_weight_kg - peaks[v.id][1] >= order.weight_kg
+    ]
+
     return [
         VehicleResponse(
             id=v.id,
@@ -335,8 +391,9 @@ async def get_compatible_vehicles(order_id: int, db: AsyncSession = Depends(get_
             max_volume_m3=v.max_volume_m3,
             max_weight_kg=v.max_weight_kg,
             zone_id=v.zone_id,
-            current_volume_m3=0.0,
-            utilization_percentage=0.0
+            current_volume_m3=v.current_volume_m3,
+            current_weight_kg=v.current_weight_kg,
+            utilization_percentage=utilization_percentage(v)
         ) for v in compatible_vehicles
     ]
 
@@ -353,8 +410,8 @@ async def assign_order(
     if current_user.role != models.UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only admins can assign orders")
 
-    # Fetch Order
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    # Fetch Order, locked so concurrent assignments of it run one at a time
+    result = await db.execute(select(Order).where(Order.id == order_id).with_for_update())
     order = result.scalars().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -365,29 +422,162 @@ async def assign_order(
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
 
+    # Move the order's load off its previous vehicle, if any. Both vehicle
+    # rows are locked in id order first so opposite moves can't deadlock.
+    if is_active_on_vehicle(order):
+        await lock_vehicles(db, [order.assigned_vehicle_id, vehicle.id])
+    await release_order_capacity(db, order)
+
+    # Orders with a delivery window book that window; others the live load
+    if order.delivery_window_start is not None and order.delivery_window_end is not None:
+        try:
+            check_slot(order.delivery_window_start, order.delivery_window_end)
+        except ValueError as e:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        reserved = await reserve_slot(
+            db, vehicle.id, order.id, order.volume_m3, order.weight_kg,
+            order.delivery_window_start, order.delivery_window_end
+        )
+    else:
+        reserved = (await reserve_vehicle_capacity(db, vehicle.id, order.volume_m3, order.weight_kg)
+                    and await fits_reservations(db, vehicle.id))
+    if not reserved:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Vehicle does not have enough remaining capacity")
+
     # Update
     order.assigned_vehicle_id = vehicle.id
     order.status = models.OrderStatus.ASSIGNED
-    
+    await touch_orders(db, [order.user_id])
+    await touch_vehicle_loads(db)
     await db.commit()
     await db.refresh(order)
     
-    lat, lon = map(float, order.pickup_location.split(','))
+    return order_json_response(order, vehicle.vehicle_number)
 
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        item_name=order.item_name,
-        length_cm=order.length_cm,
-        width_cm=order.width_cm,
-        height_cm=order.height_cm,
-        weight_kg=order.weight_kg,
-        volume_m3=order.volume_m3,
-        status=order.status,
-        assigned_vehicle_id=order.assigned_vehicle_id,
-        assigned_vehicle_number=vehicle.vehicle_number,
-        latitude=lat,
-        longitude=lon
+from schemas import BatchAssignRequest, BatchAssignResponse, BatchAssignment, BatchVehicleLoad
+from batch_assign import STRATEGIES, pack_orders
+
+@app.post("/orders/batch-assign", response_model=BatchAssignResponse)
+async def batch_assign_orders(
+    request: BatchAssignRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can assign orders")
+    if request.strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy. Use one of: {', '.join(STRATEGIES)}")
+
+    # 1. Unassigned PENDING orders with a resolved pickup zone
+    o_stmt = select(Order.id, Order.pickup_zone_id, Order.volume_m3, Order.weight_kg).where(
+        Order.status == models.OrderStatus.PENDING,
+        Order.assigned_vehicle_id.is_(None),
+        Order.pickup_zone_id.is_not(None)
+    ).order_by(Order.id)
+    if request.zone_id is not None:
+        o_stmt = o_stmt.where(Order.pickup_zone_id == request.zone_id)
+    orders = (await db.execute(o_stmt)).all()
+
+    # 2. Vehicles of those zones with their live load
+    zone_ids = {o.pickup_zone_id for o in orders}
+    vehicles = []
+    if zone_ids:
+        v_res = await db.execute(
+            select(Vehicle.id, Vehicle.zone_id, Vehicle.max_volume_m3, Vehicle.max_weight_kg,
+                   Vehicle.current_volume_m3, Vehicle.current_weight_kg)
+            .where(Vehicle.zone_id.in_(zone_ids))
+            .order_by(Vehicle.id)
+        )
+        vehicles = v_res.all()
+
+    # Planned orders count as live load, so they also have to fit next to
+    # each vehicle's busiest reserved slot ahead, as assign_orders_bulk checks
+    peaks = await reserved_peaks(db, [v.id for v in vehicles])
+
+    # 3. Pack each zone independently
+    orders_by_zone, vehicles_by_zone = {}, {}
+    for o in orders:
+        orders_by_zone.setdefault(o.pickup_zone_id, []).append(o)
+    for v in vehicles:
+        vehicles_by_zone.setdefault(v.zone_id, []).append(v)
+
+    assignments, unassigned, planned = [], [], {}
+    for zone_id, zone_orders in orders_by_zone.items():
+        zone_vehicles = vehicles_by_zone.get(zone_id, [])
+        choice = pack_orders(
+            [o.volume_m3 for o in zone_orders], [o.weight_kg for o in zone_orders],
+            [v.max_volume_m3 for v in zone_vehicles], [v.max_weight_kg for v in zone_vehicles],
+            [v.current_volume_m3 + peaks[v.id][0] for v in zone_vehicles],
+            [v.current_weight_kg + peaks[v.id][1] for v in zone_vehicles],
+            request.strategy
+        )
+        for o, c in zip(zone_orders, choice):
+            if c < 0:
+                unassigned.append(o.id)
+                continue
+            v = zone_vehicles[c]
+            assignments.append((o.id, v.id, zone_id))
+            volume, weight = planned.get(v.id, (0.0, 0.0))
+            planned[v.id] = (volume + o.volume_m3, weight + o.weight_kg)
+
+    # 4. Commit the whole plan. assign_orders_bulk locks the vehicles and
+    # re-checks their capacity, skipping orders that are no longer PENDING or
+    # no longer fit because of assignments made since the plan was read
+    committed = False
+    if request.commit and assignments:
+        applied = await assign_orders_bulk(db, [(order_id, vehicle_id) for order_id, vehicle_id, _ in assignments])
+        if applied:
+            await touch_vehicle_loads(db)
+        await db.commit()
+        committed = True
+        order_loads = {o.id: (o.volume_m3, o.weight_kg) for o in orders}
+        planned = sum_loads((vehicle_id, *order_loads[order_id]) for order_id, vehicle_id in applied)
+        applied_ids = {order_id for order_id, _ in applied}
+        unassigned.extend(order_id for order_id, _, _ in assignments if order_id not in applied_ids)
+        assignments = [a for a in assignments if a[0] in applied_ids]
+
+    vehicle_loads = []
+    for v in vehicles:
+        if v.id not in planned:
+            continue
+        volume, weight = planned[v.id]
+        vehicle_loads.append(BatchVehicleLoad(
+            vehicle_id=v.id,
+            zone_id=v.zone_id,
+            planned_volume_m3=volume,
+            planned_weight_kg=weight,
+            utilization_percentage=((v.current_volume_m3 + volume) / v.max_volume_m3) * 100 if v.max_volume_m3 > 0 else 0.0
+        ))
+
+    return BatchAssignResponse(
+        committed=committed,
+        pending_orders=len(orders),
+        assigned=len(assignments),
+        unassigned_order_ids=sorted(unassigned),
+        assignments=[BatchAssignment(order_id=o, vehicle_id=v, zone_id=z) for o, v, z in assignments],
+        vehicles=vehicle_loads
+    )
+
+from schemas import AssignmentQueueStats
+
+@app.get("/assignment-queue", response_model=AssignmentQueueStats)
+async def read_assignment_queue(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view the assignment queue")
+    depth, oldest_age, failed = await queue_depth(db)
+    return AssignmentQueueStats(
+        mode=ASSIGNMENT_MODE,
+        depth=depth,
+        oldest_age_seconds=oldest_age,
+        failed=failed,
+        workers=ASSIGNMENT_QUEUE_WORKERS if queue_enabled() else 0,
+        batches=queue_stats.batches,
+        processed=queue_stats.processed,
+        assigned=queue_stats.assigned,
+        last_lag_seconds=queue_stats.last_lag,
+        average_lag_seconds=queue_stats.lag_total / queue_stats.processed if queue_stats.processed else None
     )
 
 @app.post("/orders/{order_id}/cancel", response_model=OrderResponse)
@@ -412,39 +602,17 @@ async def cancel_order(
         raise HTTPException(status_code=400, detail="Only pending or assigned orders can be cancelled")
 
     # Update
+    load_changed = await release_order_capacity(db, order)
     order.status = models.OrderStatus.CANCELLED
     order.assigned_vehicle_id = None # Unassign from vehicle
+    await touch_orders(db, [order.user_id])
     
+    if load_changed:
+        await touch_vehicle_loads(db)
     await db.commit()
     await db.refresh(order)
     
-    lat, lon = (0.0, 0.0)
-    if order.pickup_latitude: lat = order.pickup_latitude
-    if order.pickup_longitude: lon = order.pickup_longitude
-
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        item_name=order.item_name,
-        length_cm=order.length_cm,
-        width_cm=order.width_cm,
-        height_cm=order.height_cm,
-        weight_kg=order.weight_kg,
-        volume_m3=order.volume_m3,
-        status=order.status,
-        assigned_vehicle_id=order.assigned_vehicle_id,
-        assigned_vehicle_number=None,
-        driver_confirmed_delivery=order.driver_confirmed_delivery,
-        user_confirmed_delivery=order.user_confirmed_delivery,
-        pickup_latitude=lat,
-        pickup_longitude=lon,
-        pickup_address=order.pickup_address,
-        drop_latitude=order.drop_latitude,
-        drop_longitude=order.drop_longitude,
-        drop_address=order.drop_address,
-        latitude=lat,
-        longitude=lon
-    )
+    return order_json_response(order)
 
 @app.post("/orders/{order_id}/unassign", response_model=OrderResponse)
 async def unassign_order(
@@ -463,42 +631,17 @@ async def unassign_order(
         raise HTTPException(status_code=404, detail="Order not found")
 
     # Update
+    load_changed = await release_order_capacity(db, order)
     order.assigned_vehicle_id = None
     order.status = models.OrderStatus.PENDING
+    await touch_orders(db, [order.user_id])
     
+    if load_changed:
+        await touch_vehicle_loads(db)
     await db.commit()
     await db.refresh(order)
     
-    lat, lon = 0.0, 0.0
-    if order.pickup_location:
-         try:
-             lat, lon = map(float, order.pickup_location.split(','))
-         except:
-             pass
-
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        item_name=order.item_name,
-        length_cm=order.length_cm,
-        width_cm=order.width_cm,
-        height_cm=order.height_cm,
-        weight_kg=order.weight_kg,
-        volume_m3=order.volume_m3,
-        status=order.status,
-        assigned_vehicle_id=order.assigned_vehicle_id,
-        assigned_vehicle_number=None,
-        driver_confirmed_delivery=order.driver_confirmed_delivery,
-        user_confirmed_delivery=order.user_confirmed_delivery,
-        latitude=lat,
-        longitude=lon,
-        pickup_latitude=order.pickup_latitude,
-        pickup_longitude=order.pickup_longitude,
-        pickup_address=order.pickup_address,
-        drop_latitude=order.drop_latitude,
-        drop_longitude=order.drop_longitude,
-        drop_address=order.drop_address
-    )
+    return order_json_response(order)
 
 @app.post("/orders/{order_id}/start-shipment", response_model=OrderResponse)
 async def start_shipment(
@@ -529,36 +672,11 @@ async def start_shipment(
         raise HTTPException(status_code=400, detail="Order must be assigned before starting shipment")
 
     order.status = models.OrderStatus.SHIPPED
+    await touch_orders(db, [order.user_id])
     await db.commit()
     await db.refresh(order)
     
-    lat, lon = (0.0, 0.0)
-    if order.pickup_latitude: lat = order.pickup_latitude
-    if order.pickup_longitude: lon = order.pickup_longitude
-
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        item_name=order.item_name,
-        length_cm=order.length_cm,
-        width_cm=order.width_cm,
-        height_cm=order.height_cm,
-        weight_kg=order.weight_kg,
-        volume_m3=order.volume_m3,
-        status=order.status,
-        assigned_vehicle_id=order.assigned_vehicle_id,
-        assigned_vehicle_number=driver_vehicle.vehicle_number,
-        driver_confirmed_delivery=order.driver_confirmed_delivery,
-        user_confirmed_delivery=order.user_confirmed_delivery,
-        pickup_latitude=lat,
-        pickup_longitude=lon,
-        pickup_address=order.pickup_address,
-        drop_latitude=order.drop_latitude,
-        drop_longitude=order.drop_longitude,
-        drop_address=order.drop_address,
-        latitude=lat,
-        longitude=lon
-    )
+    return order_json_response(order, driver_vehicle.vehicle_number)
 
 @app.post("/orders/{order_id}/confirm-delivery", response_model=OrderResponse)
 async def confirm_delivery(
@@ -607,76 +725,94 @@ async def confirm_delivery(
              if v: vehicle_number = v.vehicle_number
 
     # Check for Dual Confirmation
-    if order.driver_confirmed_delivery and order.user_confirmed_delivery:
+    delivered_now = False
+    if order.driver_confirmed_delivery and order.user_confirmed_delivery and order.status != models.OrderStatus.DELIVERED:
+        # Delivered orders no longer count towards the vehicle's load
+        delivered_now = await release_order_capacity(db, order)
         order.status = models.OrderStatus.DELIVERED
         updated = True
 
     if updated:
+        await touch_orders(db, [order.user_id])
+        if delivered_now:
+            await touch_vehicle_loads(db)
         await db.commit()
         await db.refresh(order)
 
-    lat, lon = (0.0, 0.0)
-    if order.pickup_latitude: lat = order.pickup_latitude
-    if order.pickup_longitude: lon = order.pickup_longitude
-
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        item_name=order.item_name,
-        length_cm=order.length_cm,
-        width_cm=order.width_cm,
-        height_cm=order.height_cm,
-        weight_kg=order.weight_kg,
-        volume_m3=order.volume_m3,
-        status=order.status,
-        assigned_vehicle_id=order.assigned_vehicle_id,
-        assigned_vehicle_number=vehicle_number,
-        driver_confirmed_delivery=order.driver_confirmed_delivery,
-        user_confirmed_delivery=order.user_confirmed_delivery,
-        pickup_latitude=lat,
-        pickup_longitude=lon,
-        pickup_address=order.pickup_address,
-        drop_latitude=order.drop_latitude,
-        drop_longitude=order.drop_longitude,
-        drop_address=order.drop_address,
-        latitude=lat,
-        longitude=lon
-    )
+    return order_json_response(order, vehicle_number)
 
 # Zone Endpoints
-from schemas import ZoneCreate, ZoneResponse
+from schemas import ZoneCreate, ZoneResponse, ZoneClassifyRequest, ZoneClassifyResponse
 from models import Zone
+from rezoning import start_rezoning, get_rezone_job, list_rezone_jobs, rezone_job_dict
+from zone_encoding import ZONE_ENCODINGS, encode_polyline
+import numpy as np
+
+def check_zone_encoding(encoding: Optional[str]):
+    if encoding is not None and encoding not in ZONE_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported encoding. Use one of: {', '.join(ZONE_ENCODINGS)}")
+
+def build_zone_response(z: Zone, encoding: Optional[str] = None) -> ZoneResponse:
+    coords = json.loads(z.geometry_coords)
+    if encoding == "polyline":
+        return ZoneResponse(id=z.id, name=z.name, polyline=encode_polyline(coords))
+    return ZoneResponse(id=z.id, name=z.name, coordinates=coords)
 
 @app.post("/zones", response_model=ZoneResponse)
-async def create_zone(zone: ZoneCreate, db: AsyncSession = Depends(get_db)):
+async def create_zone(zone: ZoneCreate, response: Response, db: AsyncSession = Depends(get_db)):
     # Flatten geometry to JSON string for simple storage
     geo_str = json.dumps(zone.coordinates)
+    try:
+        polygon = parse_zone_polygon(geo_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid zone coordinates")
     
     new_zone = Zone(
         name=zone.name,
-        geometry_coords=geo_str
+        geometry_coords=geo_str,
+        geometry=zone_geometry(polygon)
     )
     db.add(new_zone)
-    await db.commit()
+    await commit_with_versions(db, "zones")
     await db.refresh(new_zone)
     
-    return ZoneResponse(
-        id=new_zone.id,
-        name=new_zone.name,
-        coordinates=json.loads(new_zone.geometry_coords)
-    )
+    # Re-evaluate PENDING orders inside the new zone in the background
+    job_id = await start_rezoning(db, new_zone.id, "created", polygon.bounds)
+    response.headers["X-Rezoning-Job-Id"] = job_id
+    
+    return build_zone_response(new_zone)
 
 @app.get("/zones", response_model=list[ZoneResponse])
-async def read_zones(db: AsyncSession = Depends(get_db)):
+async def read_zones(
+    response: Response,
+    encoding: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    check_zone_encoding(encoding)
+    etag = await versions_etag(db, "zones", variant=encoding or "")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
     result = await db.execute(select(Zone))
     zones = result.scalars().all()
-    return [
-        ZoneResponse(
-            id=z.id,
-            name=z.name,
-            coordinates=json.loads(z.geometry_coords)
-        ) for z in zones
-    ]
+    return [build_zone_response(z, encoding) for z in zones]
+
+MAX_CLASSIFY_POINTS = 100000
+
+@app.post("/zones/classify", response_model=ZoneClassifyResponse)
+async def classify_points(request: ZoneClassifyRequest, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if len(request.points) > MAX_CLASSIFY_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CLASSIFY_POINTS} points per request")
+    if any(len(p) != 2 for p in request.points):
+        raise HTTPException(status_code=400, detail="Each point must be a [lat, lng] pair")
+
+    zone_index = await get_zone_index(db)
+    points = np.array(request.points, dtype=np.float64).reshape(-1, 2)
+    zone_ids = zone_index.classify_points(points[:, 0], points[:, 1])
+    return ZoneClassifyResponse(zone_ids=[int(z) if z >= 0 else None for z in zone_ids])
 
 @app.delete("/zones/{zone_id}")
 async def delete_zone(zone_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -696,9 +832,164 @@ async def delete_zone(zone_id: int, db: AsyncSession = Depends(get_db), current_
     if vehicles:
         raise HTTPException(status_code=400, detail=f"Cannot delete zone. It has {len(vehicles)} assigned vehicles.")
     
+    bounds = parse_zone_polygon(zone.geometry_coords).bounds
+    # The orders' zone ids are cleared with the zone (ON DELETE SET NULL)
+    await touch_orders_where(db, or_(Order.pickup_zone_id == zone_id, Order.drop_zone_id == zone_id))
     await db.delete(zone)
-    await db.commit()
-    return {"message": "Zone deleted successfully"}
+    await commit_with_versions(db, "zones")
+    
+    # Orders that were in this zone may now fall into an overlapping one
+    job_id = await start_rezoning(db, zone_id, "deleted", bounds)
+    return {"message": "Zone deleted successfully", "rezoning_job_id": job_id}
+
+@app.get("/zones/rezoning")
+async def read_rezoning_jobs(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view re-zoning jobs")
+    return [rezone_job_dict(job) for job in await list_rezone_jobs(db)]
+
+@app.get("/zones/rezoning/{job_id}")
+async def read_rezoning_job(job_id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view re-zoning jobs")
+    job = await get_rezone_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Re-zoning job not found")
+    return rezone_job_dict(job)
+
+from schemas import RoutePlanRequest, RoutePlanResponse, VehicleRoutePlan, PlannedStop
+from vrp import VRP_DAY_START_HOUR, VRP_DAY_END_HOUR, VRP_TIME_BUDGET_SECONDS, VRP_MAX_TIME_BUDGET_SECONDS, plan_routes
+from process_pool import get_process_pool
+from models import VehicleReservation
+from datetime import datetime, time as dt_time, timedelta, timezone
+from functools import partial
+
+@app.post("/zones/{zone_id}/route-plan", response_model=RoutePlanResponse)
+async def plan_zone_routes(zone_id: int, request: RoutePlanRequest, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Plans the day's deliveries across all vehicles of the zone. Orders
+    # already ASSIGNED stay on their vehicle; PENDING orders of the zone are
+    # placed wherever they fit and, with commit, assigned accordingly.
+    # ASSIGNED orders their vehicle can no longer route are reported in
+    # infeasible_pinned_order_ids rather than unassigned_order_ids.
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can plan routes")
+    time_budget = request.time_budget_seconds if request.time_budget_seconds is not None else VRP_TIME_BUDGET_SECONDS
+    if not 0 <= time_budget <= VRP_MAX_TIME_BUDGET_SECONDS:
+        raise HTTPException(status_code=400, detail=f"time_budget_seconds must be between 0 and {VRP_MAX_TIME_BUDGET_SECONDS:g}")
+
+    zone = await db.get(Zone, zone_id)
+    if not zone:
+        raise HTTPException(status_code=404, detail="Zone not found")
+    # Routes start and end at the zone's centroid (x = lat, y = lng)
+    depot = parse_zone_polygon(zone.geometry_coords).centroid
+    depot = (depot.x, depot.y)
+
+    v_res = await db.execute(select(Vehicle).where(Vehicle.zone_id == zone_id).order_by(Vehicle.id))
+    vehicles = v_res.scalars().all()
+    vehicle_index = {v.id: i for i, v in enumerate(vehicles)}
+
+    midnight = datetime.combine(request.date, dt_time(0), tzinfo=timezone.utc)
+    day_start = midnight + timedelta(hours=VRP_DAY_START_HOUR)
+    day_end = midnight + timedelta(hours=VRP_DAY_END_HOUR)
+    o_res = await db.execute(
+        select(Order).where(
+            or_(
+                (Order.status == models.OrderStatus.PENDING) & Order.assigned_vehicle_id.is_(None) & (Order.pickup_zone_id == zone_id),
+                (Order.status == models.OrderStatus.ASSIGNED) & Order.assigned_vehicle_id.in_(list(vehicle_index))
+            ),
+            Order.drop_latitude.is_not(None),
+            Order.drop_longitude.is_not(None),
+            or_(Order.delivery_window_start.is_(None), Order.delivery_window_start < day_end),
+            or_(Order.delivery_window_end.is_(None), Order.delivery_window_end > day_start)
+        ).order_by(Order.id)
+    )
+    orders = o_res.scalars().all()
+
+    def minutes(t: Optional[datetime], default: float) -> float:
+        return default if t is None else (t - midnight).total_seconds() / 60.0
+
+    # Capacity left after loads that aren't part of this plan (e.g. SHIPPED),
+    # and after the busiest slot ahead of reservations that aren't either.
+    # Pinned orders with a slot reservation never added to the counters.
+    pinned_ids = [o.id for o in orders if o.assigned_vehicle_id is not None]
+    peaks = await reserved_peaks(db, list(vehicle_index), exclude_order_ids=pinned_ids)
+    slotted = set()
+    if pinned_ids:
+        r_res = await db.execute(select(VehicleReservation.order_id).where(VehicleReservation.order_id.in_(pinned_ids)))
+        slotted = set(r_res.scalars().all())
+    capacity_volumes = [v.max_volume_m3 - v.current_volume_m3 - peaks[v.id][0] for v in vehicles]
+    capacity_weights = [v.max_weight_kg - v.current_weight_kg - peaks[v.id][1] for v in vehicles]
+    pinned = []
+    for o in orders:
+        if o.assigned_vehicle_id is not None:
+            i = vehicle_index[o.assigned_vehicle_id]
+            if o.id not in slotted:
+                capacity_volumes[i] += o.volume_m3
+                capacity_weights[i] += o.weight_kg
+            pinned.append(i)
+        else:
+            pinned.append(-1)
+
+    day_start_min, day_end_min = VRP_DAY_START_HOUR * 60.0, VRP_DAY_END_HOUR * 60.0
+    loop = asyncio.get_running_loop()
+    plan = await loop.run_in_executor(get_process_pool(), partial(
+        plan_routes, depot,
+        [o.drop_latitude for o in orders], [o.drop_longitude for o in orders],
+        [o.volume_m3 for o in orders], [o.weight_kg for o in orders],
+        [max(day_start_min, minutes(o.delivery_window_start, day_start_min)) for o in orders],
+        [min(day_end_min, minutes(o.delivery_window_end, day_end_min)) for o in orders],
+        capacity_volumes, capacity_weights, pinned,
+        day_start=day_start_min, day_end=day_end_min, time_budget_seconds=time_budget
+    ))
+
+    committed = False
+    if request.commit:
+        new_assignments = [
+            (orders[k].id, vehicles[v].id)
+            for v, route in enumerate(plan["routes"]) for k in route
+            if orders[k].assigned_vehicle_id is None
+        ]
+        if await assign_orders_bulk(db, new_assignments):
+            await touch_vehicle_loads(db)
+        await db.commit()
+        committed = True
+
+    routes = []
+    for v, route in enumerate(plan["routes"]):
+        if not route:
+            continue
+        routes.append(VehicleRoutePlan(
+            vehicle_id=vehicles[v].id,
+            vehicle_number=vehicles[v].vehicle_number,
+            distance_m=plan["distances"][v],
+            volume_m3=sum(orders[k].volume_m3 for k in route),
+            weight_kg=sum(orders[k].weight_kg for k in route),
+            return_time=midnight + timedelta(minutes=plan["return_times"][v]),
+            stops=[
+                PlannedStop(
+                    sequence=i + 1,
+                    order_id=orders[k].id,
+                    latitude=orders[k].drop_latitude,
+                    longitude=orders[k].drop_longitude,
+                    arrival=midnight + timedelta(minutes=arrival),
+                    delivery_window_start=orders[k].delivery_window_start,
+                    delivery_window_end=orders[k].delivery_window_end
+                )
+                for i, (k, arrival) in enumerate(zip(route, plan["arrivals"][v]))
+            ]
+        ))
+
+    return RoutePlanResponse(
+        zone_id=zone_id,
+        date=request.date,
+        committed=committed,
+        total_distance_m=sum(plan["distances"]),
+        construction_distance_m=plan["construction_distance"],
+        planning_seconds=plan["seconds"],
+        routes=routes,
+        unassigned_order_ids=[orders[k].id for k in plan["unassigned"] if pinned[k] < 0],
+        infeasible_pinned_order_ids=[orders[k].id for k in plan["unassigned"] if pinned[k] >= 0]
+    )
 
 # Vehicle Endpoints
 from schemas import VehicleCreate, VehicleUpdate, VehicleResponse
@@ -716,7 +1007,7 @@ async def create_vehicle(vehicle: VehicleCreate, db: AsyncSession = Depends(get_
     
     db.add(new_vehicle)
     try:
-        await db.commit()
+        await commit_with_versions(db, "vehicles")
         await db.refresh(new_vehicle)
     except Exception as e:
         await db.rollback()
@@ -733,15 +1024,30 @@ async def create_vehicle(vehicle: VehicleCreate, db: AsyncSession = Depends(get_
         max_volume_m3=new_vehicle.max_volume_m3,
         max_weight_kg=new_vehicle.max_weight_kg,
         zone_id=new_vehicle.zone_id,
-        current_volume_m3=0.0, 
-        utilization_percentage=0.0
+        current_volume_m3=new_vehicle.current_volume_m3,
+        current_weight_kg=new_vehicle.current_weight_kg,
+        utilization_percentage=utilization_percentage(new_vehicle)
     )
 
 @app.get("/driver/me/vehicle", response_model=VehicleResponse)
-async def get_my_vehicle(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_my_vehicle(
+    response: Response,
+    encoding: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     # Verify Driver
     if current_user.role != models.UserRole.DRIVER:
         raise HTTPException(status_code=403, detail="Only drivers can access this endpoint")
+    check_zone_encoding(encoding)
+    # The load counters have their own version, so this covers the
+    # utilization too
+    etag = await versions_etag(db, "vehicles", VEHICLE_LOADS_ENTITY, "zones", variant=f"driver{current_user.id}-{encoding or ''}")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
 
     # Fetch Vehicle assigned to this driver
     # Join with Zone to return full details
@@ -750,31 +1056,16 @@ async def get_my_vehicle(db: AsyncSession = Depends(get_db), current_user: User
         select(Vehicle)
         .options(selectinload(Vehicle.zone))
         .where(Vehicle.driver_id == current_user.id)
+        .order_by(Vehicle.id)
     )
     vehicle = result.scalars().first()
     
     if not vehicle:
         raise HTTPException(status_code=404, detail="No vehicle assigned to this driver")
     
-    # Calculate Utilization (Optional, but nice to have)
-    # Get active orders (ASSIGNED, SHIPPED)
-    o_res = await db.execute(
-        select(Order).where(
-            Order.assigned_vehicle_id == vehicle.id,
-            Order.status.in_([models.OrderStatus.ASSIGNED, models.OrderStatus.SHIPPED])
-        )
-    )
-    active_orders = o_res.scalars().all()
-    current_volume = sum(o.volume_m3 for o in active_orders)
-    utilization = (current_volume / vehicle.max_volume_m3) * 100 if vehicle.max_volume_m3 > 0 else 0.0
-
     zone_resp = None
     if vehicle.zone:
-        zone_resp = ZoneResponse(
-            id=vehicle.zone.id,
-            name=vehicle.zone.name,
-            coordinates=json.loads(vehicle.zone.geometry_coords)
-        )
+        zone_resp = build_zone_response(vehicle.zone, encoding)
 
     return VehicleResponse(
         id=vehicle.id,
@@ -783,12 +1074,47 @@ async def get_my_vehicle(db: AsyncSession = Depends(get_db), current_user: User
         max_weight_kg=vehicle.max_weight_kg,
         zone_id=vehicle.zone_id,
         zone=zone_resp,
-        current_volume_m3=current_volume,
-        utilization_percentage=utilization
+        current_volume_m3=vehicle.current_volume_m3,
+        current_weight_kg=vehicle.current_weight_kg,
+        utilization_percentage=utilization_percentage(vehicle)
     )
 
+# Columns each VehicleResponse field is built from, for ?fields=
+VEHICLE_FIELD_COLUMNS = {
+    **{field: (getattr(Vehicle, field),) for field in (
+        "id", "vehicle_number", "max_volume_m3", "max_weight_kg", "zone_id", "driver_id",
+        "current_volume_m3", "current_weight_kg"
+    )},
+    "utilization_percentage": (Vehicle.max_volume_m3, Vehicle.current_volume_m3),
+    "zone": (Vehicle.zone_id,),
+}
+
 @app.get("/vehicles", response_model=list[VehicleResponse])
-async def read_vehicles(db: AsyncSession = Depends(get_db)):
+async def read_vehicles(
+    response: Response,
+    encoding: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    check_zone_encoding(encoding)
+    selected = check_fields(fields, VEHICLE_FIELD_COLUMNS)
+    etag = await versions_etag(db, "vehicles", VEHICLE_LOADS_ENTITY, "zones", variant=f"{encoding or ''}-{fields or ''}")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    if selected is not None:
+        result = await db.execute(select(*fieldset_columns(selected, VEHICLE_FIELD_COLUMNS)).order_by(Vehicle.id))
+        rows = result.all()
+        zones = {}
+        if "zone" in selected:
+            z_res = await db.execute(select(Zone).where(Zone.id.in_({r.zone_id for r in rows if r.zone_id is not None})))
+            zones = {z.id: build_zone_response(z, encoding).model_dump() for z in z_res.scalars().all()}
+        computed = {"utilization_percentage": utilization_percentage, "zone": lambda r: zones.get(r.zone_id)}
+        return fields_json_response(sparse_dicts(rows, selected, computed), {"ETag": etag, "Cache-Control": "no-cache"})
+
    # Join with Zone
     from sqlalchemy.orm import selectinload
     result = await db.execute(select(Vehicle).options(selectinload(Vehicle.zone)))
@@ -798,11 +1124,7 @@ async def read_vehicles(db: AsyncSession = Depends(get_db)):
     for v in vehicles:
         zone_resp = None
         if v.zone:
-            zone_resp = ZoneResponse(
-                id=v.zone.id,
-                name=v.zone.name,
-                coordinates=json.loads(v.zone.geometry_coords)
-            )
+            zone_resp = build_zone_response(v.zone, encoding)
 
         response.append(VehicleResponse(
             id=v.id,
@@ -811,8 +1133,9 @@ async def read_vehicles(db: AsyncSession = Depends(get_db)):
             max_weight_kg=v.max_weight_kg,
             zone_id=v.zone_id,
             zone=zone_resp,
-            current_volume_m3=0.0, 
-            utilization_percentage=0.0
+            current_volume_m3=v.current_volume_m3,
+            current_weight_kg=v.current_weight_kg,
+            utilization_percentage=utilization_percentage(v)
         ))
 
     return response
@@ -837,7 +1160,7 @@ async def delete_vehicle(vehicle_id: int, db: AsyncSession = Depends(get_db), cu
         raise HTTPException(status_code=400, detail=f"Cannot delete vehicle. It has {len(assigned_orders)} assigned orders. Please unassign first.")
 
     await db.delete(vehicle)
-    await db.commit()
+    await commit_with_versions(db, "vehicles")
     return {"message": "Vehicle deleted successfully"}
 
 @app.patch("/vehicles/{vehicle_id}", response_model=VehicleResponse)
@@ -852,8 +1175,11 @@ async def update_vehicle(vehicle_id: int, vehicle_update: VehicleUpdate, db: Asy
     update_data = vehicle_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(vehicle, key, value)
+    # Order listings show the vehicle number
+    if "vehicle_number" in update_data:
+        await touch_orders_where(db, Order.assigned_vehicle_id == vehicle.id)
     
-    await db.commit()
+    await commit_with_versions(db, "vehicles")
     await db.refresh(vehicle)
     
     # Re-fetch zone for response
@@ -863,11 +1189,7 @@ async def update_vehicle(vehicle_id: int, vehicle_update: VehicleUpdate, db: Asy
         z_res = await db.execute(select(Zone).where(Zone.id == vehicle.zone_id))
         z = z_res.scalars().first()
         if z:
-            zone_resp = ZoneResponse(
-                id=z.id,
-                name=z.name,
-                coordinates=json.loads(z.geometry_coords)
-            )
+            zone_resp = build_zone_response(z)
 
     return VehicleResponse(
         id=vehicle.id,
@@ -877,8 +1199,9 @@ async def update_vehicle(vehicle_id: int, vehicle_update: VehicleUpdate, db: Asy
         zone_id=vehicle.zone_id,
         driver_id=vehicle.driver_id,
         zone=zone_resp,
-        current_volume_m3=0.0,
-        utilization_percentage=0.0
+        current_volume_m3=vehicle.current_volume_m3,
+        current_weight_kg=vehicle.current_weight_kg,
+        utilization_percentage=utilization_percentage(vehicle)
     )
 
 # Driver Management Endpoints
@@ -907,7 +1230,7 @@ async def create_driver(driver: DriverCreate, db: AsyncSession = Depends(get_db)
         employee_id=driver.employee_id
     )
     db.add(new_user)
-    await db.commit()
+    await commit_with_versions(db, "users")
     await db.refresh(new_user)
     
     # If vehicle_number provided, link it
@@ -919,7 +1242,7 @@ async def create_driver(driver: DriverCreate, db: AsyncSession = Depends(get_db)
         if vehicle:
             vehicle.driver_id = new_user.id
             vehicle_number = vehicle.vehicle_number
-            await db.commit()
+            await commit_with_versions(db, "vehicles")
 
     return DriverResponse(
         id=new_user.id, 
@@ -946,7 +1269,7 @@ async def delete_driver(driver_id: int, db: AsyncSession = Depends(get_db), curr
     
     # 3. Delete the driver
     await db.delete(driver)
-    await db.commit()
+    await commit_with_versions(db, "users", "vehicles")
     return {"message": "Driver deleted successfully"}
 
 class DriverLoginRequest(BaseModel):
@@ -967,10 +1290,49 @@ async def driver_login(req: DriverLoginRequest, db: AsyncSession = Depends(get_d
     access_token = create_access_token(data={"sub": user.email, "role": user.role})
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Columns each DriverResponse field is built from, for ?fields=. The
+# vehicle number comes from a second query on the drivers' ids.
+DRIVER_FIELD_COLUMNS = {
+    "name": (User.name,),
+    "id": (User.id,),
+    "employee_id": (User.employee_id,),
+    "role": (User.role,),
+    "vehicle_number": (User.id,),
+}
+
 @app.get("/drivers", response_model=list[DriverResponse])
-async def read_drivers(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def read_drivers(
+    response: Response,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != models.UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only admins can list drivers")
+    selected = check_fields(fields, DRIVER_FIELD_COLUMNS)
+    etag = await versions_etag(db, "users", "vehicles", variant=fields or "")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    if selected is not None:
+        result = await db.execute(
+            select(*fieldset_columns(selected, DRIVER_FIELD_COLUMNS)).where(User.role == models.UserRole.DRIVER)
+        )
+        rows = result.all()
+        vehicle_numbers = {}
+        if "vehicle_number" in selected and rows:
+            v_res = await db.execute(
+                select(Vehicle.driver_id, Vehicle.vehicle_number)
+                .where(Vehicle.driver_id.in_([r.id for r in rows]))
+                .order_by(Vehicle.id.desc())
+            )
+            # Lowest vehicle id wins when a driver has several
+            vehicle_numbers = dict(v_res.all())
+        computed = {"vehicle_number": lambda r: vehicle_numbers.get(r.id)}
+        return fields_json_response(sparse_dicts(rows, selected, computed), {"ETag": etag, "Cache-Control": "no-cache"})
     
     from sqlalchemy.orm import selectinload
     stmt = select(User).options(selectinload(User.vehicles)).where(User.role == models.UserRole.DRIVER)
@@ -979,7 +1341,8 @@ async def read_drivers(db: AsyncSession = Depends(get_db), current_user: User =
     
     response = []
     for d in drivers:
-        v_num = d.vehicles[0].vehicle_number if d.vehicles else None
+        # Lowest vehicle id, as on the ?fields= path
+        v_num = min(d.vehicles, key=lambda v: v.id).vehicle_number if d.vehicles else None
         response.append(DriverResponse(
             id=d.id,
             name=d.name,
@@ -990,48 +1353,356 @@ async def read_drivers(db: AsyncSession = Depends(get_db), current_user: User =
     return response
 
 @app.get("/driver/orders", response_model=list[OrderResponse])
-async def get_driver_orders(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_driver_orders(
+    request: Request,
+    zone_id: Optional[int] = None,
+    status: Optional[models.OrderStatus] = None,
+    vehicle_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Orders on the driver's vehicles, paged like GET /orders
     if current_user.role != models.UserRole.DRIVER:
         raise HTTPException(status_code=403, detail="Only drivers can view their orders")
-    stmt = select(Order, Vehicle).outerjoin(Vehicle, Order.assigned_vehicle_id == Vehicle.id).where(Vehicle.driver_id == current_user.id)
-    result = await db.execute(stmt)
+    check_page_limit(limit)
+    selected = check_fields(fields, ORDER_FIELDS)
+    # Vehicles too: they say which vehicle the driver has
+    etag = await versions_etag(db, ORDERS_ENTITY, "vehicles", variant=f"driver{current_user.id}-{query_variant(request.url.query)}")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # Resolve the driver's vehicles first so the listing can use the
+    # (assigned_vehicle_id, id) index
+    v_res = await db.execute(select(Vehicle.id).where(Vehicle.driver_id == current_user.id))
+    vehicle_ids = v_res.scalars().all()
+    if vehicle_id is not None:
+        vehicle_ids = [v for v in vehicle_ids if v == vehicle_id]
+    if not vehicle_ids:
+        return orders_json_response([], {"ETag": etag, "Cache-Control": "no-cache"})
+
+    stmt = order_list_stmt(selected).where(Order.assigned_vehicle_id.in_(vehicle_ids))
+    stmt = filter_orders(stmt, status, None, zone_id, None, created_from, created_to)
+    result = await db.execute(page_orders(stmt, cursor, limit))
     rows = result.all()
-    response = []
-    for o, v in rows:
-        lat, lon = 0.0, 0.0
-        if o.pickup_location:
-            try:
-                lat, lon = map(float, o.pickup_location.split(','))
-            except:
-                pass
-        if o.pickup_latitude is not None: lat = o.pickup_latitude
-        if o.pickup_longitude is not None: lon = o.pickup_longitude
-
-        response.append(OrderResponse(
-            id=o.id,
-            user_id=o.user_id,
-            item_name=o.item_name,
-            length_cm=o.length_cm,
-            width_cm=o.width_cm,
-            height_cm=o.height_cm,
-            weight_kg=o.weight_kg,
-            volume_m3=o.volume_m3,
-            status=o.status,
-            assigned_vehicle_id=o.assigned_vehicle_id,
-            assigned_vehicle_number=v.vehicle_number if v else None,
-            pickup_latitude=lat,
-            pickup_longitude=lon,
-            pickup_address=o.pickup_address,
-            drop_latitude=o.drop_latitude,
-            drop_longitude=o.drop_longitude,
-            drop_address=o.drop_address,
-            latitude=lat,
-            longitude=lon,
-            driver_confirmed_delivery=o.driver_confirmed_delivery,
-            user_confirmed_delivery=o.user_confirmed_delivery
+
+    cursor_out = next_cursor(rows, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if cursor_out is not None:
+        headers["X-Next-Cursor"] = str(cursor_out)
+    return order_list_response(rows, selected, headers)
+
+from schemas import LoadProposalResponse, LoadProposalOrder
+from knapsack import KNAPSACK_TIME_BUDGET_SECONDS, select_items
+import time
+
+LOAD_OBJECTIVES = ("volume", "count")
+MAX_LOAD_PROPOSAL_BUDGET_MS = 2000
+
+@app.get("/vehicles/{vehicle_id}/load-proposal", response_model=LoadProposalResponse)
+async def get_load_proposal(
+    vehicle_id: int,
+    objective: str = "volume",
+    time_budget_ms: Optional[float] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Which compatible PENDING orders to add to this vehicle: the subset that
+    # maximizes loaded volume (or order count) within both its remaining
+    # volume and remaining weight. Read-only; assign the result as usual.
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view load proposals")
+    if objective not in LOAD_OBJECTIVES:
+        raise HTTPException(status_code=400, detail=f"Unknown objective. Use one of: {', '.join(LOAD_OBJECTIVES)}")
+    if time_budget_ms is None:
+        time_budget_ms = KNAPSACK_TIME_BUDGET_SECONDS * 1000
+    if not 0 <= time_budget_ms <= MAX_LOAD_PROPOSAL_BUDGET_MS:
+        raise HTTPException(status_code=400, detail=f"time_budget_ms must be between 0 and {MAX_LOAD_PROPOSAL_BUDGET_MS}")
+
+    vehicle = await db.get(Vehicle, vehicle_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    # Proposed orders would be unslotted load, so they share the vehicle
+    # with its busiest reserved slot ahead
+    peak_volume, peak_weight = (await reserved_peaks(db, [vehicle_id]))[vehicle_id]
+    remaining_volume = max(vehicle.max_volume_m3 - vehicle.current_volume_m3 - peak_volume, 0.0)
+    remaining_weight = max(vehicle.max_weight_kg - vehicle.current_weight_kg - peak_weight, 0.0)
+
+    # Compatible means the order's drop zone is the vehicle's zone, as in
+    # /orders/{id}/compatible-vehicles, and the order fits on its own
+    candidates = []
+    if vehicle.zone_id is not None:
+        result = await db.execute(
+            select(Order.id, Order.volume_m3, Order.weight_kg, Order.pickup_zone_id)
+            .where(
+                Order.status == models.OrderStatus.PENDING,
+                Order.assigned_vehicle_id.is_(None),
+                Order.drop_zone_id == vehicle.zone_id,
+                Order.volume_m3 <= remaining_volume,
+                Order.weight_kg <= remaining_weight
+            )
+            .order_by(Order.id)
+        )
+        candidates = result.all()
+
+    started = time.perf_counter()
+    volumes = [o.volume_m3 for o in candidates]
+    weights = [o.weight_kg for o in candidates]
+    values = volumes if objective == "volume" else [1.0] * len(candidates)
+    # Off the event loop; the search can use its whole budget
+    proposal = await asyncio.to_thread(select_items, values, volumes, weights, remaining_volume, remaining_weight, time_budget_ms / 1000)
+    search_ms = (time.perf_counter() - started) * 1000
+
+    chosen = [candidates[k] for k in proposal["selected"]]
+    total_volume = sum(o.volume_m3 for o in chosen)
+    total_weight = sum(o.weight_kg for o in chosen)
+    return LoadProposalResponse(
+        vehicle_id=vehicle.id,
+        objective=objective,
+        remaining_volume_m3=remaining_volume,
+        remaining_weight_kg=remaining_weight,
+        candidate_orders=len(candidates),
+        orders=[
+            LoadProposalOrder(rank=i + 1, order_id=o.id, volume_m3=o.volume_m3, weight_kg=o.weight_kg, pickup_zone_id=o.pickup_zone_id)
+            for i, o in enumerate(chosen)
+        ],
+        total_volume_m3=total_volume,
+        total_weight_kg=total_weight,
+        value=proposal["value"],
+        upper_bound=proposal["upper_bound"],
+        utilization_after_percentage=((vehicle.current_volume_m3 + total_volume) / vehicle.max_volume_m3) * 100 if vehicle.max_volume_m3 > 0 else 0.0,
+        search_ms=search_ms
+    )
+
+from schemas import VehicleCapacityResponse
+from capacity_calendar import get_calendar
+
+@app.get("/vehicles/{vehicle_id}/capacity", response_model=VehicleCapacityResponse)
+async def get_vehicle_capacity(
+    vehicle_id: int,
+    start: datetime,
+    end: datetime,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Remaining capacity of the vehicle between start and end: its maximum
+    # less the load on board and the busiest reserved slot in the range
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view vehicle capacity")
+    try:
+        check_slot(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    vehicle = await db.get(Vehicle, vehicle_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    calendar = await get_calendar(db, vehicle_id)
+    peak_volume, peak_weight = calendar.peak(start, end)
+    return VehicleCapacityResponse(
+        vehicle_id=vehicle.id,
+        start=start,
+        end=end,
+        reserved_peak_volume_m3=peak_volume,
+        reserved_peak_weight_kg=peak_weight,
+        remaining_volume_m3=max(vehicle.max_volume_m3 - vehicle.current_volume_m3 - peak_volume, 0.0),
+        remaining_weight_kg=max(vehicle.max_weight_kg - vehicle.current_weight_kg - peak_weight, 0.0)
+    )
+
+from schemas import QuoteRequest, QuoteResponse, QuoteBatchRequest, QuoteBatchResponse, TariffCreate, TariffResponse
+from models import Tariff
+from pricing import get_tariff_matrix, quote_shipment, quote_shipments
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import math
+
+MAX_QUOTE_BATCH = 10000
+
+def build_quote_response(pickup_zone_id, drop_zone_id, volumetric_weight_kg, chargeable_weight_kg, distance_m,
+                         base_price, weight_charge, distance_surcharge, total_price) -> QuoteResponse:
+    pickup_zone_id = int(pickup_zone_id) if pickup_zone_id is not None and pickup_zone_id >= 0 else None
+    drop_zone_id = int(drop_zone_id) if drop_zone_id is not None and drop_zone_id >= 0 else None
+    reason = None
+    if pickup_zone_id is None:
+        reason = "Pickup location is outside every zone"
+    elif drop_zone_id is None:
+        reason = "Drop location is outside every zone"
+    elif math.isnan(total_price):
+        reason = "No tariff between these zones"
+    quote = QuoteResponse(
+        serviceable=reason is None,
+        reason=reason,
+        pickup_zone_id=pickup_zone_id,
+        drop_zone_id=drop_zone_id,
+        volumetric_weight_kg=round(float(volumetric_weight_kg), 3),
+        chargeable_weight_kg=round(float(chargeable_weight_kg), 3),
+        distance_km=round(float(distance_m) / 1000.0, 3)
+    )
+    if reason is None:
+        quote.base_price = round(float(base_price), 2)
+        quote.weight_charge = round(float(weight_charge), 2)
+        quote.distance_surcharge = round(float(distance_surcharge), 2)
+        quote.total_price = float(total_price)
+    return quote
+
+@app.post("/quotes", response_model=QuoteResponse)
+async def create_quote(request: QuoteRequest, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Price of a shipment before it is ordered. Nothing is stored; zones and
+    # tariffs come from in-memory caches, so this is cheap enough to call on
+    # every change of the order form.
+    zone_index = await get_zone_index(db)
+    matrix = await get_tariff_matrix(db)
+    quote = quote_shipment(
+        matrix, zone_index, request.length_cm, request.width_cm, request.height_cm, request.weight_kg,
+        request.pickup_latitude, request.pickup_longitude, request.drop_latitude, request.drop_longitude
+    )
+    return build_quote_response(**quote)
+
+@app.post("/quotes/batch", response_model=QuoteBatchResponse)
+async def create_quotes(request: QuoteBatchRequest, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if len(request.shipments) > MAX_QUOTE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_BATCH} shipments per request")
+    if not request.shipments:
+        return QuoteBatchResponse(quotes=[])
+
+    zone_index = await get_zone_index(db)
+    matrix = await get_tariff_matrix(db)
+    columns = {
+        name: np.array([getattr(s, name) for s in request.shipments], dtype=np.float64)
+        for name in QuoteRequest.model_fields
+    }
+    quotes = quote_shipments(
+        matrix, zone_index, columns["length_cm"], columns["width_cm"], columns["height_cm"], columns["weight_kg"],
+        columns["pickup_latitude"], columns["pickup_longitude"], columns["drop_latitude"], columns["drop_longitude"]
+    )
+    return QuoteBatchResponse(quotes=[
+        build_quote_response(**{name: values[k] for name, values in quotes.items()})
+        for k in range(len(request.shipments))
+    ])
+
+@app.get("/tariffs", response_model=list[TariffResponse])
+async def read_tariffs(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view tariffs")
+    result = await db.execute(select(Tariff).order_by(Tariff.pickup_zone_id, Tariff.drop_zone_id))
+    return result.scalars().all()
+
+@app.put("/tariffs", response_model=TariffResponse)
+async def set_tariff(tariff: TariffCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Creates the tariff for the zone pair, or replaces its prices
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can set tariffs")
+    if min(tariff.base_price, tariff.price_per_kg, tariff.price_per_km) < 0:
+        raise HTTPException(status_code=400, detail="Prices cannot be negative")
+    result = await db.execute(select(func.count(Zone.id)).where(Zone.id.in_({tariff.pickup_zone_id, tariff.drop_zone_id})))
+    if result.scalar() != len({tariff.pickup_zone_id, tariff.drop_zone_id}):
+        raise HTTPException(status_code=404, detail="Zone not found")
+
+    prices = {"base_price": tariff.base_price, "price_per_kg": tariff.price_per_kg, "price_per_km": tariff.price_per_km}
+    result = await db.execute(
+        pg_insert(Tariff)
+        .values(pickup_zone_id=tariff.pickup_zone_id, drop_zone_id=tariff.drop_zone_id, **prices)
+        .on_conflict_do_update(index_elements=[Tariff.pickup_zone_id, Tariff.drop_zone_id], set_=prices)
+        .returning(Tariff.id)
+    )
+    tariff_id = result.scalar_one()
+    await commit_with_versions(db, "tariffs")
+    return TariffResponse(id=tariff_id, **tariff.model_dump())
+
+@app.delete("/tariffs/{tariff_id}")
+async def delete_tariff(tariff_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can delete tariffs")
+    tariff = await db.get(Tariff, tariff_id)
+    if not tariff:
+        raise HTTPException(status_code=404, detail="Tariff not found")
+    await db.delete(tariff)
+    await commit_with_versions(db, "tariffs")
+    return {"message": "Tariff deleted successfully"}
+
+from schemas import RouteResponse, RouteStop
+from routing import build_stops, sequence_stops, route_signature, get_cached_route, cache_route
+from geo import haversine_m
+
+async def build_vehicle_route(db: AsyncSession, vehicle_id: int, start_latitude: Optional[float], start_longitude: Optional[float]) -> RouteResponse:
+    if (start_latitude is None) != (start_longitude is None):
+        raise HTTPException(status_code=400, detail="Give both start_latitude and start_longitude, or neither")
+    start = (round(start_latitude, 4), round(start_longitude, 4)) if start_latitude is not None else None
+
+    result = await db.execute(
+        select(Order).where(
+            Order.assigned_vehicle_id == vehicle_id,
+            Order.status.in_([models.OrderStatus.ASSIGNED, models.OrderStatus.SHIPPED])
+        )
+    )
+    orders = result.scalars().all()
+
+    # Orders are re-read every time; only the optimization is cached, keyed
+    # by the vehicle's current (order, status) set
+    signature = route_signature(orders)
+    cached = get_cached_route(vehicle_id, signature, start)
+    if cached is not None:
+        return cached
+
+    stops, unrouted = build_stops(orders)
+    sequence, total = sequence_stops(
+        [s["latitude"] for s in stops], [s["longitude"] for s in stops], [s["after"] for s in stops], start
+    )
+    route_stops = []
+    prev = start
+    for i, k in enumerate(sequence):
+        s = stops[k]
+        route_stops.append(RouteStop(
+            sequence=i + 1,
+            order_id=s["order_id"],
+            kind=s["kind"],
+            status=s["status"],
+            latitude=s["latitude"],
+            longitude=s["longitude"],
+            address=s["address"],
+            distance_from_previous_m=haversine_m(prev[0], prev[1], s["latitude"], s["longitude"]) if prev else 0.0
         ))
+        prev = (s["latitude"], s["longitude"])
+
+    response = RouteResponse(vehicle_id=vehicle_id, total_distance_m=total, stops=route_stops, unrouted_order_ids=unrouted)
+    cache_route(vehicle_id, signature, start, response)
     return response
 
+@app.get("/driver/route", response_model=RouteResponse)
+async def get_driver_route(
+    start_latitude: Optional[float] = None,
+    start_longitude: Optional[float] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != models.UserRole.DRIVER:
+        raise HTTPException(status_code=403, detail="Only drivers can view their route")
+    result = await db.execute(select(Vehicle.id).where(Vehicle.driver_id == current_user.id))
+    vehicle_id = result.scalars().first()
+    if vehicle_id is None:
+        raise HTTPException(status_code=404, detail="No vehicle assigned to this driver")
+    return await build_vehicle_route(db, vehicle_id, start_latitude, start_longitude)
+
+@app.get("/vehicles/{vehicle_id}/route", response_model=RouteResponse)
+async def get_vehicle_route(
+    vehicle_id: int,
+    start_latitude: Optional[float] = None,
+    start_longitude: Optional[float] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view vehicle routes")
+    vehicle = await db.get(Vehicle, vehicle_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    return await build_vehicle_route(db, vehicle_id, start_latitude, start_longitude)
+
 # Address Endpoints
 from schemas import AddressCreate, AddressResponse
 from models import Address
@@ -0,0 +1,24 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Starting migration...")
+        stmts = [
+            "ALTER TABLE assignment_queue ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE assignment_queue ADD COLUMN IF NOT EXISTS last_error VARCHAR",
+            "ALTER TABLE assignment_queue ADD COLUMN IF NOT EXISTS failed_at TIMESTAMP WITH TIME ZONE"
+        ]
+        
+        for stmt in stmts:
+            try:
+                await conn.execute(text(stmt))
+                print(f"Executed: {stmt}")
+            except Exception as e:
+                print(f"Error executing {stmt}: {e}")
+                
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,32 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Starting migration...")
+        stmts = [
+            # Existing orders get the migration time
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+            "CREATE INDEX IF NOT EXISTS ix_orders_status_id ON orders (status, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_assigned_vehicle_id_id ON orders (assigned_vehicle_id, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_user_id_id ON orders (user_id, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_pickup_zone_id_id ON orders (pickup_zone_id, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_drop_zone_id_id ON orders (drop_zone_id, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)",
+            # Covered by the (zone, id) indexes above
+            "DROP INDEX IF EXISTS ix_orders_pickup_zone_id",
+            "DROP INDEX IF EXISTS ix_orders_drop_zone_id"
+        ]
+        
+        for stmt in stmts:
+            try:
+                await conn.execute(text(stmt))
+                print(f"Executed: {stmt}")
+            except Exception as e:
+                print(f"Error executing {stmt}: {e}")
+                
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
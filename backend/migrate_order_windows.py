@@ -0,0 +1,23 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Starting migration...")
+        stmts = [
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS delivery_window_start TIMESTAMP WITH TIME ZONE",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS delivery_window_end TIMESTAMP WITH TIME ZONE"
+        ]
+        
+        for stmt in stmts:
+            try:
+                await conn.execute(text(stmt))
+                print(f"Executed: {stmt}")
+            except Exception as e:
+                print(f"Error executing {stmt}: {e}")
+                
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,45 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Adding zone id columns to orders...")
+        stmts = [
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS pickup_zone_id INTEGER REFERENCES zones(id) ON DELETE SET NULL",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS drop_zone_id INTEGER REFERENCES zones(id) ON DELETE SET NULL",
+            "CREATE INDEX IF NOT EXISTS ix_orders_pickup_zone_id ON orders (pickup_zone_id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_drop_zone_id ON orders (drop_zone_id)",
+        ]
+        for stmt in stmts:
+            await conn.execute(text(stmt))
+            print(f"Executed: {stmt}")
+
+        # Backfill with the first containing zone by id, like create_order does.
+        # Needs zones.geometry (migrate_zone_geometry.py). x = lat, y = lng.
+        print("Backfilling pickup zones...")
+        result = await conn.execute(text("""
+            UPDATE orders o SET pickup_zone_id = (
+                SELECT z.id FROM zones z
+                WHERE ST_Contains(z.geometry, ST_SetSRID(ST_MakePoint(o.pickup_latitude, o.pickup_longitude), 4326))
+                ORDER BY z.id LIMIT 1
+            )
+            WHERE o.pickup_zone_id IS NULL AND o.pickup_latitude IS NOT NULL AND o.pickup_longitude IS NOT NULL
+        """))
+        print(f"Updated {result.rowcount} orders")
+
+        print("Backfilling drop zones...")
+        result = await conn.execute(text("""
+            UPDATE orders o SET drop_zone_id = (
+                SELECT z.id FROM zones z
+                WHERE ST_Contains(z.geometry, ST_SetSRID(ST_MakePoint(o.drop_latitude, o.drop_longitude), 4326))
+                ORDER BY z.id LIMIT 1
+            )
+            WHERE o.drop_zone_id IS NULL AND o.drop_latitude IS NOT NULL AND o.drop_longitude IS NOT NULL
+        """))
+        print(f"Updated {result.rowcount} orders")
+
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,36 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Adding load counters to vehicles...")
+        stmts = [
+            "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS current_volume_m3 FLOAT NOT NULL DEFAULT 0",
+            "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS current_weight_kg FLOAT NOT NULL DEFAULT 0",
+        ]
+        for stmt in stmts:
+            await conn.execute(text(stmt))
+            print(f"Executed: {stmt}")
+
+        # Recompute from active orders (also repairs drifted counters if re-run)
+        print("Backfilling from ASSIGNED/SHIPPED orders...")
+        result = await conn.execute(text("""
+            UPDATE vehicles v SET
+                current_volume_m3 = COALESCE(s.volume, 0),
+                current_weight_kg = COALESCE(s.weight, 0)
+            FROM vehicles v2
+            LEFT JOIN (
+                SELECT assigned_vehicle_id, SUM(volume_m3) AS volume, SUM(weight_kg) AS weight
+                FROM orders
+                WHERE status IN ('ASSIGNED', 'SHIPPED') AND assigned_vehicle_id IS NOT NULL
+                GROUP BY assigned_vehicle_id
+            ) s ON s.assigned_vehicle_id = v2.id
+            WHERE v.id = v2.id
+        """))
+        print(f"Updated {result.rowcount} vehicles")
+
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
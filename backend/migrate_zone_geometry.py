@@ -0,0 +1,36 @@
+import asyncio
+from sqlalchemy import text
+from database import engine
+from zone_index import parse_zone_polygon
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("Enabling PostGIS...")
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+
+        print("Adding geometry column to zones...")
+        await conn.execute(text("ALTER TABLE zones ADD COLUMN IF NOT EXISTS geometry geometry(POLYGON, 4326)"))
+
+        # Convert the JSON [[lat, lng], ...] rows. x = lat, y = lng, same as the shapely code.
+        result = await conn.execute(text("SELECT id, name, geometry_coords FROM zones WHERE geometry IS NULL"))
+        for zone_id, name, geometry_coords in result.all():
+            try:
+                polygon = parse_zone_polygon(geometry_coords)
+            except Exception as e:
+                print(f"Skipping zone {name} ({zone_id}): {e}")
+                continue
+            if not polygon.is_valid:
+                print(f"Warning: zone {name} ({zone_id}) is not a valid polygon")
+            await conn.execute(
+                text("UPDATE zones SET geometry = ST_GeomFromText(:wkt, 4326) WHERE id = :id"),
+                {"wkt": polygon.wkt, "id": zone_id}
+            )
+            print(f"Converted zone {name} ({zone_id})")
+
+        print("Creating GiST index...")
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_zones_geometry ON zones USING GIST (geometry)"))
+
+        print("Migration complete")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Enum, ForeignKey, Boolean, DateTime, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship
-# from geoalchemy2 import Geometry
+from geoalchemy2 import Geometry
 import enum
 from database import Base
 
@@ -48,6 +48,9 @@ class Zone(Base):
     name = Column(String, unique=True, nullable=False)
     # Storing simple list of coords for now: "lat,lng;lat,lng..."
     geometry_coords = Column(String, nullable=False) 
+    # Same polygon as PostGIS geometry (GiST indexed). Axis order follows
+    # geometry_coords: x = lat, y = lng
+    geometry = Column(Geometry("POLYGON", srid=4326, spatial_index=True), nullable=True)
     
     vehicles = relationship("Vehicle", back_populates="zone")
 
@@ -59,6 +62,10 @@ class Vehicle(Base):
     max_volume_m3 = Column(Float, nullable=False)
     max_weight_kg = Column(Float, nullable=False)
     
+    # Live load of ASSIGNED/SHIPPED orders, maintained by vehicle_load.py
+    current_volume_m3 = Column(Float, nullable=False, default=0.0, server_default="0")
+    current_weight_kg = Column(Float, nullable=False, default=0.0, server_default="0")
+    
     zone_id = Column(Integer, ForeignKey("zones.id"), nullable=True)
     zone = relationship("Zone", back_populates="vehicles")
     
@@ -93,15 +100,39 @@ class Order(Base):
     drop_address = Column(String, nullable=True)
 
     pickup_location = Column(String, nullable=True) # Kept for legacy support if needed
+    
+    # Zones resolved from the pickup/drop points when the order is written
+    pickup_zone_id = Column(Integer, ForeignKey("zones.id", ondelete="SET NULL"), nullable=True)
+    drop_zone_id = Column(Integer, ForeignKey("zones.id", ondelete="SET NULL"), nullable=True)
+    # Distance in metres to the zone when it was matched by the nearest-zone
+    # fallback (point just outside every polygon); NULL for a normal match
+    pickup_zone_fallback_m = Column(Float, nullable=True)
+    drop_zone_fallback_m = Column(Float, nullable=True)
     assigned_vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=True)
     
+    # Optional delivery time window, used by fleet route planning (vrp.py)
+    delivery_window_start = Column(DateTime(timezone=True), nullable=True)
+    delivery_window_end = Column(DateTime(timezone=True), nullable=True)
+    
     # Dual Confirmation Flags
     driver_confirmed_delivery = Column(Boolean, default=False)
     user_confirmed_delivery = Column(Boolean, default=False)
     
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    
     user = relationship("User", back_populates="orders")
     vehicle = relationship("Vehicle", back_populates="orders")
 
+    # Listings filter on one of these and page by id (see order_listing.py)
+    __table_args__ = (
+        Index("ix_orders_status_id", "status", "id"),
+        Index("ix_orders_assigned_vehicle_id_id", "assigned_vehicle_id", "id"),
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        Index("ix_orders_pickup_zone_id_id", "pickup_zone_id", "id"),
+        Index("ix_orders_drop_zone_id_id", "drop_zone_id", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
+
 class Address(Base):
     __tablename__ = "addresses"
     
@@ -122,5 +153,71 @@ class Address(Base):
     
     user = relationship("User", back_populates="addresses")
 
+class EntityVersion(Base):
+    __tablename__ = "entity_versions"
+    
+    # Change counter per cached entity type ("zones", "vehicles", "users"),
+    # bumped in the same transaction as the write (see cache_versions.py)
+    entity = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class Tariff(Base):
+    __tablename__ = "tariffs"
+    
+    # Price of shipping from one zone to another (see pricing.py): a base
+    # price, a rate per chargeable kg and a rate per km beyond the distance
+    # the base price includes
+    id = Column(Integer, primary_key=True)
+    pickup_zone_id = Column(Integer, ForeignKey("zones.id", ondelete="CASCADE"), nullable=False)
+    drop_zone_id = Column(Integer, ForeignKey("zones.id", ondelete="CASCADE"), nullable=False)
+    base_price = Column(Float, nullable=False)
+    price_per_kg = Column(Float, nullable=False)
+    price_per_km = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    __table_args__ = (UniqueConstraint("pickup_zone_id", "drop_zone_id"),)
+
+class VehicleReservation(Base):
+    __tablename__ = "vehicle_reservations"
+    
+    # Capacity an order with a delivery window holds on its vehicle for
+    # that window (see capacity_calendar.py)
+    id = Column(Integer, primary_key=True)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), nullable=False, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, unique=True)
+    start_at = Column(DateTime(timezone=True), nullable=False)
+    end_at = Column(DateTime(timezone=True), nullable=False)
+    volume_m3 = Column(Float, nullable=False)
+    weight_kg = Column(Float, nullable=False)
+
+class AssignmentQueueItem(Base):
+    __tablename__ = "assignment_queue"
+    
+    # Orders waiting for vehicle assignment (see assignment_queue.py).
+    # Rows are deleted when a worker claims them. Orders whose assignment
+    # kept failing stay with failed_at set.
+    id = Column(BigInteger, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, unique=True)
+    enqueued_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String, nullable=True)
+    failed_at = Column(DateTime(timezone=True), nullable=True)
+
+class RezoningJob(Base):
+    __tablename__ = "rezoning_jobs"
+    
+    # Background re-zoning of PENDING orders after a zone is created or
+    # deleted (see rezoning.py). No foreign key: the zone may be the deleted one.
+    id = Column(String(32), primary_key=True)
+    zone_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    assigned = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
 # Update User model to include addresses relationship
 User.addresses = relationship("Address", back_populates="user")
@@ -0,0 +1,119 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_, select
+
+import models
+from database import AsyncSessionLocal
+from models import Order, Vehicle
+from fieldsets import fieldset_columns
+from order_serializer import ORDER_FIELDS, csv_value, dumps, order_dict
+
+# Order listings (GET /orders, GET /driver/orders) read plain rows of the
+# columns below instead of ORM objects, newest first, and page by keyset on
+# id: a page is "id < cursor ORDER BY id DESC LIMIT n", so every page costs
+# the same however deep it is. Each filter has a matching (column, id)
+# index on orders (see models.Order). GET /orders/export streams the same
+# filtered rows.
+
+ORDER_PAGE_MAX = 1000
+# Rows fetched from the server-side cursor and written out per chunk
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 5000))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ORDER_LIST_COLUMNS = (
+    Order.id, Order.user_id, Order.item_name, Order.status,
+    Order.length_cm, Order.width_cm, Order.height_cm, Order.weight_kg, Order.volume_m3,
+    Order.pickup_location, Order.pickup_latitude, Order.pickup_longitude, Order.pickup_address,
+    Order.drop_latitude, Order.drop_longitude, Order.drop_address,
+    Order.pickup_zone_id, Order.drop_zone_id, Order.pickup_zone_fallback_m, Order.drop_zone_fallback_m,
+    Order.assigned_vehicle_id, Order.delivery_window_start, Order.delivery_window_end,
+    Order.driver_confirmed_delivery, Order.user_confirmed_delivery, Order.created_at,
+    Vehicle.vehicle_number.label("assigned_vehicle_number"),
+)
+
+# Columns each OrderResponse field is built from, for ?fields=
+_PICKUP_POINT = (Order.pickup_location, Order.pickup_latitude, Order.pickup_longitude)
+ORDER_FIELD_COLUMNS = {
+    field: (
+        _PICKUP_POINT if field in ("pickup_latitude", "pickup_longitude", "latitude", "longitude")
+        else (ORDER_LIST_COLUMNS[-1],) if field == "assigned_vehicle_number"
+        else (getattr(Order, field),)
+    )
+    for field in ORDER_FIELDS
+}
+
+
+def order_list_stmt(fields: Optional[list[str]] = None):
+    # All listing columns, or just those behind fields. Vehicles are only
+    # joined when the vehicle number is wanted.
+    if fields is None:
+        return select(*ORDER_LIST_COLUMNS).outerjoin(Vehicle, Order.assigned_vehicle_id == Vehicle.id)
+    stmt = select(*fieldset_columns(fields, ORDER_FIELD_COLUMNS)).select_from(Order)
+    if "assigned_vehicle_number" in fields:
+        stmt = stmt.outerjoin(Vehicle, Order.assigned_vehicle_id == Vehicle.id)
+    return stmt
+
+
+def filter_orders(stmt, status: Optional[models.OrderStatus] = None, vehicle_id: Optional[int] = None,
+                  zone_id: Optional[int] = None, user_id: Optional[int] = None,
+                  created_from: Optional[datetime] = None, created_to: Optional[datetime] = None):
+    # zone_id matches either end of the order; created_to is exclusive
+    if status is not None:
+        stmt = stmt.where(Order.status == status)
+    if vehicle_id is not None:
+        stmt = stmt.where(Order.assigned_vehicle_id == vehicle_id)
+    if zone_id is not None:
+        stmt = stmt.where(or_(Order.pickup_zone_id == zone_id, Order.drop_zone_id == zone_id))
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if created_from is not None:
+        stmt = stmt.where(Order.created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(Order.created_at < created_to)
+    return stmt
+
+
+def page_orders(stmt, cursor: Optional[int] = None, limit: Optional[int] = None):
+    # Newest first, starting below cursor (the last id of the previous page).
+    # Without a limit the whole listing is returned.
+    if cursor is not None:
+        stmt = stmt.where(Order.id < cursor)
+    stmt = stmt.order_by(Order.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def next_cursor(rows, limit: Optional[int]) -> Optional[int]:
+    # Cursor of the next page, or None when this page was the last
+    if limit is None or len(rows) < limit:
+        return None
+    return rows[-1].id
+
+
+async def export_orders(stmt, fmt: str):
+    # Streams the filtered orders, oldest first, as NDJSON lines or CSV rows
+    # with the OrderResponse fields. Rows come from a server-side cursor
+    # EXPORT_CHUNK_ROWS at a time, so memory stays flat whatever the count.
+    # Runs in its own session: the request's session closes before the
+    # response body is sent.
+    stmt = stmt.order_by(Order.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    if fmt == "csv":
+        yield _csv_chunk([ORDER_FIELDS])
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _csv_chunk([[csv_value(v) for v in order_dict(r).values()] for r in rows])
+            else:
+                yield b"".join(dumps(order_dict(r)) + b"\n" for r in rows)
+
+
+def _csv_chunk(records) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(records)
+    return buffer.getvalue()
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import Response
+
+from schemas import OrderResponse
+
+# The one way orders are turned into API responses. Order data comes
+# straight from the DB, so it is not run through pydantic validation again:
+# order_dict() copies the OrderResponse fields off a Core row (such as
+# order_listing.order_list_stmt() returns) or an ORM Order, and the result
+# is encoded with orjson. OrderResponse stays the documented response_model.
+
+ORDER_FIELDS = tuple(OrderResponse.model_fields)
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _pickup_point(row) -> tuple[float, float]:
+    # Very old orders only have "lat,lng" in pickup_location
+    lat, lon = 0.0, 0.0
+    if row.pickup_location:
+        try:
+            lat, lon = map(float, row.pickup_location.split(','))
+        except ValueError:
+            pass
+    if row.pickup_latitude is not None: lat = row.pickup_latitude
+    if row.pickup_longitude is not None: lon = row.pickup_longitude
+    return lat, lon
+
+
+def order_dict(row, vehicle_number: Optional[str] = None) -> dict:
+    # OrderResponse fields of an order. Rows from order_list_stmt() carry
+    # assigned_vehicle_number; for ORM orders pass vehicle_number.
+    lat, lon = _pickup_point(row)
+    return {
+        "item_name": row.item_name,
+        "length_cm": row.length_cm,
+        "width_cm": row.width_cm,
+        "height_cm": row.height_cm,
+        "weight_kg": row.weight_kg,
+        "pickup_latitude": lat,
+        "pickup_longitude": lon,
+        "pickup_address": row.pickup_address,
+        "drop_latitude": row.drop_latitude,
+        "drop_longitude": row.drop_longitude,
+        "drop_address": row.drop_address,
+        "latitude": lat,
+        "longitude": lon,
+        "delivery_window_start": row.delivery_window_start,
+        "delivery_window_end": row.delivery_window_end,
+        "id": row.id,
+        "user_id": row.user_id,
+        "status": row.status.value,
+        "volume_m3": row.volume_m3,
+        "assigned_vehicle_id": row.assigned_vehicle_id,
+        "assigned_vehicle_number": vehicle_number if vehicle_number is not None else getattr(row, "assigned_vehicle_number", None),
+        "pickup_zone_id": row.pickup_zone_id,
+        "drop_zone_id": row.drop_zone_id,
+        "pickup_zone_fallback_m": row.pickup_zone_fallback_m,
+        "drop_zone_fallback_m": row.drop_zone_fallback_m,
+        "driver_confirmed_delivery": bool(row.driver_confirmed_delivery),
+        "user_confirmed_delivery": bool(row.user_confirmed_delivery),
+        "created_at": row.created_at,
+    }
+
+
+# How order_dict() derives the fields that aren't plain columns, per field,
+# for sparse fieldsets (see fieldsets.py)
+ORDER_COMPUTED_FIELDS = {
+    "pickup_latitude": lambda row: _pickup_point(row)[0],
+    "pickup_longitude": lambda row: _pickup_point(row)[1],
+    "latitude": lambda row: _pickup_point(row)[0],
+    "longitude": lambda row: _pickup_point(row)[1],
+    "status": lambda row: row.status.value,
+    "driver_confirmed_delivery": lambda row: bool(row.driver_confirmed_delivery),
+    "user_confirmed_delivery": lambda row: bool(row.user_confirmed_delivery),
+}
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, option=ORJSON_OPTIONS)
+
+
+def order_json_response(row, vehicle_number: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+    return Response(content=dumps(order_dict(row, vehicle_number)), media_type="application/json", headers=headers)
+
+
+def orders_json_response(rows, headers: Optional[dict] = None) -> Response:
+    return Response(content=dumps([order_dict(r) for r in rows]), media_type="application/json", headers=headers)
+
+
+def csv_value(value):
+    # order_dict() values as CSV cells, in the same text form as the JSON
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return dumps(value)[1:-1].decode()
+    return value
@@ -0,0 +1,43 @@
+import hashlib
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache_versions import bump_versions_quietly
+from models import Order
+
+# Change counters behind the order listing ETags: "orders" for every order
+# and "orders:user:<id>" for one MSME's orders. Every write that changes
+# what a listing shows calls touch_orders() in its transaction, just before
+# committing: "orders" is a hot row, so it is locked after any vehicle rows
+# the transaction locks, never before, and held as briefly as possible.
+
+ORDERS_ENTITY = "orders"
+
+
+def user_orders_entity(user_id: int) -> str:
+    return f"orders:user:{user_id}"
+
+
+async def touch_orders(db: AsyncSession, user_ids=(), order_ids=()):
+    # Bump "orders" and the lists of the given users, plus the owners of
+    # order_ids when the caller doesn't have them at hand
+    user_ids = set(user_ids)
+    order_ids = list(order_ids)
+    if order_ids:
+        result = await db.execute(select(Order.user_id).where(Order.id.in_(order_ids)).distinct())
+        user_ids.update(result.scalars().all())
+    await bump_versions_quietly(db, [ORDERS_ENTITY] + [user_orders_entity(u) for u in user_ids])
+
+
+async def touch_orders_where(db: AsyncSession, *conditions):
+    # touch_orders() for the owners of every order matching conditions
+    result = await db.execute(select(Order.user_id).where(*conditions).distinct())
+    await touch_orders(db, result.scalars().all())
+
+
+def query_variant(query_string: str) -> str:
+    # Short stable tag for a listing's query parameters, for the ETag
+    if not query_string:
+        return ""
+    return hashlib.sha1(query_string.encode()).hexdigest()[:12]
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache_versions import on_invalidate
+from geo import haversine_m
+from models import Tariff, Zone
+
+# Shipping quotes. The price of a shipment is its pickup-zone to drop-zone
+# tariff: a base price, plus a rate per chargeable kg, plus a rate per km of
+# straight-line distance beyond QUOTE_INCLUDED_DISTANCE_KM. Chargeable
+# weight is the larger of the actual weight and the volumetric weight
+# (L x W x H in cm / VOLUMETRIC_DIVISOR).
+#
+# Tariffs are held per process as dense zone-by-zone arrays, so a quote is a
+# zone lookup (zone_index.py) and an array index. The matrix is rebuilt on
+# first use after any worker changes tariffs or zones (cache_versions.py).
+
+VOLUMETRIC_DIVISOR = float(os.getenv("VOLUMETRIC_DIVISOR", 5000))
+QUOTE_INCLUDED_DISTANCE_KM = float(os.getenv("QUOTE_INCLUDED_DISTANCE_KM", 5))
+
+
+class TariffMatrix:
+    # base/per_kg/per_km[i, j] for pickup zone i and drop zone j, by
+    # position in zone_ids. The last row and column stand for "no zone" and,
+    # like pairs without a tariff, hold NaN.
+
+    def __init__(self, zone_ids, tariffs):
+        self.zone_ids = np.asarray(sorted(zone_ids), dtype=np.int64)
+        self.position = {int(zone_id): i for i, zone_id in enumerate(self.zone_ids)}
+        n = len(self.zone_ids) + 1
+        self.base = np.full((n, n), np.nan)
+        self.per_kg = np.full((n, n), np.nan)
+        self.per_km = np.full((n, n), np.nan)
+        self.tariffs = 0
+        for t in tariffs:
+            i = self.position.get(t.pickup_zone_id)
+            j = self.position.get(t.drop_zone_id)
+            if i is None or j is None:
+                continue
+            self.base[i, j] = t.base_price
+            self.per_kg[i, j] = t.price_per_kg
+            self.per_km[i, j] = t.price_per_km
+            self.tariffs += 1
+
+    def positions(self, zone_ids) -> np.ndarray:
+        # Matrix positions of zone ids (-1 or unknown -> the "no zone" slot)
+        zone_ids = np.asarray(zone_ids, dtype=np.int64)
+        n = len(self.zone_ids)
+        if n == 0:
+            return np.zeros(zone_ids.shape, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.zone_ids, zone_ids), n - 1)
+        return np.where(self.zone_ids[found] == zone_ids, found, n)
+
+
+def chargeable_weights(lengths_cm, widths_cm, heights_cm, weights_kg):
+    # (volumetric weights, chargeable weights) in kg
+    volumetric = np.asarray(lengths_cm, dtype=np.float64) * np.asarray(widths_cm, dtype=np.float64) \
+        * np.asarray(heights_cm, dtype=np.float64) / VOLUMETRIC_DIVISOR
+    return volumetric, np.maximum(volumetric, np.asarray(weights_kg, dtype=np.float64))
+
+
+def price_shipments(matrix: TariffMatrix, pickup_zones, drop_zones, chargeable_kg, distances_m) -> dict:
+    # Vectorized pricing. Returns arrays: base_price, weight_charge,
+    # distance_surcharge and total_price, NaN where no tariff applies. Each
+    # component is rounded to cents and the total is their sum, so the
+    # breakdown always adds up to it.
+    i = matrix.positions(pickup_zones)
+    j = matrix.positions(drop_zones)
+    distance_km = np.asarray(distances_m, dtype=np.float64) / 1000.0
+    base = np.round(matrix.base[i, j], 2)
+    weight_charge = np.round(matrix.per_kg[i, j] * chargeable_kg, 2)
+    surcharge = np.round(matrix.per_km[i, j] * np.maximum(distance_km - QUOTE_INCLUDED_DISTANCE_KM, 0.0), 2)
+    return {
+        "base_price": base,
+        "weight_charge": weight_charge,
+        "distance_surcharge": surcharge,
+        "total_price": np.round(base + weight_charge + surcharge, 2),
+    }
+
+
+def quote_shipments(matrix: TariffMatrix, zone_index, lengths_cm, widths_cm, heights_cm, weights_kg,
+                    pickup_lats, pickup_lngs, drop_lats, drop_lngs) -> dict:
+    # Quotes for many shipments at once: zones resolved in two vectorized
+    # calls, then priced with price_shipments
+    pickup_zones, _ = zone_index.resolve_points(pickup_lats, pickup_lngs)
+    drop_zones, _ = zone_index.resolve_points(drop_lats, drop_lngs)
+    volumetric, chargeable = chargeable_weights(lengths_cm, widths_cm, heights_cm, weights_kg)
+    distances = np.atleast_1d(haversine_m(pickup_lats, pickup_lngs, drop_lats, drop_lngs))
+    quote = price_shipments(matrix, pickup_zones, drop_zones, chargeable, distances)
+    quote.update(
+        pickup_zone_id=pickup_zones, drop_zone_id=drop_zones,
+        volumetric_weight_kg=volumetric, chargeable_weight_kg=chargeable, distance_m=distances
+    )
+    return quote
+
+
+def quote_shipment(matrix: TariffMatrix, zone_index, length_cm: float, width_cm: float, height_cm: float,
+                   weight_kg: float, pickup_lat: float, pickup_lng: float, drop_lat: float, drop_lng: float) -> dict:
+    # Single quote on the scalar path (grid zone lookups), as plain floats
+    pickup_zone, _ = zone_index.resolve_zone(pickup_lat, pickup_lng)
+    drop_zone, _ = zone_index.resolve_zone(drop_lat, drop_lng)
+    volumetric = length_cm * width_cm * height_cm / VOLUMETRIC_DIVISOR
+    chargeable = max(volumetric, weight_kg)
+    distance = haversine_m(pickup_lat, pickup_lng, drop_lat, drop_lng)
+    i = matrix.position.get(pickup_zone, len(matrix.zone_ids))
+    j = matrix.position.get(drop_zone, len(matrix.zone_ids))
+    # Rounded per component, as in price_shipments
+    base = round(float(matrix.base[i, j]), 2)
+    weight_charge = round(float(matrix.per_kg[i, j]) * chargeable, 2)
+    surcharge = round(float(matrix.per_km[i, j]) * max(distance / 1000.0 - QUOTE_INCLUDED_DISTANCE_KM, 0.0), 2)
+    return {
+        "pickup_zone_id": pickup_zone, "drop_zone_id": drop_zone,
+        "volumetric_weight_kg": volumetric, "chargeable_weight_kg": chargeable, "distance_m": distance,
+        "base_price": base, "weight_charge": weight_charge, "distance_surcharge": surcharge,
+        "total_price": round(base + weight_charge + surcharge, 2),
+    }
+
+
+# Process-wide matrix, loaded on first use and dropped whenever tariffs or
+# zones change in any worker
+_matrix: Optional[TariffMatrix] = None
+_matrix_generation = 0
+_matrix_lock = asyncio.Lock()
+
+
+async def get_tariff_matrix(db: AsyncSession) -> TariffMatrix:
+    global _matrix
+    if _matrix is not None:
+        return _matrix
+    async with _matrix_lock:
+        if _matrix is not None:
+            return _matrix
+        generation = _matrix_generation
+        zone_ids = (await db.execute(select(Zone.id))).scalars().all()
+        tariffs = (await db.execute(select(Tariff))).scalars().all()
+        matrix = TariffMatrix(zone_ids, tariffs)
+        # Don't cache a matrix that was invalidated while it was loading
+        if generation == _matrix_generation:
+            _matrix = matrix
+        return matrix
+
+
+def invalidate_tariff_matrix():
+    global _matrix, _matrix_generation
+    _matrix_generation += 1
+    _matrix = None
+
+
+on_invalidate("tariffs", invalidate_tariff_matrix)
+on_invalidate("zones", invalidate_tariff_matrix)
@@ -0,0 +1,247 @@
+import asyncio
+import math
+import os
+import uuid
+from typing import Optional
+
+import numpy as np
+import shapely
+from sqlalchemy import and_, bindparam, func, or_, select, update
+
+import models
+from database import AsyncSessionLocal
+from models import Order, RezoningJob, Vehicle
+from order_versions import touch_orders
+from process_pool import get_process_pool
+from vehicle_load import assign_orders_bulk, touch_vehicle_loads
+from zone_index import METERS_PER_DEGREE, ZONE_FALLBACK_MAX_DISTANCE_M, ZoneIndex, get_zone_index
+
+REZONE_CHUNK_SIZE = int(os.getenv("REZONE_CHUNK_SIZE", 5000))
+REZONE_UPDATE_BATCH = 1000
+REZONE_JOBS_LISTED = 50
+
+# Jobs live in rezoning_jobs, so any worker process can report on them. The
+# counters are updated in the same transaction as each batch of work.
+
+
+def rezone_job_dict(job: RezoningJob) -> dict:
+    return {
+        "id": job.id,
+        "zone_id": job.zone_id,
+        "action": job.action,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "updated": job.updated,
+        "assigned": job.assigned,
+        "error": job.error,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def get_rezone_job(db, job_id: str) -> Optional[RezoningJob]:
+    return await db.get(RezoningJob, job_id)
+
+
+async def list_rezone_jobs(db) -> list[RezoningJob]:
+    # Most recent first
+    result = await db.execute(
+        select(RezoningJob).order_by(RezoningJob.started_at.desc()).limit(REZONE_JOBS_LISTED)
+    )
+    return result.scalars().all()
+
+
+# Running jobs of this process, referenced so they aren't garbage collected
+_tasks: set[asyncio.Task] = set()
+
+
+async def start_rezoning(db, zone_id: int, action: str, bounds) -> str:
+    # bounds is the (min_lat, min_lng, max_lat, max_lng) box of the zone that
+    # was created or deleted; only PENDING orders inside it can change zone.
+    # Records the job and returns its id.
+    job_id = uuid.uuid4().hex
+    db.add(RezoningJob(id=job_id, zone_id=zone_id, action=action, status="queued"))
+    await db.commit()
+    task = asyncio.create_task(_run_rezoning(job_id, tuple(bounds)))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job_id
+
+
+async def _update_job(db, job_id: str, **values):
+    await db.execute(update(RezoningJob).where(RezoningJob.id == job_id).values(**values))
+
+
+# --- Process pool side ---
+_worker_index: Optional[tuple[int, ZoneIndex]] = None
+
+
+def classify_chunk(zone_version: int, zone_ids, zone_wkbs, pickup_lats, pickup_lngs, drop_lats, drop_lngs, fallback_max_distance_m):
+    # Runs in a pool process. The index is rebuilt only when the zone set
+    # changes, not once per chunk. Returns (zone ids, fallback distances)
+    # for the pickup and the drop points.
+    global _worker_index
+    if _worker_index is None or _worker_index[0] != zone_version:
+        polygons = shapely.from_wkb(np.array(zone_wkbs, dtype=object))
+        _worker_index = (zone_version, ZoneIndex(list(zip(zone_ids, polygons))))
+    index = _worker_index[1]
+    return (
+        index.resolve_points(pickup_lats, pickup_lngs, fallback_max_distance_m),
+        index.resolve_points(drop_lats, drop_lngs, fallback_max_distance_m),
+    )
+
+
+def _zone_or_none(zone_id):
+    return int(zone_id) if zone_id >= 0 else None
+
+
+def _distance_or_none(distance):
+    return None if np.isnan(distance) else float(distance)
+
+
+def _as_float_array(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+async def _run_rezoning(job_id: str, bounds):
+    async with AsyncSessionLocal() as db:
+        try:
+            await _update_job(db, job_id, status="running")
+            await db.commit()
+            await _rezone(db, job_id, bounds)
+            await _update_job(db, job_id, status="completed", finished_at=func.now())
+            await db.commit()
+        except Exception as e:
+            print(f"Re-zoning job {job_id} failed: {e}")
+            try:
+                await db.rollback()
+                await _update_job(db, job_id, status="failed", error=str(e), finished_at=func.now())
+                await db.commit()
+            except Exception as record_error:
+                print(f"Could not record failure of re-zoning job {job_id}: {record_error}")
+
+
+async def _rezone(db, job_id: str, bounds):
+    min_lat, min_lng, max_lat, max_lng = bounds
+    if ZONE_FALLBACK_MAX_DISTANCE_M > 0:
+        # Orders just outside the box can match the zone through the fallback
+        lat_margin = ZONE_FALLBACK_MAX_DISTANCE_M / METERS_PER_DEGREE
+        lng_margin = lat_margin / max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 0.01)
+        min_lat, max_lat = min_lat - lat_margin, max_lat + lat_margin
+        min_lng, max_lng = min_lng - lng_margin, max_lng + lng_margin
+
+    # 1. Candidate orders: PENDING with a pickup or drop point in the bounding box
+    result = await db.execute(
+        select(
+            Order.id, Order.user_id, Order.pickup_latitude, Order.pickup_longitude,
+            Order.drop_latitude, Order.drop_longitude,
+            Order.pickup_zone_id, Order.drop_zone_id,
+            Order.pickup_zone_fallback_m, Order.drop_zone_fallback_m,
+            Order.weight_kg, Order.volume_m3
+        )
+        .where(
+            Order.status == models.OrderStatus.PENDING,
+            or_(
+                and_(Order.pickup_latitude.between(min_lat, max_lat), Order.pickup_longitude.between(min_lng, max_lng)),
+                and_(Order.drop_latitude.between(min_lat, max_lat), Order.drop_longitude.between(min_lng, max_lng)),
+            )
+        )
+        .order_by(Order.id)
+    )
+    rows = result.all()
+    await _update_job(db, job_id, total=len(rows))
+    await db.commit()
+    if not rows:
+        return
+
+    # 2. Resolve zones against the current zone set in the process pool, chunk by chunk
+    zone_index = await get_zone_index(db)
+    zone_wkbs = [shapely.to_wkb(p) for p in zone_index.polygons]
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+
+    changes = []
+    for start in range(0, len(rows), REZONE_CHUNK_SIZE):
+        chunk = rows[start:start + REZONE_CHUNK_SIZE]
+        (pickup_zones, pickup_fallbacks), (drop_zones, drop_fallbacks) = await loop.run_in_executor(
+            pool, classify_chunk, zone_index.version, zone_index.zone_ids, zone_wkbs,
+            _as_float_array([r.pickup_latitude for r in chunk]),
+            _as_float_array([r.pickup_longitude for r in chunk]),
+            _as_float_array([r.drop_latitude for r in chunk]),
+            _as_float_array([r.drop_longitude for r in chunk]),
+            ZONE_FALLBACK_MAX_DISTANCE_M,
+        )
+        for i, r in enumerate(chunk):
+            resolved = (
+                _zone_or_none(pickup_zones[i]), _zone_or_none(drop_zones[i]),
+                _distance_or_none(pickup_fallbacks[i]), _distance_or_none(drop_fallbacks[i]),
+            )
+            current = (r.pickup_zone_id, r.drop_zone_id, r.pickup_zone_fallback_m, r.drop_zone_fallback_m)
+            if resolved != current:
+                changes.append((r, resolved))
+        await _update_job(db, job_id, processed=RezoningJob.processed + len(chunk))
+        await db.commit()
+
+    if not changes:
+        return
+
+    # 3. Zone ids, as batched UPDATEs. The status guard skips orders that
+    # were assigned or cancelled meanwhile.
+    orders = Order.__table__
+    zone_stmt = (
+        update(orders)
+        .where(orders.c.id == bindparam("b_id"), orders.c.status == models.OrderStatus.PENDING)
+        .values(
+            pickup_zone_id=bindparam("b_pickup_zone_id"),
+            drop_zone_id=bindparam("b_drop_zone_id"),
+            pickup_zone_fallback_m=bindparam("b_pickup_zone_fallback_m"),
+            drop_zone_fallback_m=bindparam("b_drop_zone_fallback_m"),
+        )
+    )
+    params = [
+        {
+            "b_id": r.id,
+            "b_pickup_zone_id": pickup_zone_id,
+            "b_drop_zone_id": drop_zone_id,
+            "b_pickup_zone_fallback_m": pickup_fallback_m,
+            "b_drop_zone_fallback_m": drop_fallback_m,
+        }
+        for r, (pickup_zone_id, drop_zone_id, pickup_fallback_m, drop_fallback_m) in changes
+    ]
+    for start in range(0, len(params), REZONE_UPDATE_BATCH):
+        batch = params[start:start + REZONE_UPDATE_BATCH]
+        await db.execute(zone_stmt, batch)
+        await touch_orders(db, {r.user_id for r, _ in changes[start:start + REZONE_UPDATE_BATCH]})
+        await _update_job(db, job_id, updated=RezoningJob.updated + len(batch))
+        await db.commit()
+
+    # 4. Pick a vehicle in the new pickup zone, same first-fit rule as create_order
+    zone_ids = {resolved[0] for _, resolved in changes if resolved[0] is not None}
+    if not zone_ids:
+        return
+    vehicles_by_zone: dict[int, list] = {}
+    v_res = await db.execute(select(Vehicle).where(Vehicle.zone_id.in_(zone_ids)).order_by(Vehicle.id))
+    for v in v_res.scalars().all():
+        vehicles_by_zone.setdefault(v.zone_id, []).append(v)
+
+    # Planned loads on top of each vehicle's current load
+    planned = {v.id: [v.current_volume_m3, v.current_weight_kg] for vs in vehicles_by_zone.values() for v in vs}
+    assignments = []
+    for r, (pickup_zone_id, _, _, _) in changes:
+        for v in vehicles_by_zone.get(pickup_zone_id, []):
+            load = planned[v.id]
+            if v.max_volume_m3 - load[0] >= r.volume_m3 and v.max_weight_kg - load[1] >= r.weight_kg:
+                load[0] += r.volume_m3
+                load[1] += r.weight_kg
+                assignments.append((r.id, v.id))
+                break
+
+    # 5. Assign in batches. assign_orders_bulk locks the batch's vehicles and
+    # re-checks capacity, so orders created meanwhile can't be overbooked.
+    for start in range(0, len(assignments), REZONE_UPDATE_BATCH):
+        applied = await assign_orders_bulk(db, assignments[start:start + REZONE_UPDATE_BATCH])
+        await _update_job(db, job_id, assigned=RezoningJob.assigned + len(applied))
+        if applied:
+            await touch_vehicle_loads(db)
+        await db.commit()
@@ -0,0 +1,242 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+import models
+from geo import haversine_matrix
+
+# Stop sequencing for one vehicle. ASSIGNED orders give a pickup and a drop
+# stop (pickup first), SHIPPED orders only their drop. The route is an open
+# path: it starts at the driver's position when given, otherwise anywhere,
+# and does not return.
+#
+# Construction is nearest neighbour over the stops that are currently
+# allowed (a drop only once its pickup is visited), then 2-opt and Or-opt
+# moves are applied while they shorten the route and keep every pickup
+# before its drop. Both moves are scored for all positions at once with
+# NumPy, so only improving moves pay for a precedence check.
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 1024))
+# Improvement passes stop after this many rounds even if still improving
+ROUTE_MAX_ROUNDS = 50
+# Or-opt moves segments of up to this many consecutive stops
+OR_OPT_MAX_SEGMENT = 3
+IMPROVEMENT_EPSILON = 1e-6
+
+
+def build_stops(orders) -> tuple[list[dict], list[int]]:
+    # Returns (stops, ids of orders left out for lack of coordinates)
+    stops, unrouted = [], []
+    for o in sorted(orders, key=lambda o: o.id):
+        has_pickup = o.pickup_latitude is not None and o.pickup_longitude is not None
+        has_drop = o.drop_latitude is not None and o.drop_longitude is not None
+        if not has_drop or (o.status == models.OrderStatus.ASSIGNED and not has_pickup):
+            unrouted.append(o.id)
+            continue
+        pickup_index = -1
+        if o.status == models.OrderStatus.ASSIGNED:
+            pickup_index = len(stops)
+            stops.append({
+                "order_id": o.id, "kind": "pickup", "status": o.status,
+                "latitude": o.pickup_latitude, "longitude": o.pickup_longitude,
+                "address": o.pickup_address, "after": -1
+            })
+        stops.append({
+            "order_id": o.id, "kind": "drop", "status": o.status,
+            "latitude": o.drop_latitude, "longitude": o.drop_longitude,
+            "address": o.drop_address, "after": pickup_index
+        })
+    return stops, unrouted
+
+
+def route_cost(route, dist) -> float:
+    if len(route) < 2:
+        return 0.0
+    route = np.asarray(route)
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+def _nearest_neighbour(dist, after, first: int, fixed_start: bool) -> list[int]:
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    # Number of unvisited predecessors per node (0 or 1)
+    blocked = after >= 0
+    if fixed_start:
+        blocked[first] = False
+    successor = np.full(n, -1)
+    successor[after[after >= 0]] = np.flatnonzero(after >= 0)
+
+    route = [first]
+    visited[first] = True
+    if successor[first] >= 0:
+        blocked[successor[first]] = False
+    while len(route) < n:
+        candidates = np.where(visited | blocked, np.inf, dist[route[-1]])
+        nxt = int(np.argmin(candidates))
+        route.append(nxt)
+        visited[nxt] = True
+        if successor[nxt] >= 0:
+            blocked[successor[nxt]] = False
+    return route
+
+
+def _two_opt(route: np.ndarray, dist, after, fixed_start: bool) -> bool:
+    # One pass of best-improvement 2-opt per start position. Reversing
+    # route[i..j] is only feasible if no order has both stops inside it.
+    n = len(route)
+    improved = False
+    for i in range(1 if fixed_start else 0, n - 1):
+        pos = np.empty(n, dtype=np.int64)
+        pos[route] = np.arange(n)
+        has_pickup = after >= 0
+        pickup_pos = pos[after[has_pickup]]
+        drop_pos = pos[np.flatnonzero(has_pickup)]
+        inside = pickup_pos >= i
+        j_limit = int(drop_pos[inside].min()) if inside.any() else n
+        if j_limit <= i + 1:
+            continue
+
+        js = np.arange(i + 1, j_limit)
+        a, seg_first = (route[i - 1] if i > 0 else -1), route[i]
+        seg_last = route[js]
+        delta = np.zeros(len(js))
+        if a >= 0:
+            delta += dist[a, seg_last] - dist[a, seg_first]
+        has_next = js < n - 1
+        nxt = route[js[has_next] + 1]
+        delta[has_next] += dist[seg_first, nxt] - dist[seg_last[has_next], nxt]
+
+        k = int(np.argmin(delta))
+        if delta[k] < -IMPROVEMENT_EPSILON:
+            j = js[k]
+            route[i:j + 1] = route[i:j + 1][::-1]
+            improved = True
+    return improved
+
+
+def _or_opt(route: np.ndarray, dist, after, fixed_start: bool) -> bool:
+    # Move a segment of 1..OR_OPT_MAX_SEGMENT stops elsewhere, unreversed
+    n = len(route)
+    improved = False
+    successor = np.full(n, -1)
+    successor[after[after >= 0]] = np.flatnonzero(after >= 0)
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = 1 if fixed_start else 0
+        while i + length <= n:
+            segment = route[i:i + length]
+            rest = np.concatenate((route[:i], route[i + length:]))
+            first, last = segment[0], segment[-1]
+            prev = route[i - 1] if i > 0 else -1
+            nxt = route[i + length] if i + length < n else -1
+
+            # Length saved by taking the segment out
+            gain = 0.0
+            if prev >= 0:
+                gain += dist[prev, first]
+            if nxt >= 0:
+                gain += dist[last, nxt]
+            if prev >= 0 and nxt >= 0:
+                gain -= dist[prev, nxt]
+
+            # Insertion slot k puts the segment before rest[k]. Pickups
+            # outside the segment bound it from below, drops from above.
+            rest_pos = np.empty(n, dtype=np.int64)
+            rest_pos[rest] = np.arange(len(rest))
+            in_segment = np.zeros(n, dtype=bool)
+            in_segment[segment] = True
+            low = 1 if fixed_start else 0
+            high = len(rest)
+            for s in segment:
+                if after[s] >= 0 and not in_segment[after[s]]:
+                    low = max(low, rest_pos[after[s]] + 1)
+                if successor[s] >= 0 and not in_segment[successor[s]]:
+                    high = min(high, rest_pos[successor[s]])
+            if low > high:
+                i += 1
+                continue
+
+            slots = np.arange(low, high + 1)
+            cost = np.zeros(len(slots))
+            has_a = slots > 0
+            cost[has_a] += dist[rest[slots[has_a] - 1], first]
+            has_b = slots < len(rest)
+            cost[has_b] += dist[last, rest[slots[has_b]]]
+            both = has_a & has_b
+            cost[both] -= dist[rest[slots[both] - 1], rest[slots[both]]]
+
+            k = int(np.argmin(cost))
+            if cost[k] - gain < -IMPROVEMENT_EPSILON:
+                slot = slots[k]
+                route[:] = np.concatenate((rest[:slot], segment, rest[slot:]))
+                improved = True
+            i += 1
+    return improved
+
+
+def sequence_stops(lats, lngs, after, start: Optional[tuple[float, float]] = None) -> tuple[list[int], float]:
+    # Orders stops so that stop after[k] (when >= 0) comes before stop k.
+    # Returns (stop indices in visiting order, path length in metres, from
+    # start when given).
+    n = len(lats)
+    if n == 0:
+        return [], 0.0
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    after = np.asarray(after, dtype=np.int64)
+    fixed_start = start is not None
+    if fixed_start:
+        # Node 0 is the start position, fixed in first place
+        lats = np.concatenate(([start[0]], lats))
+        lngs = np.concatenate(([start[1]], lngs))
+        after = np.concatenate(([-1], np.where(after >= 0, after + 1, -1)))
+    dist = haversine_matrix(lats, lngs).astype(np.float64)
+
+    if fixed_start:
+        best = _nearest_neighbour(dist, after, 0, True)
+    else:
+        # Without a start, try every stop that may come first
+        best, best_cost = None, np.inf
+        for first in np.flatnonzero(after < 0):
+            route = _nearest_neighbour(dist, after, int(first), False)
+            cost = route_cost(route, dist)
+            if cost < best_cost:
+                best, best_cost = route, cost
+
+    route = np.array(best, dtype=np.int64)
+    for _ in range(ROUTE_MAX_ROUNDS):
+        improved = _two_opt(route, dist, after, fixed_start)
+        improved = _or_opt(route, dist, after, fixed_start) or improved
+        if not improved:
+            break
+
+    cost = route_cost(route, dist)
+    order = route.tolist()
+    if fixed_start:
+        order = [k - 1 for k in order[1:]]
+    return order, cost
+
+
+def route_signature(orders) -> tuple:
+    # Changes whenever an order joins, leaves or changes status on the vehicle
+    return tuple(sorted((o.id, o.status.value) for o in orders))
+
+
+# vehicle id -> (signature, start, result); least recently used dropped first
+_route_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+
+def get_cached_route(vehicle_id: int, signature: tuple, start):
+    cached = _route_cache.get(vehicle_id)
+    if cached is None or cached[0] != signature or cached[1] != start:
+        return None
+    _route_cache.move_to_end(vehicle_id)
+    return cached[2]
+
+
+def cache_route(vehicle_id: int, signature: tuple, start, result):
+    _route_cache[vehicle_id] = (signature, start, result)
+    _route_cache.move_to_end(vehicle_id)
+    while len(_route_cache) > ROUTE_CACHE_SIZE:
+        _route_cache.popitem(last=False)
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, model_serializer
 from typing import Optional, List, Any
+from datetime import date, datetime
 from models import UserRole, OrderStatus
 
 # Auth Schemas
@@ -55,10 +56,32 @@ class ZoneCreate(ZoneBase):
 
 class ZoneResponse(ZoneBase):
     id: int
+    # With ?encoding=polyline, coordinates is omitted and the ring is sent
+    # as an encoded polyline instead
+    coordinates: Optional[List[Any]] = None
+    polyline: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+    @model_serializer(mode="wrap")
+    def _omit_other_encoding(self, handler):
+        # Leave out whichever of coordinates / polyline wasn't sent, rather
+        # than sending it as null (also when nested in VehicleResponse)
+        data = handler(self)
+        for field in ("coordinates", "polyline"):
+            if data.get(field) is None:
+                data.pop(field, None)
+        return data
+
+class ZoneClassifyRequest(BaseModel):
+    # List of [lat, lng] pairs
+    points: List[List[float]]
+
+class ZoneClassifyResponse(BaseModel):
+    # Matching zone id per input point, null where no zone contains it
+    zone_ids: List[Optional[int]]
+
 # Vehicle Schemas
 class VehicleBase(BaseModel):
     vehicle_number: str
@@ -80,6 +103,7 @@ class VehicleUpdate(BaseModel):
 class VehicleResponse(VehicleBase):
     id: int
     current_volume_m3: float = 0.0 
+    current_weight_kg: float = 0.0
     utilization_percentage: float = 0.0
     zone: Optional[ZoneResponse] = None
     
@@ -125,6 +149,10 @@ class OrderBase(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
+    # Optional delivery time window, used by fleet route planning
+    delivery_window_start: Optional[datetime] = None
+    delivery_window_end: Optional[datetime] = None
+
 class OrderCreate(OrderBase):
     pass
 
@@ -135,8 +163,13 @@ class OrderResponse(OrderBase):
     volume_m3: float
     assigned_vehicle_id: Optional[int] = None
     assigned_vehicle_number: Optional[str] = None
+    pickup_zone_id: Optional[int] = None
+    drop_zone_id: Optional[int] = None
+    pickup_zone_fallback_m: Optional[float] = None
+    drop_zone_fallback_m: Optional[float] = None
     driver_confirmed_delivery: bool = False
     user_confirmed_delivery: bool = False
+    created_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -145,6 +178,180 @@ class OrderResponse(OrderBase):
 class AssignOrderRequest(BaseModel):
     vehicle_id: int
 
+class BatchAssignRequest(BaseModel):
+    strategy: str = "ffd"  # "ffd" (first-fit decreasing) or "bfd" (best-fit decreasing)
+    zone_id: Optional[int] = None  # Limit to one zone; all zones when omitted
+    commit: bool = False  # False only returns the proposed plan
+
+class BatchAssignment(BaseModel):
+    order_id: int
+    vehicle_id: int
+    zone_id: int
+
+class BatchVehicleLoad(BaseModel):
+    vehicle_id: int
+    zone_id: int
+    planned_volume_m3: float
+    planned_weight_kg: float
+    utilization_percentage: float
+
+class BatchAssignResponse(BaseModel):
+    committed: bool
+    pending_orders: int
+    assigned: int
+    unassigned_order_ids: List[int]
+    assignments: List[BatchAssignment]
+    vehicles: List[BatchVehicleLoad]
+
+class AssignmentQueueStats(BaseModel):
+    mode: str
+    depth: int
+    oldest_age_seconds: Optional[float] = None
+    # Orders given up on after repeated failures
+    failed: int
+    # Counters of this server process since it started
+    workers: int
+    batches: int
+    processed: int
+    assigned: int
+    last_lag_seconds: Optional[float] = None
+    average_lag_seconds: Optional[float] = None
+
+class RouteStop(BaseModel):
+    sequence: int
+    order_id: int
+    kind: str # "pickup" or "drop"
+    status: OrderStatus
+    latitude: float
+    longitude: float
+    address: Optional[str] = None
+    distance_from_previous_m: float
+
+class RouteResponse(BaseModel):
+    vehicle_id: int
+    total_distance_m: float
+    stops: List[RouteStop]
+    # Orders without the coordinates needed to route them
+    unrouted_order_ids: List[int]
+
+class RoutePlanRequest(BaseModel):
+    date: date
+    time_budget_seconds: Optional[float] = None
+    commit: bool = False
+
+class PlannedStop(BaseModel):
+    sequence: int
+    order_id: int
+    latitude: float
+    longitude: float
+    arrival: datetime
+    delivery_window_start: Optional[datetime] = None
+    delivery_window_end: Optional[datetime] = None
+
+class VehicleRoutePlan(BaseModel):
+    vehicle_id: int
+    vehicle_number: str
+    distance_m: float
+    volume_m3: float
+    weight_kg: float
+    return_time: datetime
+    stops: List[PlannedStop]
+
+class RoutePlanResponse(BaseModel):
+    zone_id: int
+    date: date
+    committed: bool
+    total_distance_m: float
+    construction_distance_m: float
+    planning_seconds: float
+    routes: List[VehicleRoutePlan]
+    unassigned_order_ids: List[int]
+    # ASSIGNED orders that no longer fit their vehicle's route (capacity or
+    # delivery window). They stay assigned; the plan just can't route them.
+    infeasible_pinned_order_ids: List[int]
+
+class LoadProposalOrder(BaseModel):
+    rank: int
+    order_id: int
+    volume_m3: float
+    weight_kg: float
+    pickup_zone_id: Optional[int] = None
+
+class LoadProposalResponse(BaseModel):
+    vehicle_id: int
+    objective: str
+    remaining_volume_m3: float
+    remaining_weight_kg: float
+    candidate_orders: int
+    orders: List[LoadProposalOrder]
+    total_volume_m3: float
+    total_weight_kg: float
+    # Proposal value and an upper bound on the best possible value; the
+    # proposal is optimal when they match
+    value: float
+    upper_bound: float
+    utilization_after_percentage: float
+    search_ms: float
+
+class VehicleCapacityResponse(BaseModel):
+    vehicle_id: int
+    start: datetime
+    end: datetime
+    # Busiest slot in the range, from slotted reservations
+    reserved_peak_volume_m3: float
+    reserved_peak_weight_kg: float
+    # What an order for this range could still book
+    remaining_volume_m3: float
+    remaining_weight_kg: float
+
+# Quote Schemas
+class QuoteRequest(BaseModel):
+    length_cm: float
+    width_cm: float
+    height_cm: float
+    weight_kg: float
+    pickup_latitude: float
+    pickup_longitude: float
+    drop_latitude: float
+    drop_longitude: float
+
+class QuoteResponse(BaseModel):
+    # Prices are null, with a reason, when the shipment can't be quoted
+    serviceable: bool
+    reason: Optional[str] = None
+    pickup_zone_id: Optional[int] = None
+    drop_zone_id: Optional[int] = None
+    volumetric_weight_kg: float
+    chargeable_weight_kg: float
+    distance_km: float
+    base_price: Optional[float] = None
+    weight_charge: Optional[float] = None
+    distance_surcharge: Optional[float] = None
+    total_price: Optional[float] = None
+
+class QuoteBatchRequest(BaseModel):
+    shipments: List[QuoteRequest]
+
+class QuoteBatchResponse(BaseModel):
+    # One quote per shipment, in request order
+    quotes: List[QuoteResponse]
+
+class TariffBase(BaseModel):
+    pickup_zone_id: int
+    drop_zone_id: int
+    base_price: float
+    price_per_kg: float
+    price_per_km: float = 0.0
+
+class TariffCreate(TariffBase):
+    pass
+
+class TariffResponse(TariffBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
 class ChangePasswordRequest(BaseModel):
     old_password: str
     new_password: str
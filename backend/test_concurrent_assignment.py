@@ -0,0 +1,170 @@
+import asyncio
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, update, func
+from database import AsyncSessionLocal
+from models import User, UserRole, Vehicle, Order, OrderStatus, Company, Zone
+from cache_versions import commit_with_versions
+from zone_index import parse_zone_polygon, zone_geometry
+from passlib.context import CryptContext
+
+# Fires many concurrent POST /orders into one zone whose vehicles can only
+# take a few orders each, then checks in the database that no vehicle went
+# over its limits and that the load counters match the assigned orders.
+# Run the server with several workers to exercise cross-process races:
+#   uvicorn main:app --workers 4
+
+BASE_URL = "http://127.0.0.1:8000"
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+ZONE_NAME = "ConcurrencyZone"
+ZONE_COORDS = "[[50,50],[50,51],[51,51],[51,50]]"
+VEHICLE_COUNT = 5
+ORDERS_PER_VEHICLE = 10
+ORDER_COUNT = 300
+CONCURRENCY = 32
+
+# Each order is 1 m3 and 5 kg, so a vehicle fits exactly ORDERS_PER_VEHICLE
+# of them by volume and by weight (whole numbers keep the sums exact)
+ORDER_PAYLOAD = {
+    "length_cm": 100, "width_cm": 100, "height_cm": 100, "weight_kg": 5,
+    "pickup_latitude": 50.5, "pickup_longitude": 50.5,
+    "drop_latitude": 50.6, "drop_longitude": 50.6,
+    "item_name": "Concurrency Test Item"
+}
+VEHICLE_MAX_VOLUME = 1.0 * ORDERS_PER_VEHICLE
+VEHICLE_MAX_WEIGHT = 5 * ORDERS_PER_VEHICLE
+EPSILON = 1e-9
+
+async def setup_test_data():
+    print("Setting up test data...")
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(select(Company).where(Company.name == "TestWorkflowComp"))
+        company = res.scalars().first()
+        if not company:
+            company = Company(name="TestWorkflowComp", gst_number="TESTGST", address="Test Address")
+            session.add(company)
+            await session.commit()
+            await session.refresh(company)
+
+        res = await session.execute(select(User).where(User.email == "test_concurrency@example.com"))
+        user = res.scalars().first()
+        if not user:
+            user = User(
+                email="test_concurrency@example.com",
+                hashed_password=pwd_context.hash("password"),
+                role=UserRole.MSME,
+                company_id=company.id,
+                name="Test Concurrency"
+            )
+            session.add(user)
+            await session.commit()
+
+        res = await session.execute(select(Zone).where(Zone.name == ZONE_NAME))
+        zone = res.scalars().first()
+        if not zone:
+            zone = Zone(
+                name=ZONE_NAME,
+                geometry_coords=ZONE_COORDS,
+                geometry=zone_geometry(parse_zone_polygon(ZONE_COORDS))
+            )
+            session.add(zone)
+            # Bumping the zones version makes running servers reload their index
+            await commit_with_versions(session, "zones")
+            await session.refresh(zone)
+
+        vehicle_ids = []
+        for i in range(VEHICLE_COUNT):
+            number = f"CONC-V{i + 1:02d}"
+            res = await session.execute(select(Vehicle).where(Vehicle.vehicle_number == number))
+            vehicle = res.scalars().first()
+            if not vehicle:
+                vehicle = Vehicle(vehicle_number=number, zone_id=zone.id)
+                session.add(vehicle)
+            vehicle.zone_id = zone.id
+            vehicle.max_volume_m3 = VEHICLE_MAX_VOLUME
+            vehicle.max_weight_kg = VEHICLE_MAX_WEIGHT
+            await session.flush()
+            vehicle_ids.append(vehicle.id)
+
+        # Start from empty vehicles: release orders left by earlier runs
+        await session.execute(
+            update(Order)
+            .where(Order.assigned_vehicle_id.in_(vehicle_ids))
+            .values(assigned_vehicle_id=None, status=OrderStatus.CANCELLED)
+        )
+        await session.execute(
+            update(Vehicle)
+            .where(Vehicle.id.in_(vehicle_ids))
+            .values(current_volume_m3=0, current_weight_kg=0)
+        )
+        await commit_with_versions(session, "vehicles")
+        return zone.id, vehicle_ids
+
+def wait_for_zone(headers, zone_id):
+    # The servers pick up the new zone once the version change reaches them
+    for _ in range(30):
+        resp = requests.post(f"{BASE_URL}/zones/classify", json={"points": [[50.5, 50.5]]}, headers=headers)
+        if resp.status_code == 200 and resp.json()["zone_ids"] == [zone_id]:
+            return
+        time.sleep(0.5)
+    raise AssertionError("Server never resolved the test zone")
+
+def create_order(headers):
+    resp = requests.post(f"{BASE_URL}/orders", json=ORDER_PAYLOAD, headers=headers)
+    return resp.status_code, resp.json() if resp.status_code == 200 else resp.text
+
+async def check_vehicles(vehicle_ids):
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(select(Vehicle).where(Vehicle.id.in_(vehicle_ids)).order_by(Vehicle.id))
+        vehicles = res.scalars().all()
+        res = await session.execute(
+            select(Order.assigned_vehicle_id, func.count(), func.sum(Order.volume_m3), func.sum(Order.weight_kg))
+            .where(Order.assigned_vehicle_id.in_(vehicle_ids), Order.status.in_([OrderStatus.ASSIGNED, OrderStatus.SHIPPED]))
+            .group_by(Order.assigned_vehicle_id)
+        )
+        sums = {r[0]: (r[1], r[2] or 0.0, r[3] or 0.0) for r in res.all()}
+
+    total = 0
+    for v in vehicles:
+        count, volume, weight = sums.get(v.id, (0, 0.0, 0.0))
+        total += count
+        print(f"   {v.vehicle_number}: {count} orders, {volume:.4f}/{v.max_volume_m3:.4f} m3, {weight:.1f}/{v.max_weight_kg:.1f} kg")
+        assert volume <= v.max_volume_m3 + EPSILON, f"{v.vehicle_number} over volume limit"
+        assert weight <= v.max_weight_kg + EPSILON, f"{v.vehicle_number} over weight limit"
+        assert abs(v.current_volume_m3 - volume) < 1e-6, f"{v.vehicle_number} volume counter {v.current_volume_m3} != {volume}"
+        assert abs(v.current_weight_kg - weight) < 1e-6, f"{v.vehicle_number} weight counter {v.current_weight_kg} != {weight}"
+    return total
+
+async def run_concurrency_test():
+    zone_id, vehicle_ids = await setup_test_data()
+
+    resp = requests.post(f"{BASE_URL}/token", data={"username": "test_concurrency@example.com", "password": "password"})
+    assert resp.status_code == 200, f"Login failed: {resp.text}"
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    wait_for_zone(headers, zone_id)
+
+    print(f"Creating {ORDER_COUNT} orders with {CONCURRENCY} concurrent clients...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(lambda _: create_order(headers), range(ORDER_COUNT)))
+    elapsed = time.perf_counter() - started
+    print(f"   Done in {elapsed:.2f}s ({ORDER_COUNT / elapsed:.0f} orders/s)")
+
+    failures = [body for code, body in results if code != 200]
+    assert not failures, f"{len(failures)} requests failed, first: {failures[0]}"
+    assigned = [body for _, body in results if body["status"] == "ASSIGNED"]
+    print(f"   {len(assigned)} assigned, {ORDER_COUNT - len(assigned)} left PENDING")
+
+    print("Checking vehicle loads...")
+    total = await check_vehicles(vehicle_ids)
+    assert total == len(assigned), f"{total} orders on vehicles but {len(assigned)} responses said ASSIGNED"
+    # Identical orders fill every vehicle exactly, so nothing may be lost either
+    capacity = VEHICLE_COUNT * ORDERS_PER_VEHICLE
+    assert total == min(capacity, ORDER_COUNT), f"Only {total} of {capacity} slots used"
+
+    print("\nALL TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(run_concurrency_test())
@@ -5,6 +5,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import engine, AsyncSessionLocal
 from models import User, UserRole, Vehicle, Order, OrderStatus, Company, Zone
+from vehicle_load import add_vehicle_load
 from passlib.context import CryptContext
 
 # Configuration
@@ -173,6 +174,8 @@ async def assign_order_db(order_id, vehicle_number):
         if o and v:
             o.assigned_vehicle_id = v.id
             o.status = OrderStatus.ASSIGNED
+            # Keep the vehicle's load counters in step, as the API does
+            await add_vehicle_load(session, v.id, o.volume_m3, o.weight_kg)
             await session.commit()
 
 async def main():
@@ -0,0 +1,245 @@
+from typing import Optional
+
+from sqlalchemy import Float, Integer, column, func, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from cache_versions import bump_versions_quietly
+from models import Order, Vehicle
+from order_versions import touch_orders
+
+# Vehicle.current_volume_m3 / current_weight_kg hold the summed load of the
+# vehicle's active orders. They are adjusted with relative UPDATEs in the
+# same transaction as the order status change, so they never need
+# re-aggregating from orders.
+#
+# Assignment goes through the reserve_* functions. Those only add load when
+# the vehicle still has room at the moment its row is updated or locked, so
+# concurrent order creation and admin assignment can't overbook a vehicle.
+
+ACTIVE_STATUSES = (models.OrderStatus.ASSIGNED, models.OrderStatus.SHIPPED)
+# Version the vehicle ETags read the load counters under, kept apart from
+# "vehicles" so assignments don't invalidate listings that don't show loads
+VEHICLE_LOADS_ENTITY = "vehicle_loads"
+
+
+def is_active_on_vehicle(order) -> bool:
+    return order.assigned_vehicle_id is not None and order.status in ACTIVE_STATUSES
+
+
+async def touch_vehicle_loads(db: AsyncSession):
+    # Call just before committing a load change, after touch_orders()
+    await bump_versions_quietly(db, [VEHICLE_LOADS_ENTITY])
+
+
+async def add_vehicle_load(db: AsyncSession, vehicle_id: int, volume_m3: float, weight_kg: float):
+    await db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == vehicle_id)
+        .values(
+            current_volume_m3=Vehicle.current_volume_m3 + volume_m3,
+            current_weight_kg=Vehicle.current_weight_kg + weight_kg
+        )
+    )
+
+
+async def add_vehicle_loads(db: AsyncSession, loads: dict[int, tuple[float, float]]):
+    # Bulk add_vehicle_load: {vehicle_id: (volume_m3, weight_kg)} in one UPDATE
+    if not loads:
+        return
+    delta = values(
+        column("vehicle_id", Integer), column("volume_m3", Float), column("weight_kg", Float), name="delta"
+    ).data([(vehicle_id, volume, weight) for vehicle_id, (volume, weight) in loads.items()])
+    await db.execute(
+        update(Vehicle.__table__)
+        .where(Vehicle.__table__.c.id == delta.c.vehicle_id)
+        .values(
+            current_volume_m3=Vehicle.__table__.c.current_volume_m3 + delta.c.volume_m3,
+            current_weight_kg=Vehicle.__table__.c.current_weight_kg + delta.c.weight_kg
+        )
+    )
+
+
+def sum_loads(rows) -> dict[int, tuple[float, float]]:
+    # (vehicle_id, volume_m3, weight_kg) rows -> per-vehicle totals
+    loads: dict[int, tuple[float, float]] = {}
+    for vehicle_id, volume_m3, weight_kg in rows:
+        volume, weight = loads.get(vehicle_id, (0.0, 0.0))
+        loads[vehicle_id] = (volume + volume_m3, weight + weight_kg)
+    return loads
+
+
+async def remove_vehicle_load(db: AsyncSession, vehicle_id: int, volume_m3: float, weight_kg: float):
+    # Clamped at zero so rounding can't leave a tiny negative load
+    await db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == vehicle_id)
+        .values(
+            current_volume_m3=func.greatest(Vehicle.current_volume_m3 - volume_m3, 0.0),
+            current_weight_kg=func.greatest(Vehicle.current_weight_kg - weight_kg, 0.0)
+        )
+    )
+
+
+def has_capacity_for(vehicle, volume_m3: float, weight_kg: float) -> bool:
+    return (
+        vehicle.max_volume_m3 - vehicle.current_volume_m3 >= volume_m3
+        and vehicle.max_weight_kg - vehicle.current_weight_kg >= weight_kg
+    )
+
+
+def remaining_capacity_filter(volume_m3: float, weight_kg: float):
+    # SQL counterpart of has_capacity_for
+    return (
+        (Vehicle.max_volume_m3 - Vehicle.current_volume_m3 >= volume_m3)
+        & (Vehicle.max_weight_kg - Vehicle.current_weight_kg >= weight_kg)
+    )
+
+
+def utilization_percentage(vehicle) -> float:
+    if not vehicle.max_volume_m3 or vehicle.max_volume_m3 <= 0:
+        return 0.0
+    return (vehicle.current_volume_m3 / vehicle.max_volume_m3) * 100
+
+
+async def reserve_vehicle_capacity(db: AsyncSession, vehicle_id: int, volume_m3: float, weight_kg: float) -> bool:
+    # Atomic conditional UPDATE: adds the load only if it still fits. A
+    # concurrent reservation holding the row makes this wait, then the
+    # condition is re-checked against the committed load.
+    vehicles = Vehicle.__table__
+    result = await db.execute(
+        update(vehicles)
+        .where(
+            vehicles.c.id == vehicle_id,
+            vehicles.c.max_volume_m3 - vehicles.c.current_volume_m3 >= volume_m3,
+            vehicles.c.max_weight_kg - vehicles.c.current_weight_kg >= weight_kg
+        )
+        .values(
+            current_volume_m3=vehicles.c.current_volume_m3 + volume_m3,
+            current_weight_kg=vehicles.c.current_weight_kg + weight_kg
+        )
+        .returning(vehicles.c.id)
+    )
+    return result.first() is not None
+
+
+async def reserve_in_zone(db: AsyncSession, zone_id: int, volume_m3: float, weight_kg: float, candidate_ids: Optional[list[int]] = None, exclude_ids=()) -> Optional[int]:
+    # Reserve capacity on a vehicle of the zone, first fit by id unless
+    # candidate_ids gives a preferred order. Returns the vehicle id or None.
+    #
+    # SKIP LOCKED spreads concurrent creations over the zone's vehicles
+    # instead of queueing them on the first one.
+    stmt = (
+        select(Vehicle.id)
+        .where(Vehicle.zone_id == zone_id, remaining_capacity_filter(volume_m3, weight_kg), Vehicle.id.not_in(exclude_ids))
+        .with_for_update(skip_locked=True)
+    )
+    if candidate_ids is None:
+        stmt = stmt.order_by(Vehicle.id).limit(1)
+        vehicle_id = (await db.execute(stmt)).scalar()
+    else:
+        unlocked = set((await db.execute(stmt.where(Vehicle.id.in_(candidate_ids)))).scalars().all())
+        vehicle_id = next((v for v in candidate_ids if v in unlocked), None)
+    if vehicle_id is not None:
+        await add_vehicle_load(db, vehicle_id, volume_m3, weight_kg)
+        return vehicle_id
+
+    # Every vehicle with room is locked by another transaction: wait on them
+    # in turn with the conditional UPDATE.
+    if candidate_ids is None:
+        candidate_ids = (await db.execute(
+            select(Vehicle.id)
+            .where(Vehicle.zone_id == zone_id, Vehicle.max_volume_m3 >= volume_m3, Vehicle.max_weight_kg >= weight_kg)
+            .order_by(Vehicle.id)
+        )).scalars().all()
+    for vehicle_id in candidate_ids:
+        if vehicle_id in exclude_ids:
+            continue
+        if await reserve_vehicle_capacity(db, vehicle_id, volume_m3, weight_kg):
+            return vehicle_id
+    return None
+
+
+async def lock_vehicles(db: AsyncSession, vehicle_ids):
+    # Row locks taken in id order, so multi-vehicle writers can't deadlock
+    if vehicle_ids:
+        await db.execute(
+            select(Vehicle.id).where(Vehicle.id.in_(set(vehicle_ids))).order_by(Vehicle.id).with_for_update()
+        )
+
+
+async def assign_orders_bulk(db: AsyncSession, plan: list[tuple[int, int]]):
+    # Apply a precomputed [(order_id, vehicle_id)] plan in one statement per
+    # table. The vehicles are locked first and the plan is re-checked against
+    # their committed load and slot reservations, so it can't overbook even
+    # if other assignments happened since it was computed. Orders with a
+    # delivery window book it with reserve_slot instead of adding to the
+    # load counters, as when assigned one at a time. Orders no longer
+    # PENDING, and windowed orders whose window has passed, are skipped.
+    # Returns the (order_id, vehicle_id) pairs actually applied.
+    from capacity_calendar import check_slot, reserve_slot, reserved_peaks  # capacity_calendar imports this module
+
+    if not plan:
+        return []
+    await lock_vehicles(db, [vehicle_id for _, vehicle_id in plan])
+
+    orders = Order.__table__
+    plan_rows = values(column("order_id", Integer), column("vehicle_id", Integer), name="plan").data(plan)
+    candidates = (await db.execute(
+        select(orders.c.id, plan_rows.c.vehicle_id, orders.c.volume_m3, orders.c.weight_kg,
+               orders.c.delivery_window_start, orders.c.delivery_window_end)
+        .where(
+            orders.c.id == plan_rows.c.order_id,
+            orders.c.status == models.OrderStatus.PENDING,
+            orders.c.assigned_vehicle_id.is_(None)
+        )
+        .order_by(orders.c.id)
+        .with_for_update(of=orders)
+    )).all()
+
+    # 1. Unwindowed orders: keep the plan's orders for each vehicle while
+    # they still fit, next to the busiest reserved slot ahead as well
+    # (capacity_calendar.py)
+    vehicles = (await db.execute(
+        select(Vehicle.id, Vehicle.max_volume_m3, Vehicle.max_weight_kg, Vehicle.current_volume_m3, Vehicle.current_weight_kg)
+        .where(Vehicle.id.in_({vehicle_id for _, vehicle_id in plan}))
+    )).all()
+    peaks = await reserved_peaks(db, [v.id for v in vehicles])
+    remaining = {
+        v.id: [v.max_volume_m3 - v.current_volume_m3 - peaks[v.id][0], v.max_weight_kg - v.current_weight_kg - peaks[v.id][1]]
+        for v in vehicles
+    }
+    applied, applied_loads, windowed = [], [], []
+    for c in candidates:
+        if c.delivery_window_start is not None and c.delivery_window_end is not None:
+            windowed.append(c)
+            continue
+        room = remaining.get(c.vehicle_id)
+        if room is None or room[0] < c.volume_m3 or room[1] < c.weight_kg:
+            continue
+        room[0] -= c.volume_m3
+        room[1] -= c.weight_kg
+        applied.append((c.id, c.vehicle_id))
+        applied_loads.append((c.vehicle_id, c.volume_m3, c.weight_kg))
+    await add_vehicle_loads(db, sum_loads(applied_loads))
+
+    # 2. Windowed orders, once the counters include step 1: each books its
+    # window on the planned vehicle if there is room in it
+    for c in windowed:
+        try:
+            check_slot(c.delivery_window_start, c.delivery_window_end)
+        except ValueError:
+            continue
+        if await reserve_slot(db, c.vehicle_id, c.id, c.volume_m3, c.weight_kg,
+                              c.delivery_window_start, c.delivery_window_end):
+            applied.append((c.id, c.vehicle_id))
+
+    if applied:
+        applied_rows = values(column("order_id", Integer), column("vehicle_id", Integer), name="applied").data(applied)
+        await db.execute(
+            update(orders)
+            .where(orders.c.id == applied_rows.c.order_id)
+            .values(assigned_vehicle_id=applied_rows.c.vehicle_id, status=models.OrderStatus.ASSIGNED)
+        )
+        await touch_orders(db, order_ids=[order_id for order_id, _ in applied])
+    return applied
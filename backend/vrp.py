@@ -0,0 +1,306 @@
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from geo import haversine_m
+
+# Fleet route planning with capacities and delivery time windows (CVRPTW).
+# Each vehicle leaves the zone's depot point at the start of the working
+# day, delivers its orders and is back at the depot by the end of it. Orders
+# are assumed to be loaded at the depot, so only drop points are routed.
+#
+# Routes are built by cheapest feasible insertion, scoring every position of
+# every route at once with NumPy, then improved by relocate (move one order)
+# and exchange (swap two orders between routes) until the time budget runs
+# out. Time-window feasibility of an insertion is O(1) per position using the
+# latest start time each stop can be pushed to. Times are minutes from the
+# start of the planning day.
+#
+# plan_routes is a plain function over arrays so it can run in the process pool.
+
+VRP_SPEED_KMH = float(os.getenv("VRP_SPEED_KMH", 30))
+VRP_SERVICE_MINUTES = float(os.getenv("VRP_SERVICE_MINUTES", 5))
+VRP_DAY_START_HOUR = int(os.getenv("VRP_DAY_START_HOUR", 8))
+VRP_DAY_END_HOUR = int(os.getenv("VRP_DAY_END_HOUR", 20))
+VRP_TIME_BUDGET_SECONDS = float(os.getenv("VRP_TIME_BUDGET_SECONDS", 5))
+VRP_MAX_TIME_BUDGET_SECONDS = 60.0
+# Exchange tries swapping an order with this many of its nearest orders
+EXCHANGE_NEIGHBOURS = 10
+IMPROVEMENT_EPSILON = 1e-6
+
+
+class _Route:
+    # One vehicle's stops (order nodes, depot excluded) and their schedule
+    __slots__ = ("nodes", "volume", "weight", "distance", "begin", "latest",
+                 "edge_from", "edge_to", "edge_ready", "edge_latest", "edge_length")
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+
+
+class _Planner:
+    def __init__(self, depot, lats, lngs, volumes, weights, earliest, latest, service,
+                 capacity_volumes, capacity_weights, pinned, day_start, day_end, speed_m_per_min):
+        # Node 0 is the depot, node k + 1 is order k
+        self.lat = np.concatenate(([depot[0]], np.asarray(lats, dtype=np.float64)))
+        self.lng = np.concatenate(([depot[1]], np.asarray(lngs, dtype=np.float64)))
+        self.volume = np.concatenate(([0.0], np.asarray(volumes, dtype=np.float64)))
+        self.weight = np.concatenate(([0.0], np.asarray(weights, dtype=np.float64)))
+        self.earliest = np.concatenate(([day_start], np.asarray(earliest, dtype=np.float64)))
+        self.latest = np.concatenate(([day_end], np.asarray(latest, dtype=np.float64)))
+        self.service = np.concatenate(([0.0], np.asarray(service, dtype=np.float64)))
+        # Route index an order must stay on, or -1
+        self.pinned = np.concatenate(([-1], np.asarray(pinned, dtype=np.int64)))
+        self.capacity_volume = np.asarray(capacity_volumes, dtype=np.float64)
+        self.capacity_weight = np.asarray(capacity_weights, dtype=np.float64)
+        self.day_start = day_start
+        self.day_end = day_end
+        self.speed = speed_m_per_min
+        self.routes = [_Route([]) for _ in range(len(self.capacity_volume))]
+        self.route_of = np.full(len(self.lat), -1, dtype=np.int64)
+        for r in range(len(self.routes)):
+            self._schedule(r)
+        self._flat = None
+
+    # --- schedules -------------------------------------------------------
+
+    def _evaluate(self, nodes):
+        # (feasible, begin times, latest begin times, distance) for depot + nodes + depot
+        seq = np.array([0] + list(nodes) + [0], dtype=np.int64)
+        legs = haversine_m(self.lat[seq[:-1]], self.lng[seq[:-1]], self.lat[seq[1:]], self.lng[seq[1:]])
+        legs = np.atleast_1d(legs)
+        travel = (legs / self.speed).tolist()
+        earliest = self.earliest[seq].tolist()
+        latest = self.latest[seq].tolist()
+        service = self.service[seq].tolist()
+
+        begin = [self.day_start] * len(seq)
+        t = self.day_start
+        for k in range(1, len(seq)):
+            t = max(t + service[k - 1] + travel[k - 1], earliest[k])
+            if t > latest[k] + IMPROVEMENT_EPSILON:
+                return False, None, None, None
+            begin[k] = t
+        # Latest begin at each stop that keeps every later stop on time
+        latest_begin = latest[:]
+        for k in range(len(seq) - 2, -1, -1):
+            latest_begin[k] = min(latest[k], latest_begin[k + 1] - travel[k] - service[k])
+        return True, begin, latest_begin, float(legs.sum())
+
+    def _schedule(self, r: int, evaluated=None):
+        route = self.routes[r]
+        if evaluated is None:
+            evaluated = self._evaluate(route.nodes)
+        _, begin, latest_begin, distance = evaluated
+        nodes = np.array(route.nodes, dtype=np.int64)
+        route.volume = float(self.volume[nodes].sum())
+        route.weight = float(self.weight[nodes].sum())
+        route.distance = distance
+        route.begin = begin
+        route.latest = latest_begin
+        # Edges between consecutive stops, for insertion scoring
+        seq = np.concatenate(([0], nodes, [0]))
+        route.edge_from = seq[:-1]
+        route.edge_to = seq[1:]
+        route.edge_ready = np.asarray(begin[:-1]) + self.service[seq[:-1]]
+        route.edge_latest = np.asarray(latest_begin[1:])
+        route.edge_length = np.atleast_1d(haversine_m(
+            self.lat[seq[:-1]], self.lng[seq[:-1]], self.lat[seq[1:]], self.lng[seq[1:]]
+        ))
+        self.route_of[nodes] = r
+        self._flat = None
+
+    def _edges(self):
+        if self._flat is None:
+            routes = self.routes
+            if not routes:
+                # No vehicles: no edges to insert on
+                no_ints, no_floats = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+                self._flat = (no_ints, no_ints, no_floats, no_floats, no_floats, no_ints, no_ints)
+                return self._flat
+            self._flat = (
+                np.concatenate([rt.edge_from for rt in routes]),
+                np.concatenate([rt.edge_to for rt in routes]),
+                np.concatenate([rt.edge_ready for rt in routes]),
+                np.concatenate([rt.edge_latest for rt in routes]),
+                np.concatenate([rt.edge_length for rt in routes]),
+                np.concatenate([np.full(len(rt.edge_from), r) for r, rt in enumerate(routes)]),
+                np.concatenate([np.arange(len(rt.edge_from)) for rt in routes]),
+            )
+        return self._flat
+
+    # --- moves -----------------------------------------------------------
+
+    def best_insertion(self, u: int) -> Optional[tuple[float, int, int]]:
+        # Cheapest feasible (added metres, route, position) for node u
+        if not self.routes:
+            return None
+        edge_from, edge_to, ready, latest_next, length, route_ids, positions = self._edges()
+        du = haversine_m(self.lat[u], self.lng[u], self.lat, self.lng)
+        d_in = du[edge_from]
+        d_out = du[edge_to]
+        begin_u = np.maximum(ready + d_in / self.speed, self.earliest[u])
+        arrive_next = begin_u + self.service[u] + d_out / self.speed
+
+        route_volume = np.array([rt.volume for rt in self.routes])
+        route_weight = np.array([rt.weight for rt in self.routes])
+        fits = (
+            (route_volume + self.volume[u] <= self.capacity_volume + IMPROVEMENT_EPSILON)
+            & (route_weight + self.weight[u] <= self.capacity_weight + IMPROVEMENT_EPSILON)
+        )
+        feasible = (begin_u <= self.latest[u]) & (arrive_next <= latest_next) & fits[route_ids]
+        if self.pinned[u] >= 0:
+            feasible &= route_ids == self.pinned[u]
+        if not feasible.any():
+            return None
+        cost = np.where(feasible, d_in + d_out - length, np.inf)
+        k = int(np.argmin(cost))
+        return float(cost[k]), int(route_ids[k]), int(positions[k])
+
+    def insert(self, u: int, r: int, position: int):
+        self.routes[r].nodes.insert(position, u)
+        self._schedule(r)
+
+    def remove(self, u: int) -> tuple[int, int]:
+        r = int(self.route_of[u])
+        position = self.routes[r].nodes.index(u)
+        del self.routes[r].nodes[position]
+        self.route_of[u] = -1
+        # Removing a stop never delays later ones (distances obey the
+        # triangle inequality), so the route stays feasible
+        self._schedule(r)
+        return r, position
+
+    def relocate(self, u: int) -> bool:
+        r = int(self.route_of[u])
+        before = self.routes[r].distance
+        old_r, old_position = self.remove(u)
+        gain = before - self.routes[r].distance
+        best = self.best_insertion(u)
+        if best is not None and best[0] < gain - IMPROVEMENT_EPSILON:
+            self.insert(u, best[1], best[2])
+            return True
+        self.insert(u, old_r, old_position)
+        return False
+
+    def exchange(self, u: int, v: int) -> bool:
+        ru, rv = int(self.route_of[u]), int(self.route_of[v])
+        if ru == rv or ru < 0 or rv < 0:
+            return False
+        if self.pinned[u] >= 0 or self.pinned[v] >= 0:
+            return False
+        route_u, route_v = self.routes[ru], self.routes[rv]
+        dv, dw = self.volume[v] - self.volume[u], self.weight[v] - self.weight[u]
+        if route_u.volume + dv > self.capacity_volume[ru] + IMPROVEMENT_EPSILON or route_u.weight + dw > self.capacity_weight[ru] + IMPROVEMENT_EPSILON:
+            return False
+        if route_v.volume - dv > self.capacity_volume[rv] + IMPROVEMENT_EPSILON or route_v.weight - dw > self.capacity_weight[rv] + IMPROVEMENT_EPSILON:
+            return False
+        nodes_u = [v if n == u else n for n in route_u.nodes]
+        nodes_v = [u if n == v else n for n in route_v.nodes]
+        eval_u = self._evaluate(nodes_u)
+        if not eval_u[0]:
+            return False
+        eval_v = self._evaluate(nodes_v)
+        if not eval_v[0]:
+            return False
+        if eval_u[3] + eval_v[3] >= route_u.distance + route_v.distance - IMPROVEMENT_EPSILON:
+            return False
+        route_u.nodes, route_v.nodes = nodes_u, nodes_v
+        self._schedule(ru, eval_u)
+        self._schedule(rv, eval_v)
+        return True
+
+    def neighbours(self, u: int, count: int) -> np.ndarray:
+        d = haversine_m(self.lat[u], self.lng[u], self.lat, self.lng)
+        d[0] = np.inf
+        d[u] = np.inf
+        count = min(count, len(d) - 2)
+        if count <= 0:
+            return np.empty(0, dtype=np.int64)
+        nearest = np.argpartition(d, count)[:count]
+        return nearest[np.argsort(d[nearest])]
+
+    def total_distance(self) -> float:
+        return sum(rt.distance for rt in self.routes)
+
+
+def plan_routes(depot, lats, lngs, volumes, weights, earliest, latest,
+                capacity_volumes, capacity_weights, pinned=None, service=None,
+                day_start: float = VRP_DAY_START_HOUR * 60, day_end: float = VRP_DAY_END_HOUR * 60,
+                speed_kmh: float = VRP_SPEED_KMH, time_budget_seconds: float = VRP_TIME_BUDGET_SECONDS,
+                seed: int = 0) -> dict:
+    # Orders are indexed 0..n-1 and vehicles 0..m-1. pinned[k] is the vehicle
+    # order k must stay on, or -1. Returns a dict with "routes" (order indices
+    # per vehicle), "arrivals" (service start minutes per stop), "distances"
+    # (metres per vehicle), "unassigned" and timing stats.
+    started = time.perf_counter()
+    deadline = started + max(0.0, time_budget_seconds)
+    n = len(lats)
+    if pinned is None:
+        pinned = np.full(n, -1)
+    if service is None:
+        service = np.full(n, VRP_SERVICE_MINUTES)
+    planner = _Planner(
+        depot, lats, lngs, volumes, weights, earliest, latest, service,
+        capacity_volumes, capacity_weights, pinned, day_start, day_end, speed_kmh * 1000.0 / 60.0
+    )
+
+    # 1. Construction: pinned orders first, then tightest windows first,
+    # farthest from the depot first among equal windows
+    nodes = np.arange(1, n + 1)
+    depot_distance = haversine_m(planner.lat[0], planner.lng[0], planner.lat[1:], planner.lng[1:])
+    order = np.lexsort((-np.atleast_1d(depot_distance), planner.latest[1:], planner.pinned[1:] < 0))
+    unassigned = []
+    for u in nodes[order]:
+        best = planner.best_insertion(int(u))
+        if best is None:
+            unassigned.append(int(u))
+        else:
+            planner.insert(int(u), best[1], best[2])
+    construction_seconds = time.perf_counter() - started
+    construction_distance = planner.total_distance()
+
+    # 2. Local search until nothing improves or the budget is spent
+    rng = np.random.default_rng(seed)
+    rounds = 0
+    while time.perf_counter() < deadline:
+        rounds += 1
+        improved = False
+        for u in rng.permutation(nodes):
+            if time.perf_counter() >= deadline:
+                break
+            u = int(u)
+            if planner.route_of[u] < 0:
+                continue
+            if planner.relocate(u):
+                improved = True
+            for v in planner.neighbours(u, EXCHANGE_NEIGHBOURS):
+                if planner.exchange(u, int(v)):
+                    improved = True
+                    break
+        # Freed capacity may now take orders construction had to leave out
+        still_unassigned = []
+        for u in unassigned:
+            best = planner.best_insertion(u)
+            if best is None:
+                still_unassigned.append(u)
+            else:
+                planner.insert(u, best[1], best[2])
+                improved = True
+        unassigned = still_unassigned
+        if not improved:
+            break
+
+    return {
+        "routes": [[k - 1 for k in rt.nodes] for rt in planner.routes],
+        "arrivals": [rt.begin[1:-1] for rt in planner.routes],
+        "return_times": [rt.begin[-1] for rt in planner.routes],
+        "distances": [rt.distance for rt in planner.routes],
+        "unassigned": sorted(k - 1 for k in unassigned),
+        "construction_distance": construction_distance,
+        "construction_seconds": construction_seconds,
+        "search_rounds": rounds,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,44 @@
+# Compact wire format for zone polygons: Google encoded polyline of the
+# stored [lat, lng] pairs (precision 5, about 1 m), the format Leaflet
+# polyline decoders expect.
+
+POLYLINE_PRECISION = 5
+ZONE_ENCODINGS = ("polyline",)
+
+
+def encode_polyline(coords, precision: int = POLYLINE_PRECISION) -> str:
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for p in coords:
+        lat, lng = round(p[0] * factor), round(p[1] * factor)
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> list[list[float]]:
+    factor = 10 ** precision
+    coords = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append([lat / factor, lng / factor])
+    return coords
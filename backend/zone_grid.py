@@ -0,0 +1,71 @@
+import math
+import os
+from typing import Optional
+
+import numpy as np
+import shapely
+
+# Cell size follows the geohash grid at this precision (6 is ~1.2 km x 0.6 km).
+# 0 disables the grid and every lookup goes to the zone index.
+ZONE_GRID_PRECISION = int(os.getenv("ZONE_GRID_PRECISION", 6))
+# Skip building when the zones would need more cells than this
+ZONE_GRID_MAX_CELLS = int(os.getenv("ZONE_GRID_MAX_CELLS", 2000000))
+
+# Cell value for cells crossed by a zone boundary (or shared by several
+# zones). Points in them need the exact polygon test.
+BOUNDARY = -1
+
+
+def geohash_cell_size(precision: int) -> tuple[float, float]:
+    # Geohash interleaves bits starting with longitude, so longitude gets
+    # the extra bit on odd bit counts
+    bits = 5 * precision
+    lat_bits = bits // 2
+    lng_bits = bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+class ZoneGrid:
+    # Maps geohash-aligned cells to "entirely inside zone X" or BOUNDARY;
+    # cells missing from the map are outside all zones. Keys are the integer
+    # (row, column) of the cell, which identifies the same cell as its
+    # geohash string but is cheaper to compute.
+
+    def __init__(self, zone_ids, polygons, bounds, precision: int = ZONE_GRID_PRECISION):
+        self.precision = precision
+        self.lat_step, self.lng_step = geohash_cell_size(precision)
+        self.cells: dict[tuple[int, int], int] = {}
+
+        ranges = [self._cell_range(b) for b in bounds]
+        total = sum((r1 - r0 + 1) * (c1 - c0 + 1) for r0, r1, c0, c1 in ranges)
+        if total > ZONE_GRID_MAX_CELLS:
+            raise ValueError(f"Zone grid needs {total} cells at precision {precision}")
+
+        # Zones in id order: a cell fully inside an earlier zone keeps it,
+        # matching the first-zone-by-id rule of ZoneIndex.zone_for
+        for zone_id, polygon, (r0, r1, c0, c1) in zip(zone_ids, polygons, ranges):
+            rows, cols = np.meshgrid(np.arange(r0, r1 + 1), np.arange(c0, c1 + 1), indexing="ij")
+            rows, cols = rows.ravel(), cols.ravel()
+            lat0 = rows * self.lat_step - 90.0
+            lng0 = cols * self.lng_step - 180.0
+            boxes = shapely.box(lat0, lng0, lat0 + self.lat_step, lng0 + self.lng_step)
+            touched = shapely.intersects(polygon, boxes)
+            inside = shapely.contains_properly(polygon, boxes)
+            for row, col, is_inside in zip(rows[touched], cols[touched], inside[touched]):
+                key = (int(row), int(col))
+                # Cells already claimed (inside an earlier zone, or BOUNDARY) keep their value
+                if key not in self.cells:
+                    self.cells[key] = zone_id if is_inside else BOUNDARY
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor((lat + 90.0) / self.lat_step), math.floor((lng + 180.0) / self.lng_step)
+
+    def _cell_range(self, bounds):
+        min_lat, min_lng, max_lat, max_lng = bounds
+        r0, c0 = self._cell(min_lat, min_lng)
+        r1, c1 = self._cell(max_lat, max_lng)
+        return r0, r1, c0, c1
+
+    def lookup(self, lat: float, lng: float) -> Optional[int]:
+        # Zone id, None when outside all zones, or BOUNDARY
+        return self.cells.get(self._cell(lat, lng))
@@ -0,0 +1,218 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+from typing import Optional
+
+import numpy as np
+import shapely
+import shapely.ops
+from shapely import STRtree
+from shapely.geometry import Point, Polygon
+from geoalchemy2.shape import from_shape
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache_versions import on_invalidate
+from geo import haversine_m
+from models import Vehicle, Zone
+from zone_grid import BOUNDARY, ZONE_GRID_PRECISION, ZoneGrid
+
+ZONE_SRID = 4326
+
+# Points this close (in metres) to a zone but outside every polygon are
+# assigned to the nearest zone. 0 disables the fallback.
+ZONE_FALLBACK_MAX_DISTANCE_M = float(os.getenv("ZONE_FALLBACK_MAX_DISTANCE_M", 0))
+METERS_PER_DEGREE = 111320.0
+
+
+def parse_zone_polygon(geometry_coords: str) -> Polygon:
+    # Zones are stored as a JSON list of [lat, lng] pairs (Leaflet order), so
+    # x = lat and y = lng throughout. Points must be built the same way.
+    coords = json.loads(geometry_coords)
+    return Polygon([(p[0], p[1]) for p in coords])
+
+
+def zone_geometry(polygon: Polygon):
+    # Value for Zone.geometry, keeping the lat/lng axis convention
+    return from_shape(polygon, srid=ZONE_SRID)
+
+
+def zone_point(lat: float, lng: float):
+    # SQL point matching Zone.geometry's axis order (x = lat, y = lng)
+    return func.ST_SetSRID(func.ST_MakePoint(lat, lng), ZONE_SRID)
+
+
+def zone_vehicles_stmt(lat: float, lng: float):
+    # Vehicles of every zone containing the point, in one GiST-indexed query
+    return (
+        select(Vehicle)
+        .join(Zone, Vehicle.zone_id == Zone.id)
+        .where(func.ST_Contains(Zone.geometry, zone_point(lat, lng)))
+        .order_by(Zone.id, Vehicle.id)
+    )
+
+
+_index_versions = itertools.count(1)
+
+
+class ZoneIndex:
+    # Prepared zone polygons in an STRtree. Lookups only run the exact
+    # containment test against zones whose bounding box contains the point.
+
+    def __init__(self, zones: list[tuple[int, Polygon]]):
+        self.version = next(_index_versions)
+        # Keep DB order (by id) so "first matching zone" stays deterministic
+        zones = sorted(zones, key=lambda z: z[0])
+        self.zone_ids = [zone_id for zone_id, _ in zones]
+        self.polygons = [polygon for _, polygon in zones]
+        for polygon in self.polygons:
+            shapely.prepare(polygon)
+        self.tree = STRtree(self.polygons)
+        self.bounds = shapely.bounds(np.array(self.polygons, dtype=object)).reshape(-1, 4)
+        # Cell lookup table, attached by a background build once ready
+        self.grid: Optional[ZoneGrid] = None
+        self.grid_task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self.zone_ids)
+
+    def zones_for(self, lat: float, lng: float) -> list[int]:
+        point = Point(lat, lng)
+        candidates = sorted(self.tree.query(point))
+        return [
+            self.zone_ids[i] for i in candidates
+            if self.polygons[i].contains(point)
+        ]
+
+    def zone_for(self, lat: float, lng: float) -> Optional[int]:
+        grid = self.grid
+        if grid is not None:
+            cell = grid.lookup(lat, lng)
+            if cell != BOUNDARY:
+                return cell
+        point = Point(lat, lng)
+        for i in sorted(self.tree.query(point)):
+            if self.polygons[i].contains(point):
+                return self.zone_ids[i]
+        return None
+
+    def nearest_zone(self, lat: float, lng: float, max_distance_m: float) -> Optional[tuple[int, float]]:
+        # Nearest zone within max_distance_m, as (zone_id, distance_m). The
+        # degree search radius is widened by 1/cos(lat) so it covers
+        # max_distance_m along longitude; candidates are ranked in metres.
+        if max_distance_m <= 0 or not self.polygons:
+            return None
+        point = Point(lat, lng)
+        radius_deg = max_distance_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        best = None
+        for i in self.tree.query(point, predicate="dwithin", distance=radius_deg):
+            nearest, _ = shapely.ops.nearest_points(self.polygons[i], point)
+            distance = haversine_m(lat, lng, nearest.x, nearest.y)
+            if distance <= max_distance_m and (best is None or (distance, self.zone_ids[i]) < best):
+                best = (distance, self.zone_ids[i])
+        if best is None:
+            return None
+        return best[1], best[0]
+
+    def resolve_zone(self, lat: float, lng: float, fallback_max_distance_m: float = ZONE_FALLBACK_MAX_DISTANCE_M) -> tuple[Optional[int], Optional[float]]:
+        # Returns (zone_id, fallback_distance_m). The distance is None when
+        # the point lies inside the zone, and set when the fallback matched.
+        zone_id = self.zone_for(lat, lng)
+        if zone_id is not None:
+            return zone_id, None
+        nearest = self.nearest_zone(lat, lng, fallback_max_distance_m)
+        if nearest is None:
+            return None, None
+        return nearest
+
+    def classify_points(self, lats, lngs) -> np.ndarray:
+        # Vectorized zone_for over many points. Returns the first matching
+        # zone id per point, or -1 where the point is outside every zone.
+        x = np.asarray(lats, dtype=np.float64)
+        y = np.asarray(lngs, dtype=np.float64)
+        result = np.full(x.shape, -1, dtype=np.int64)
+        for zone_id, polygon, (minx, miny, maxx, maxy) in zip(self.zone_ids, self.polygons, self.bounds):
+            # Bounding box prefilter, skipping points an earlier zone already claimed
+            candidates = np.flatnonzero(
+                (result == -1) & (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)
+            )
+            if candidates.size == 0:
+                continue
+            inside = shapely.contains_xy(polygon, x[candidates], y[candidates])
+            result[candidates[inside]] = zone_id
+        return result
+
+    def resolve_points(self, lats, lngs, fallback_max_distance_m: float = ZONE_FALLBACK_MAX_DISTANCE_M):
+        # Vectorized resolve_zone: (zone ids with -1 for none, fallback
+        # distances with NaN where the point is inside its zone or unmatched)
+        x = np.asarray(lats, dtype=np.float64)
+        y = np.asarray(lngs, dtype=np.float64)
+        zone_ids = self.classify_points(x, y)
+        distances = np.full(x.shape, np.nan)
+        if fallback_max_distance_m > 0:
+            # Only the few points outside every zone take the nearest-zone path
+            for i in np.flatnonzero((zone_ids == -1) & ~np.isnan(x) & ~np.isnan(y)):
+                nearest = self.nearest_zone(x[i], y[i], fallback_max_distance_m)
+                if nearest is not None:
+                    zone_ids[i], distances[i] = nearest
+        return zone_ids, distances
+
+
+def build_zone_index(db_zones) -> ZoneIndex:
+    zones = []
+    for z in db_zones:
+        try:
+            zones.append((z.id, parse_zone_polygon(z.geometry_coords)))
+        except Exception as e:
+            print(f"Zone parse error {z.name}: {e}")
+    return ZoneIndex(zones)
+
+
+# Process-wide index, loaded on first use and dropped whenever the zone set
+# changes in any worker (see cache_versions.py)
+_zone_index: Optional[ZoneIndex] = None
+_zone_index_generation = 0
+_zone_index_lock = asyncio.Lock()
+
+
+async def _load_zone_index(db: AsyncSession) -> ZoneIndex:
+    result = await db.execute(select(Zone.id, Zone.name, Zone.geometry_coords))
+    return build_zone_index(result.all())
+
+
+async def get_zone_index(db: AsyncSession) -> ZoneIndex:
+    global _zone_index
+    if _zone_index is not None:
+        return _zone_index
+    async with _zone_index_lock:
+        if _zone_index is not None:
+            return _zone_index
+        generation = _zone_index_generation
+        index = await _load_zone_index(db)
+        # Don't cache an index that was invalidated while it was loading
+        if generation == _zone_index_generation:
+            _zone_index = index
+            if ZONE_GRID_PRECISION > 0:
+                index.grid_task = asyncio.create_task(_build_zone_grid(index))
+        return index
+
+
+async def _build_zone_grid(index: ZoneIndex):
+    # Built off the event loop; until it is attached, lookups use the STRtree
+    try:
+        index.grid = await asyncio.to_thread(
+            ZoneGrid, index.zone_ids, index.polygons, index.bounds, ZONE_GRID_PRECISION
+        )
+    except Exception as e:
+        print(f"Zone grid not built: {e}")
+
+
+def invalidate_zone_index():
+    global _zone_index, _zone_index_generation
+    _zone_index_generation += 1
+    _zone_index = None
+
+
+on_invalidate("zones", invalidate_zone_index)